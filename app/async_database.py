@@ -0,0 +1,99 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncDatabase:
+    """
+    asyncio facade of the analytics methods of a Database opened in pooled mode (read_connections > 0).
+
+    Every query runs in a thread of its own executor on a read-only connection, so refresh() takes
+    as long as the slowest query instead of the sum of all of them, e.g.:
+        adb = AsyncDatabase(Database(logger, read_connections=6))
+        results = await adb.refresh(OfferFilter(categories=["python"]))
+    """
+    # Methods run by refresh(), the keys of its result
+    methods = (
+        'get_offers_by_location',
+        'get_offers_by_experience',
+        'get_avg_salary_by_experience_and_currency',
+        'get_offers_by_year_month',
+        'get_offers_by_operating_mode',
+        'get_technology_with_levels_sorted',
+    )
+
+    def __init__(self, database, max_workers=None):
+        if not database.read_connections:
+            raise ValueError("AsyncDatabase needs a Database opened with read_connections > 0.")
+
+        self.database = database
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or database.read_connections,
+                                           thread_name_prefix="db-reader")
+
+        # The refresh in progress, cancelled when a newer one starts
+        self._refresh_task = None
+
+    async def _run(self, name, *args):
+        # Threads running this call, their query is interrupted if the call is cancelled
+        thread_ids = set()
+
+        def call():
+            thread_ids.add(threading.get_ident())
+
+            try:
+                return getattr(self.database, name)(*args)
+            finally:
+                thread_ids.discard(threading.get_ident())
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+        except asyncio.CancelledError:
+            self.database.interrupt_reads(thread_ids)
+            self.database.logger.debug(f"Query of {name} was cancelled.")
+            raise
+
+    async def get_offers_by_location(self, filters=None, limit=None):
+        return await self._run('get_offers_by_location', filters, limit)
+
+    async def get_offers_by_experience(self, filters=None, limit=None):
+        return await self._run('get_offers_by_experience', filters, limit)
+
+    async def get_avg_salary_by_experience_and_currency(self, filters=None, limit=None):
+        return await self._run('get_avg_salary_by_experience_and_currency', filters, limit)
+
+    async def get_offers_by_year_month(self, filters=None, limit=None):
+        return await self._run('get_offers_by_year_month', filters, limit)
+
+    async def get_offers_by_operating_mode(self, filters=None, limit=None):
+        return await self._run('get_offers_by_operating_mode', filters, limit)
+
+    async def get_technology_with_levels_sorted(self, filters=None, limit=None):
+        return await self._run('get_technology_with_levels_sorted', filters, limit)
+
+    async def refresh(self, filters=None, limits=None):
+        """
+        Runs all the analytics methods concurrently.
+        A refresh still in progress is cancelled first, together with its running queries,
+        so results for outdated filters are never waited for.
+
+        :param filters: OfferFilter for all the methods, by default the filters of the database.
+        :param limits:  Dictionary method name -> limit of rows.
+        :return:        Dictionary method name -> DataFrame.
+        """
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+
+        limits = limits or {}
+        self._refresh_task = asyncio.ensure_future(asyncio.gather(
+            *(self._run(name, filters, limits.get(name)) for name in self.methods)))
+
+        return dict(zip(self.methods, await self._refresh_task))
+
+    def close(self):
+        """
+        Cancels the refresh in progress and shuts the executor down. The database stays open.
+        """
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,172 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class DomainLimiter:
+    """
+    Limits the requests to one domain: at most max_concurrent at a time and at most rate per second.
+    """
+
+    def __init__(self, max_concurrent, rate=None):
+        self.semaphore = threading.BoundedSemaphore(max_concurrent)
+        self.interval = 1 / rate if rate else 0
+        self._next_start = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self.semaphore.acquire()
+
+        if self.interval:
+            # Requests start one interval apart, every thread reserves its own start time
+            with self._lock:
+                start = max(time.monotonic(), self._next_start)
+                self._next_start = start + self.interval
+
+            time.sleep(max(0, start - time.monotonic()))
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.semaphore.release()
+
+
+class Crawler:
+    """
+    Downloads pages concurrently and hands them over to one consumer, e.g.:
+        crawler = Crawler(logger, headers=ex.headers)
+        crawler.crawl(offers, lambda url, response: ex.page_extraction(url, site, response))
+
+    A pool of threads fetches the pages, with a pooled requests.Session per host (keep-alive connections)
+    and a DomainLimiter per domain. Downloaded pages are put on an unbounded queue, so the network workers
+    never wait for parsing. The pages are handled by the thread calling crawl(), the only one writing
+    to the database.
+    """
+
+    def __init__(self, logger, workers=8, per_domain=4, rate=None, headers=None, timeout=10, cache=None):
+        """
+        :param logger:      Logger.
+        :param workers:     Number of threads downloading pages.
+        :param per_domain:  Maximum number of requests to one domain at a time.
+        :param rate:        Maximum number of requests to one domain per second, None for no limit.
+        :param headers:     Headers of every request.
+        :param timeout:     Timeout of a request in seconds.
+        :param cache:       HttpCache for conditional requests, pages not modified since then are not handled.
+        """
+        self.logger = logger
+        self.workers = workers
+        self.per_domain = per_domain
+        self.rate = rate
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.cache = cache
+
+        self._sessions = {}
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def session(self, host):
+        """
+        Returns the session of a host, its connection pool holds a connection for every concurrent request.
+        """
+        with self._lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                session.headers.update(self.headers)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.per_domain)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[host] = session
+                self._limiters[host] = DomainLimiter(self.per_domain, self.rate)
+
+            return self._sessions[host]
+
+    def fetch(self, url):
+        """
+        Downloads a page, respecting the limits of its domain.
+
+        :return: Response, None on error.
+        """
+        host = urlsplit(url).netloc
+        session = self.session(host)
+
+        try:
+            with self._limiters[host]:
+                if self.cache is not None:
+                    response = self.cache.get(session, url, timeout=self.timeout)
+                else:
+                    response = session.get(url, timeout=self.timeout)
+
+            response.raise_for_status()
+
+            return response
+        except requests.RequestException as e:
+            self.logger.error(f"Page download error for URL {url}: {e}")
+
+            return None
+
+    def crawl(self, urls, handle_page):
+        """
+        Downloads the pages and calls handle_page(url, response) for every downloaded one, in this thread,
+        in the order in which the downloads finish. Pages not modified since they were cached are skipped.
+
+        :return: Dictionary with the numbers of 'pages' handled, 'not_modified' and 'errors',
+                 'seconds' and 'pages_per_second'.
+        """
+        pages = queue.Queue()
+        urls = list(urls)
+        handled = not_modified = errors = 0
+        start_time = time.perf_counter()
+
+        def download(url):
+            # Every URL puts exactly one result, the consumer waits for all of them
+            try:
+                response = self.fetch(url)
+            except Exception as e:
+                self.logger.error(f"Unexpected error while downloading the page {url}: {e}")
+                response = None
+
+            pages.put((url, response))
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crawler") as executor:
+            for url in urls:
+                executor.submit(download, url)
+
+            for _ in urls:
+                url, response = pages.get()
+
+                if response is None:
+                    errors += 1
+                    continue
+
+                if getattr(response, "not_modified", False):
+                    not_modified += 1
+                    continue
+
+                try:
+                    handle_page(url, response)
+                    handled += 1
+                except Exception as e:
+                    errors += 1
+                    self.logger.error(f"Unexpected error while handling the page {url}: {e}")
+
+        seconds = time.perf_counter() - start_time
+        stats = {'pages': handled, 'not_modified': not_modified, 'errors': errors, 'seconds': seconds,
+                 'pages_per_second': handled / seconds if seconds else 0.0}
+        self.logger.info(f"{handled} pages crawled in {seconds:.2f} s ({stats['pages_per_second']:.1f} pages/s), "
+                         f"{not_modified} not modified, {errors} errors.")
+
+        return stats
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+
+            self._sessions.clear()
+            self._limiters.clear()
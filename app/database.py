@@ -1,20 +1,342 @@
+import functools
 import os
+import pathlib
+import queue
+import re
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
 
+import numpy as np
 import pandas as pd
 
+# Number of offers whose pairs of technologies are counted at once by get_technology_cooccurrence()
+COOCCURRENCE_CHUNK_SIZE = 50_000
+
+# Canonical form of 'date_add': sortable as text and usable by index range scans
+_CANONICAL_DATE = re.compile(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(\.\d+)?')
+
+
+def normalize_date(value):
+    """
+    Converts a date into the canonical form 'YYYY-MM-DD HH:MM:SS[.fraction]' stored in 'date_add'.
+    Accepts also date and datetime objects. Dates with a time zone are converted to UTC.
+    Returns None for empty or unparsable values.
+    """
+    if not value:
+        return None
+
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime.combine(value, datetime.min.time())
+    elif _CANONICAL_DATE.fullmatch(value):
+        return value
+    else:
+        try:
+            parsed = datetime.fromisoformat(value.strip().upper())
+        except ValueError:
+            return None
+
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return parsed.isoformat(sep=' ')
+
+
+def _cooccurrence_matrix(pairs, top, names, chunk_size=None):
+    # pairs: array of (offer id, technology id) rows sorted by the offer id, names: technology id -> name
+    chunk_size = chunk_size or COOCCURRENCE_CHUNK_SIZE
+    tech_ids, tech_index, tech_counts = np.unique(pairs[:, 1], return_inverse=True, return_counts=True)
+
+    # The most frequent technologies, ties in the order of their ids
+    top_index = np.argsort(-tech_counts, kind="stable")[:top]
+    columns = np.full(len(tech_ids), -1)
+    columns[top_index] = np.arange(len(top_index))
+
+    column = columns[tech_index]
+    selected = column >= 0
+    column = column[selected]
+    offer_index = np.unique(pairs[selected, 0], return_inverse=True)[1].reshape(-1)
+
+    matrix = np.zeros((len(top_index), len(top_index)), dtype=np.int64)
+
+    # Offers are sorted, so every chunk of offers is a slice of the pairs, the last one ends with the pairs
+    offers_count = offer_index[-1] + 1 if len(offer_index) else 0
+    bounds = np.r_[np.searchsorted(offer_index, np.arange(0, offers_count, chunk_size)), len(offer_index)]
+
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if start == end:
+            continue
+
+        rows = offer_index[start:end]
+        chunk_columns = column[start:end]
+
+        # Every pair of technologies of an offer, each one with itself included: every pair of the chunk
+        # is repeated once per technology of its offer and matched with those technologies in turn
+        firsts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        lengths = np.diff(np.r_[firsts, len(rows)])
+        partners = np.repeat(lengths, lengths)
+        left = np.repeat(np.arange(len(rows)), partners)
+        right = np.repeat(np.repeat(firsts, lengths), partners) + np.arange(len(left)) - np.repeat(
+            np.cumsum(partners) - partners, partners)
+
+        # Integer counts of the pairs, the (offer, technology) pairs are unique
+        matrix += np.bincount(chunk_columns[left] * len(top_index) + chunk_columns[right],
+                              minlength=len(top_index) ** 2).reshape(len(top_index), len(top_index))
+
+    labels = [names[tech_id] for tech_id in tech_ids[top_index]]
+
+    return pd.DataFrame(matrix, index=labels, columns=labels)
+
+
+class OfferFilter:
+    """
+    Filters of job offers, translated into the WHERE clause of a single SQL statement.
+
+    Empty values mean "no filter". Filters can be combined with '&', the result keeps only
+    offers matching both of them, e.g.:
+        OfferFilter(categories=["python"]) & OfferFilter(date_from="2023-01-01")
+    """
+    # Names of the list filters and the columns they are applied to
+    columns = {
+        'categories': 'category',
+        'locations': 'location',
+        'positions': 'position',
+        'experiences': 'experience',
+        'operating_modes': 'operating_mode',
+    }
+
+    def __init__(
+            self,
+            date_from=None,
+            date_to=None,
+            categories=None,
+            locations=None,
+            positions=None,
+            experiences=None,
+            operating_modes=None
+    ):
+        self.date_from = date_from or None
+        self.date_to = date_to or None
+        self.categories = tuple(categories) if categories else ()
+        self.locations = tuple(locations) if locations else ()
+        self.positions = tuple(positions) if positions else ()
+        self.experiences = tuple(experiences) if experiences else ()
+        self.operating_modes = tuple(operating_modes) if operating_modes else ()
+
+        # Set by '&' when two lists of values have nothing in common, such a filter matches nothing
+        self.empty = False
+
+    def __and__(self, other):
+        values = {}
+
+        for name in self.columns:
+            own, others = getattr(self, name), getattr(other, name)
+            values[name] = tuple(value for value in own if value in others) if own and others else own or others
+
+        dates_from = [date for date in (self.date_from, other.date_from) if date]
+        dates_to = [date for date in (self.date_to, other.date_to) if date]
+
+        # Compared in the canonical form, the dates may be strings in other formats or date objects
+        combined = OfferFilter(date_from=max(dates_from, key=lambda date: normalize_date(date) or '', default=None),
+                               date_to=min(dates_to, key=lambda date: normalize_date(date) or '', default=None),
+                               **values)
+
+        combined.empty = self.empty or other.empty or any(
+            (getattr(self, name) or getattr(other, name)) and not values[name] for name in self.columns)
+
+        return combined
+
+    def __repr__(self):
+        values = ', '.join(f"{name}={value!r}" for name, value in vars(self).items() if value)
+
+        return f"OfferFilter({values})"
+
+    def cache_key(self):
+        """
+        Returns a hashable key of the filter, equal for filters matching the same offers
+        regardless of the order of values or the format of dates.
+        """
+        dates = tuple((normalize_date(date) or date)[:10] if date else None
+                      for date in (self.date_from, self.date_to))
+
+        return (self.empty,) + dates + tuple(frozenset(getattr(self, name)) for name in self.columns)
+
+    def is_empty(self):
+        """
+        Returns True if the filter does not restrict the offers at all.
+        """
+        return not (self.empty or self.date_from or self.date_to or
+                    any(getattr(self, name) for name in self.columns))
+
+    def where_clause(self, alias=None):
+        """
+        Builds the WHERE clause and its parameters.
+
+        :param alias:   Alias of the 'job_offers' table in the query, if any.
+        :return:        Tuple (clause, list of parameters), the clause is empty without filters.
+        """
+        prefix = f"{alias}." if alias else ""
+        conditions = []
+        params = []
+
+        if self.empty:
+            conditions.append("0")
+
+        # Ranges on the canonical 'date_add' text, so the index on it can be used.
+        # Invalid dates match nothing.
+        if self.date_from:
+            date_from = normalize_date(self.date_from)
+
+            if date_from:
+                conditions.append(f"{prefix}date_add >= ?")
+                params.append(date_from[:10])
+            else:
+                conditions.append("0")
+
+        if self.date_to:
+            date_to = normalize_date(self.date_to)
+
+            if date_to:
+                conditions.append(f"{prefix}date_add < ?")
+                params.append((datetime.fromisoformat(date_to[:10]) + timedelta(days=1)).strftime('%Y-%m-%d'))
+            else:
+                conditions.append("0")
+
+        return self._list_conditions(prefix, conditions, params)
+
+    def rollup_where_clause(self, alias=None):
+        """
+        Builds the WHERE clause on the 'offer_groups' table of the rollups.
+        Positions are not a dimension of the rollups and their months cannot be split,
+        so filters on positions or on dates not covering whole months cannot be answered from them.
+
+        :param alias:   Alias of the 'offer_groups' table in the query, if any.
+        :return:        Tuple (clause, list of parameters) or None if the rollups cannot be used.
+        """
+        prefix = f"{alias}." if alias else ""
+        conditions = []
+        params = []
+
+        if self.positions:
+            return None
+
+        if self.empty:
+            conditions.append("0")
+
+        if self.date_from:
+            date_from = normalize_date(self.date_from)
+
+            if not date_from or date_from[8:10] != '01':
+                return None
+
+            conditions.append(f"{prefix}month >= ?")
+            params.append(date_from[:7])
+
+        if self.date_to:
+            date_to = normalize_date(self.date_to)
+
+            if not date_to or (datetime.fromisoformat(date_to[:10]) + timedelta(days=1)).day != 1:
+                return None
+
+            conditions.append(f"{prefix}month <= ?")
+            params.append(date_to[:7])
+
+        return self._list_conditions(prefix, conditions, params)
+
+    def _list_conditions(self, prefix, conditions, params):
+        # Appends the conditions of the list filters and joins all of them into a WHERE clause
+        for name, column in self.columns.items():
+            values = getattr(self, name)
+
+            if values:
+                placeholders = ",".join(["?"] * len(values))
+                conditions.append(f"{prefix}{column} IN ({placeholders})")
+                params.extend(values)
+
+        if not conditions:
+            return "", []
+
+        return "WHERE " + " AND ".join(conditions), params
+
+
+class BufferedOfferWriter:
+    """
+    Collects offers inserted one by one and writes them with Database.insert_job_offers_batch(),
+    in one upsert statement and one commit, every max_rows offers or once the oldest buffered offer
+    is max_seconds old. The age is checked when an offer is added, flush() writes the rest.
+    """
+
+    def __init__(self, db, max_rows=500, max_seconds=5.0):
+        self.db = db
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        self.offers = []
+        self._first_added = None
+
+    def __len__(self):
+        return len(self.offers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def add(self, offer_data):
+        if not self.offers:
+            self._first_added = time.monotonic()
+
+        self.offers.append(offer_data)
+
+        if len(self.offers) >= self.max_rows or time.monotonic() - self._first_added >= self.max_seconds:
+            self.flush()
+
+    def flush(self):
+        if not self.offers:
+            return
+
+        offers, self.offers = self.offers, []
+        self.db.insert_job_offers_batch(offers)
+
+
+def _synchronized(method):
+    # Methods writing through the shared cursor are run by one thread at a time
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._write_lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
 
 class Database:
     def __init__(self, logger, db_name="job_offers.db", db_folder="data",
-                 structure_location=os.path.join("data", "database_structure.sql")):
+                 structure_location=os.path.join("data", "database_structure.sql"), cache_size=128,
+                 read_connections=0):
+        """
+        With read_connections > 0 the database works in pooled mode: the connection of the object
+        becomes the only writer and uses the WAL journal, while the get_* methods read through a pool
+        of read-only connections. Readers then do not wait for a long load, and the object can be
+        shared by threads.
+        """
         self.logger = logger
 
         project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        self.path = os.path.join(project_root, db_folder, db_name)
 
-        self.connection = sqlite3.connect(os.path.join(project_root, db_folder, db_name))
+        self.connection = sqlite3.connect(self.path, check_same_thread=not read_connections)
         self.cursor = self.connection.cursor()
+        self._write_lock = threading.RLock()
         self.create_structure(os.path.join(project_root, structure_location))
 
+        # Offers are also matched by their link, unless existing offers share links
+        self.link_unique = self._create_link_index()
+
         # Get information about the columns in the job_offers table
         self.fields = [
             row[1] for row in
@@ -22,6 +344,98 @@ class Database:
             if row[1] not in ('id', 'position')
         ]
 
+        # Filters used by the get_* methods when no filters are passed, see set_filters()
+        self.filters = OfferFilter()
+
+        # The get_* methods answer from the rollup tables whenever the filters allow it
+        self.use_rollups = True
+
+        # Results of the get_* methods, least recently used first, see _read_filtered()
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_version = None
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+        self._cache_lock = threading.Lock()
+
+        # Read-only connections of the pooled mode, see _read_connection()
+        self.read_connections = read_connections
+        self._readers = queue.Queue()
+        self._busy_readers = {}  # thread id -> connection running its query
+        self._busy_lock = threading.Lock()
+        self._version_connection = None
+
+        if read_connections:
+            self.cursor.execute("PRAGMA journal_mode = WAL;")
+
+            for _ in range(read_connections):
+                self._readers.put(self._connect_read_only())
+
+            # Its data_version changes after commits of all the other connections, the writer included
+            self._version_connection = self._connect_read_only()
+
+        # Writers flushed by close_connection(), see buffered_writer()
+        self._writers = []
+
+        # State of a bulk load, see begin_bulk_load()
+        self._load_pragmas = {}
+        self._deferred_indexes = []
+
+        # Derived tables are not maintained while a bulk load is running, see begin_bulk_load()
+        if self.cursor.execute("SELECT EXISTS (SELECT 1 FROM bulk_load);").fetchone()[0]:
+            self.logger.warning("A bulk load is running or was interrupted, the tables derived from 'job_offers' "
+                                "are not up to date until end_bulk_load() is called.")
+
+            return
+
+        # Databases created before the derived tables existed have to be filled once
+        for table, column, rebuild in (("offer_skills", "tech_stack", self.rebuild_offer_skills),
+                                       ("offer_salaries", "salary", self.rebuild_offer_salaries),
+                                       ("offers_rollup", "id", self.rebuild_rollups)):
+            if self.cursor.execute(
+                    f"SELECT NOT EXISTS (SELECT 1 FROM {table}) "
+                    f"AND EXISTS (SELECT 1 FROM job_offers WHERE {column} IS NOT NULL);").fetchone()[0]:
+                rebuild()
+
+    def _connect_read_only(self):
+        # A percent-encoded URI, paths may contain '?', '#', '%' or spaces, or be Windows drive paths
+        return sqlite3.connect(pathlib.Path(self.path).resolve().as_uri() + "?mode=ro", uri=True,
+                               check_same_thread=False)
+
+    @contextmanager
+    def _read_connection(self):
+        # Checks out a read-only connection in pooled mode, otherwise the only connection is used
+        if self._version_connection is None:
+            with self._write_lock:
+                yield self.connection
+
+            return
+
+        connection = self._readers.get()
+        thread_id = threading.get_ident()
+
+        with self._busy_lock:
+            self._busy_readers[thread_id] = connection
+
+        try:
+            yield connection
+        finally:
+            with self._busy_lock:
+                del self._busy_readers[thread_id]
+
+            self._readers.put(connection)
+
+    def interrupt_reads(self, thread_ids=None):
+        """
+        Aborts the queries running on the read-only connections of the pooled mode,
+        only those of the given threads if thread_ids is passed. They raise sqlite3.OperationalError.
+        """
+        with self._busy_lock:
+            for thread_id, connection in self._busy_readers.items():
+                if thread_ids is None or thread_id in thread_ids:
+                    connection.interrupt()
+
     def create_structure(self, structure):
         with open(structure, 'r') as sql_file:
             sql_script = sql_file.read()
@@ -37,6 +451,19 @@ class Database:
         except (sqlite3.Error, FileNotFoundError) as e:
             self.logger.error(f"Error while creating database structure: {e}.")
 
+    def _create_link_index(self):
+        try:
+            self.cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS job_offers_uindex_link ON job_offers (link);")
+            self.connection.commit()
+
+            return True
+        except sqlite3.IntegrityError as e:
+            self.logger.warning(f"The unique index on links was not created, some offers share a link: {e}. "
+                                f"Offers are matched only by title, company, location and category.")
+
+            return False
+
+    @_synchronized
     def execute_query(self, query):
         try:
             self.cursor.execute(query)
@@ -51,11 +478,21 @@ class Database:
 
     def fetch_all_offers(self):
         query = "SELECT * FROM job_offers;"
-        df = pd.read_sql_query(query, self.connection)
+
+        with self._read_connection() as connection:
+            df = pd.read_sql_query(query, connection)
 
         return df
 
+    @_synchronized
     def insert_job_offer(self, offer_data):
+        """
+        Inserts an offer in a single upsert statement. An offer with the same title, company, location
+        and category, or with the same link, is updated instead if the new offer is more recent.
+        Use buffered_writer() to insert many offers one by one.
+        """
+        offer_data = dict(offer_data, date_add=normalize_date(offer_data['date_add']))
+
         # We build a SQL query and placeholders based on a list of fields
         columns = ', '.join(self.fields)
         placeholders = ', '.join(['?' for _ in self.fields])
@@ -66,148 +503,29 @@ class Database:
             )
             VALUES(
                 {placeholders}
-            );
+            )
+            {self._upsert_clause()};
         """
 
         # We generate a tuple of values based on the keys from offer_data
         # Assume that offer_data contains values for all keys in self.fields
         values = tuple(offer_data[field] for field in self.fields)
+        offer = f"\"{offer_data['company']}, {offer_data['title']}, {(offer_data['location'] or '').capitalize()}\""
 
         try:
             self.cursor.execute(insert_data_query, values)
             self.connection.commit()
-            self.logger.info(
-                f"The offer \"{offer_data['company']}, {offer_data['title']}, {offer_data['location'].capitalize()}\""
-                f"has been added to the database!")
-        except sqlite3.IntegrityError as e:
-            if offer_data['date_add']:
-                if "job_offers.title, job_offers.company, job_offers.location, job_offers.category" in str(
-                        e):
-                    update_data_query = """
-                        UPDATE job_offers
-                        SET position       = ?,
-                            date_add       = ?,
-                            salary         = ?,
-                            experience     = ?,
-                            employment     = ?,
-                            operating_mode = ?,
-                            tech_stack     = ?,
-                            link           = ?,
-                            source         = ?
-                        WHERE title = ?
-                          AND company = ?
-                          AND location = ?
-                          AND category = ?;
-                    """
-
-                    self.cursor.execute(
-                        "SELECT date_add FROM job_offers WHERE title = ? AND company = ? AND location = ? "
-                        "AND category = ?;",
-                        (offer_data['title'], offer_data['company'],
-                         offer_data['location'], offer_data['category'],))
-                    old_row = self.cursor.fetchone()
-
-                    from datetime import datetime
-
-                    let_update = False
-                    new_date = datetime.strptime(offer_data['date_add'],
-                                                 "%Y-%m-%d %H:%M:%S.%f")
-
-                    if old_row[0]:
-                        old_date = datetime.strptime(old_row[0],
-                                                     "%Y-%m-%d %H:%M:%S.%f")
-
-                        if old_date < new_date:
-                            let_update = True
-                    else:
-                        let_update = True
-
-                    if let_update:
-                        self.cursor.execute(update_data_query,
-                                            [offer_data['position'],
-                                             offer_data['date_add'],
-                                             offer_data['salary'],
-                                             offer_data['experience'],
-                                             offer_data['employment'],
-                                             offer_data['operating_mode'],
-                                             offer_data['tech_stack'],
-                                             offer_data['link'],
-                                             offer_data['source'],
-                                             offer_data['title'],
-                                             offer_data['company'],
-                                             offer_data['location'],
-                                             offer_data['category'], ])
-                        self.connection.commit()
-                        self.logger.info(
-                            f"The offer \"{offer_data['company']}, {offer_data['title']}, "
-                            f"{offer_data['location'].capitalize()}\" has been updated!")
-                elif "job_offers.link" in str(e):
-                    update_data_query = """
-                                            UPDATE job_offers
-                                            SET title          = ?
-                                                company        = ?
-                                                location       = ?
-                                                category       = ?,
-                                                position       = ?,
-                                                date_add       = ?,
-                                                salary         = ?,
-                                                experience     = ?,
-                                                employment     = ?,
-                                                operating_mode = ?,
-                                                tech_stack     = ?,
-                                                source         = ?
-                                            WHERE link = ?;
-                                        """
-
-                    self.cursor.execute(
-                        "SELECT date_add FROM job_offers WHERE link = ?;",
-                        (offer_data['link'],))
-                    old_row = self.cursor.fetchone()
-
-                    from datetime import datetime
-
-                    let_update = False
-                    new_date = datetime.strptime(offer_data['date_add'],
-                                                 "%Y-%m-%d %H:%M:%S.%f")
-
-                    if old_row[0]:
-                        old_date = datetime.strptime(old_row[0],
-                                                     "%Y-%m-%d %H:%M:%S.%f")
-
-                        if old_date < new_date:
-                            let_update = True
-                    else:
-                        let_update = True
-
-                    if let_update:
-                        self.cursor.execute(update_data_query,
-                                            [offer_data['title'],
-                                             offer_data['company'],
-                                             offer_data['location'],
-                                             offer_data['category'],
-                                             offer_data['position'],
-                                             offer_data['date_add'],
-                                             offer_data['salary'],
-                                             offer_data['experience'],
-                                             offer_data['employment'],
-                                             offer_data['operating_mode'],
-                                             offer_data['tech_stack'],
-                                             offer_data['source'],
-                                             offer_data['link'], ])
-                        self.connection.commit()
-                        self.logger.info(
-                            f"The offer \"{offer_data['company']}, {offer_data['title']}, "
-                            f"{offer_data['location'].capitalize()}\" has been updated!")
+
+            # Nothing is changed when the offer in the database is not older
+            if self.cursor.rowcount:
+                self.logger.info(f"The offer {offer} has been added or updated in the database!")
             else:
-                self.logger.warning(f"Duplicate entry or integrity error: {e}")
+                self.logger.warning(
+                    f"Duplicate entry or integrity error: the offer {offer} is not newer than the one in the database.")
         except sqlite3.Error as e:
             self.logger.error(f"Database error: {e}")
 
-    def insert_job_offers_batch(self, offers_data):
-        # Columns and placeholders for the batch insert
-        columns = ', '.join(self.fields)
-        placeholders = ', '.join(['?' for _ in self.fields])
-
+    def _upsert_clause(self):
         unique_columns = ["title", "company", "location", "category"]
 
         update_columns = [field for field in self.fields if
@@ -220,102 +538,498 @@ class Database:
         where_clause = ' AND '.join(
             [f"job_offers.{col} = excluded.{col}" for col in unique_columns])
 
-        insert_data_query = f"""
-            INSERT INTO job_offers ({columns})
-            VALUES ({placeholders})
+        newer_clause = """excluded.date_add IS NOT NULL
+                AND (job_offers.date_add IS NULL OR job_offers.date_add < excluded.date_add)"""
+
+        if not self.link_unique:
+            return f"""
             ON CONFLICT (title, company, location, category)
-            DO UPDATE SET 
+            DO UPDATE SET
             {update_clause}
-            WHERE excluded.date_add IS NOT NULL 
-                AND (job_offers.date_add IS NULL OR job_offers.date_add < excluded.date_add)
-                AND {where_clause};
+            WHERE {newer_clause}
+                AND {where_clause}
         """
 
+        # The first clause matching a failed constraint is used, so offers are matched by the title, company,
+        # location and category first. Their link is not changed if another offer already has the new one.
+        update_clause = update_clause.replace(
+            "link = excluded.link",
+            "link = CASE WHEN NOT EXISTS (SELECT 1 FROM job_offers o WHERE o.link = excluded.link) "
+            "THEN excluded.link ELSE job_offers.link END")
+        link_update_clause = ', '.join(
+            [f"{col} = excluded.{col}" for col in self.fields if col != "link"])
+
+        return f"""
+            ON CONFLICT (title, company, location, category)
+            DO UPDATE SET
+            {update_clause}
+            WHERE {newer_clause}
+                AND {where_clause}
+            ON CONFLICT (link)
+            DO UPDATE SET
+            {link_update_clause}
+            WHERE {newer_clause}
+        """
+
+    def _offer_values(self, offers_data):
         # Create list of tuples with values for each offer
-        values = [tuple(offer[field] for field in self.fields) for offer in
-                  offers_data]
+        # Offers can also be passed as ready-made tuples with values in the order of self.fields
+        values = [offer if isinstance(offer, tuple) else tuple(offer[field] for field in self.fields)
+                  for offer in offers_data]
+
+        # Dates are stored in the canonical form, rows with other dates are rebuilt
+        date_index = self.fields.index('date_add')
+
+        for number, row in enumerate(values):
+            date_add = row[date_index]
+
+            if date_add is not None and not _CANONICAL_DATE.fullmatch(date_add):
+                values[number] = row[:date_index] + (normalize_date(date_add),) + row[date_index + 1:]
+
+        return values
+
+    @_synchronized
+    def insert_job_offers_batch(self, offers_data):
+        """
+        Inserts or updates offers with multi-row upserts in one transaction.
+        Offers breaking a constraint are logged and skipped, the others are still written.
+
+        :return: True if the offers were written, False if a database error rolled them back.
+        """
+        # Columns and placeholders for the batch insert
+        columns = ', '.join(self.fields)
+        placeholders = f"({', '.join(['?' for _ in self.fields])})"
+
+        # Offers are written with multi-row upserts, as many rows per statement as the parameter limit allows
+        rows_per_statement = max(1, self.connection.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER) // len(self.fields))
+        values = self._offer_values(offers_data)
+
+        def upsert(rows):
+            insert_data_query = f"""
+                INSERT INTO job_offers ({columns})
+                VALUES {', '.join([placeholders] * len(rows))}
+                {self._upsert_clause()};
+            """
+            self.cursor.execute(insert_data_query, [value for row in rows for value in row])
 
         try:
-            self.cursor.executemany(insert_data_query, values)
+            for start in range(0, len(values), rows_per_statement):
+                upsert(values[start:start + rows_per_statement])
+
             self.connection.commit()
             self.logger.info(
                 f"{len(offers_data)} job offers have been added or updated in the database!")
+
+            return True
+        except sqlite3.IntegrityError as e:
+            # One invalid offer fails the whole statement, so the offers are written again one by one
+            # and only the invalid ones are lost
+            self.connection.rollback()
+            self.logger.warning(f"Integrity error during batch insert/update: {e}. Offers are inserted one by one.")
+
+            return self._insert_rows_one_by_one(values, upsert)
         except sqlite3.Error as e:
+            self.connection.rollback()
             self.logger.error(
                 f"Database error during batch insert/update: {e}")
 
-    def remove_older_duplicates(self):
+            return False
+
+    def _insert_rows_one_by_one(self, values, upsert):
+        title, company = self.fields.index('title'), self.fields.index('company')
+        inserted = 0
+
+        try:
+            for row in values:
+                try:
+                    upsert([row])
+                    inserted += 1
+                except sqlite3.IntegrityError as e:
+                    self.logger.error(f"The offer \"{row[company]}, {row[title]}\" was not inserted: {e}")
+
+            self.connection.commit()
+            self.logger.info(f"{inserted} of {len(values)} job offers have been added or updated in the database!")
+
+            return True
+        except sqlite3.Error as e:
+            self.connection.rollback()
+            self.logger.error(f"Database error during batch insert/update: {e}")
+
+            return False
+
+    def buffered_writer(self, max_rows=500, max_seconds=5.0):
+        """
+        Returns a BufferedOfferWriter for offers inserted one by one, e.g. by the extraction.
+        Its offers are also written by close_connection().
+        """
+        writer = BufferedOfferWriter(self, max_rows, max_seconds)
+        self._writers.append(writer)
+
+        return writer
+
+    @_synchronized
+    def begin_bulk_load(self, apply_pragmas=True, defer_indexes=False):
+        """
+        Prepares the connection for a large import with bulk_load_job_offers().
+
+        - apply_pragmas: switches to the WAL journal, relaxes 'synchronous' and enlarges the page cache
+          for this connection. The previous values, the journal mode included, are restored by end_bulk_load().
+        - defer_indexes: if 'job_offers' is empty (first load), its secondary indexes are dropped
+          and created again by end_bulk_load(), after all the data is in.
+
+        The triggers on 'job_offers' stop maintaining the derived tables (skills, salaries and rollups)
+        until end_bulk_load(), which rebuilds them at once.
+        """
+        try:
+            self.cursor.execute("INSERT INTO bulk_load (id) VALUES (1) ON CONFLICT (id) DO NOTHING;")
+            self.connection.commit()
+
+            if apply_pragmas:
+                self._load_pragmas = {
+                    pragma: self.cursor.execute(f"PRAGMA {pragma};").fetchone()[0]
+                    for pragma in ("journal_mode", "synchronous", "cache_size", "temp_store")
+                }
+                self.cursor.execute("PRAGMA journal_mode = WAL;")
+                self.cursor.execute("PRAGMA synchronous = NORMAL;")
+                self.cursor.execute("PRAGMA cache_size = -65536;")  # 64 MB
+                self.cursor.execute("PRAGMA temp_store = MEMORY;")
+
+            if defer_indexes and self.cursor.execute("SELECT NOT EXISTS (SELECT 1 FROM job_offers);").fetchone()[0]:
+                # Only indexes created by CREATE INDEX, unique constraints are needed by the upsert
+                names = [row[1] for row in self.cursor.execute("PRAGMA index_list(job_offers);")
+                         if row[3] == 'c' and not row[2]]
+
+                for name in names:
+                    sql = self.cursor.execute(
+                        "SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?;", (name,)).fetchone()[0]
+                    self._deferred_indexes.append(sql)
+                    self.cursor.execute(f"DROP INDEX {name};")
+
+                self.connection.commit()
+                self.logger.debug(f"Creation of indexes {', '.join(names)} was deferred until the end of the load.")
+        except sqlite3.Error as e:
+            self.logger.error(f"Error while preparing the bulk load: {e}")
+
+    @_synchronized
+    def bulk_load_job_offers(self, offers_data):
+        """
+        Loads a large batch of offers through a staging table.
+
+        The rows are first inserted into the TEMP table 'job_offers_stage' (no indexes, no constraints)
+        and then merged into 'job_offers' with a single INSERT ... SELECT ... ON CONFLICT statement,
+        with the same update rules as insert_job_offers_batch().
+
+        :return: True if the offers were loaded, False if a database error rolled them back.
+        """
+        columns = ', '.join(self.fields)
+        placeholders = ', '.join(['?' for _ in self.fields])
+
+        merge_query = f"""
+            INSERT INTO job_offers ({columns})
+            SELECT {columns}
+            FROM job_offers_stage
+            WHERE true
+            ORDER BY rowid
+            {self._upsert_clause()};
+        """
+
+        values = self._offer_values(offers_data)
+
+        try:
+            self.cursor.execute(
+                f"CREATE TEMP TABLE IF NOT EXISTS job_offers_stage AS SELECT {columns} FROM job_offers WHERE 0;")
+            self.cursor.execute("DELETE FROM job_offers_stage;")
+            self.cursor.executemany(f"INSERT INTO job_offers_stage VALUES ({placeholders});", values)
+            self.cursor.execute(merge_query)
+            self.cursor.execute("DELETE FROM job_offers_stage;")
+            self.connection.commit()
+            self.logger.info(
+                f"{len(offers_data)} job offers have been bulk loaded into the database!")
+
+            return True
+        except sqlite3.Error as e:
+            self.connection.rollback()
+            self.logger.error(
+                f"Database error during bulk load: {e}")
+
+            return False
+
+    @_synchronized
+    def end_bulk_load(self):
+        """
+        Creates the indexes deferred by begin_bulk_load(), rebuilds the tables derived from 'job_offers'
+        and restores the previous PRAGMA values.
+        """
+        try:
+            while self._deferred_indexes:
+                self.cursor.execute(self._deferred_indexes.pop(0))
+
+            self.cursor.execute("DELETE FROM bulk_load;")
+            self.connection.commit()
+
+            if self.cursor.rowcount:
+                self.rebuild_offer_skills()
+                self.rebuild_offer_salaries()
+                self.rebuild_rollups()
+
+            for pragma, value in self._load_pragmas.items():
+                self.cursor.execute(f"PRAGMA {pragma} = {value};")
+
+            self._load_pragmas = {}
+            self.logger.debug("The bulk load has been finished.")
+        except sqlite3.Error as e:
+            self.logger.error(f"Error while finishing the bulk load: {e}")
+
+    @_synchronized
+    def remove_older_duplicates(self, full=False):
         """
         Removes older duplicates from the job_offers table based on columns
         (title, company, category, location, source, link, operating_mode),
-        leaving only the record with the highest (most recent) date_add value.
+        leaving only the most recent record of each group: the highest date_add, then the highest id.
+        Empty (NULL) location or link are equal to each other, so such offers are grouped as well.
 
         Action:
-        1) The subquery groups the listings by the above columns and selects MAX(date_add) as max_date.
-        2) We remove all records whose rowid does not belong to the 'freshest' set in each group.
+        1) ROW_NUMBER() numbers the offers of each group from the most recent one.
+        2) We remove all records numbered above 1.
+
+        Only groups of offers inserted or updated since the last run (queued in 'dedup_queue' by the triggers)
+        are checked, they are found through the unique index on (title, company, location, category).
+        CROSS JOIN keeps the queue as the outer loop, whatever the planner estimates.
+
+        :param full:    If True, all groups are checked, e.g. in a database created before the queue existed.
+        :return:        Number of removed offers, None on error.
         """
-        query = """
+        if full:
+            offers = "job_offers"
+        else:
+            offers = """
+            (SELECT o.*
+             FROM (SELECT DISTINCT d.title, d.company, d.category, d.location, d.source, d.link, d.operating_mode
+                   FROM dedup_queue q
+                            CROSS JOIN job_offers d ON d.id = q.offer_id) a
+                      CROSS JOIN job_offers o
+                           ON o.title = a.title
+                          AND o.company = a.company
+                          AND o.location IS a.location
+                          AND o.category = a.category
+                          AND o.source = a.source
+                          AND o.link IS a.link
+                          AND o.operating_mode = a.operating_mode)
+            """
+
+        query = f"""
         DELETE FROM job_offers
-        WHERE rowid NOT IN (
-            SELECT a.rowid
-            FROM job_offers a
-            JOIN (
-                SELECT 
-                    title,
-                    company,
-                    category,
-                    location,
-                    source,
-                    link,
-                    operating_mode,
-                    MAX(date_add) AS max_date
-                FROM job_offers
-                GROUP BY title, company, category, location, source, link, operating_mode
-            ) b
-              ON a.title = b.title
-             AND a.company = b.company
-             AND a.category = b.category
-             AND a.location = b.location
-             AND a.source = b.source
-             AND a.link = b.link
-             AND a.operating_mode = b.operating_mode
-             AND a.date_add = b.max_date
+        WHERE id IN (
+            SELECT id
+            FROM (
+                SELECT
+                    id,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY title, company, category, location, source, link, operating_mode
+                        ORDER BY date_add DESC, id DESC
+                    ) AS row_number
+                FROM {offers}
+            )
+            WHERE row_number > 1
         );
         """
         try:
             self.cursor.execute(query)
+            removed = self.cursor.rowcount
+            self.cursor.execute("DELETE FROM dedup_queue;")
             self.connection.commit()
             self.logger.info(
-                "Older duplicates have been removed successfully.")
+                f"Older duplicates have been removed successfully: {removed} offers.")
+
+            return removed
         except Exception as e:
             self.logger.error(f"Error while removing duplicates: {e}")
 
-    def create_temp_table(self):
+            return None
+
+    @_synchronized
+    def normalize_stored_dates(self):
         """
-        Deletes the temporary table, if it exists, and then creates an empty table
-        with the same structure as 'job_offers'.
+        Converts 'date_add' of offers saved in another format into the canonical one (see normalize_date()).
+        New offers are normalized when they are inserted, this is needed only for older databases.
         """
         try:
-            self.cursor.execute("DROP TABLE IF EXISTS job_offers_temp;")
-
-            # We will create an empty temporary table based on job_offers (without data)
-            # Method 1: CREATE TABLE ... AS SELECT (without moving the records)
-            create_temp = """
-                CREATE TABLE job_offers_temp AS
-                SELECT *
-                FROM job_offers
-                WHERE 1=0;
-            """
-            self.cursor.execute(create_temp)
-            # self.cursor.execute("CREATE INDEX idx_offers_category ON job_offers (category);")
-            # self.cursor.execute("CREATE INDEX idx_offers_date_add ON job_offers (date_add);")
-            # self.cursor.execute("CREATE INDEX idx_offers_experience ON job_offers (experience);")
-            # self.cursor.execute("CREATE INDEX idx_offers_location ON job_offers (location);")
+            self.connection.create_function("normalize_date", 1, normalize_date, deterministic=True)
+            self.cursor.execute("""
+                UPDATE job_offers
+                SET date_add = normalize_date(date_add)
+                WHERE date_add IS NOT normalize_date(date_add);
+            """)
+            self.connection.commit()
+            self.logger.info(f"Dates of {self.cursor.rowcount} offers have been normalized.")
+        except sqlite3.Error as e:
+            self.logger.error(f"Error while normalizing dates: {e}")
+
+    @_synchronized
+    def rebuild_offer_skills(self):
+        """
+        Fills the 'technologies' and 'offer_skills' tables again from the tech_stack of all offers.
+        They are normally kept in sync by the triggers on 'job_offers'.
+        """
+        try:
+            self.cursor.execute("DELETE FROM offer_skills;")
+            # The tech stacks are parsed once, for both the dictionary and the skills
+            self.cursor.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS offer_skills_stage (offer_id INTEGER, name TEXT, level INTEGER);
+            """)
+            self.cursor.execute("DELETE FROM offer_skills_stage;")
+            self.cursor.execute("""
+                INSERT INTO offer_skills_stage (offer_id, name, level)
+                SELECT o.id, j.key, CAST(j.value AS INT)
+                FROM job_offers o
+                         CROSS JOIN JSON_EACH(CASE WHEN JSON_VALID(o.tech_stack) THEN o.tech_stack END) j;
+            """)
+            self.cursor.execute(
+                "INSERT OR IGNORE INTO technologies (name) SELECT DISTINCT name FROM offer_skills_stage;")
+            self.cursor.execute("""
+                INSERT OR REPLACE INTO offer_skills (offer_id, tech_id, level)
+                SELECT s.offer_id, t.id, s.level
+                FROM offer_skills_stage s
+                         JOIN technologies t ON t.name = s.name;
+            """)
+            self.cursor.execute("DELETE FROM offer_skills_stage;")
+            self.connection.commit()
+            self.logger.info("The 'offer_skills' table has been rebuilt.")
+        except sqlite3.Error as e:
+            self.logger.error(f"Error while rebuilding the 'offer_skills' table: {e}")
+
+    @_synchronized
+    def rebuild_offer_salaries(self):
+        """
+        Fills the 'offer_salaries' table again from the salary of all offers.
+        It is normally kept in sync by the triggers on 'job_offers'.
+        """
+        try:
+            self.cursor.execute("DELETE FROM offer_salaries;")
+            self.cursor.execute("""
+                INSERT OR REPLACE INTO offer_salaries (offer_id, contract_type, salary_from, salary_to, currency)
+                SELECT o.id,
+                       j.key,
+                       JSON_EXTRACT(j.value, '$.from'),
+                       JSON_EXTRACT(j.value, '$.to'),
+                       UPPER(JSON_EXTRACT(j.value, '$.currency'))
+                FROM job_offers o
+                         CROSS JOIN JSON_EACH(CASE WHEN JSON_VALID(o.salary) THEN o.salary END) j
+                WHERE j.type = 'object';
+            """)
+            self.connection.commit()
+            self.logger.info("The 'offer_salaries' table has been rebuilt.")
+        except sqlite3.Error as e:
+            self.logger.error(f"Error while rebuilding the 'offer_salaries' table: {e}")
+
+    @_synchronized
+    def rebuild_rollups(self):
+        """
+        Fills the rollup tables ('offer_groups', 'offers_rollup', 'salaries_rollup', 'skills_rollup') again
+        from all offers. They are normally kept up to date by the triggers on 'job_offers'.
+        """
+        group_key = "JSON_ARRAY(SUBSTR(o.date_add, 1, 7), o.category, o.location, o.experience, o.operating_mode)"
+
+        try:
+            for table in ("offers_rollup", "salaries_rollup", "skills_rollup", "offer_groups"):
+                self.cursor.execute(f"DELETE FROM {table};")
+
+            self.cursor.execute(f"""
+                INSERT INTO offer_groups (group_key, month, category, location, experience, operating_mode)
+                SELECT {group_key}, SUBSTR(o.date_add, 1, 7), o.category, o.location, o.experience, o.operating_mode
+                FROM job_offers o
+                GROUP BY {group_key};
+            """)
+            # The group of every offer is looked up once, the rollups are counted from this mapping
+            self.cursor.execute("CREATE TEMP TABLE IF NOT EXISTS offer_group_ids (offer_id INTEGER, group_id INTEGER);")
+            self.cursor.execute("DELETE FROM offer_group_ids;")
+            self.cursor.execute(f"""
+                INSERT INTO offer_group_ids (offer_id, group_id)
+                SELECT o.id, g.id
+                FROM job_offers o
+                         JOIN offer_groups g ON g.group_key = {group_key};
+            """)
+            self.cursor.execute("""
+                INSERT INTO offers_rollup (group_id, total_offers)
+                SELECT group_id, COUNT(*)
+                FROM offer_group_ids
+                GROUP BY group_id;
+            """)
+            self.cursor.execute("""
+                INSERT INTO salaries_rollup (group_id, contract_type, currency, total_offers, salary_sum)
+                SELECT o.group_id, s.contract_type, s.currency, COUNT(*), SUM(ROUND((s.salary_from + s.salary_to) / 2))
+                FROM offer_group_ids o
+                         JOIN offer_salaries s ON s.offer_id = o.offer_id
+                          AND s.salary_from IS NOT NULL
+                          AND s.salary_to IS NOT NULL
+                          AND s.currency IS NOT NULL
+                GROUP BY o.group_id, s.contract_type, s.currency;
+            """)
+            self.cursor.execute("""
+                INSERT INTO skills_rollup (group_id, tech_id, level, total_offers)
+                SELECT o.group_id, s.tech_id, IFNULL(s.level, -1), COUNT(*)
+                FROM offer_group_ids o
+                         JOIN offer_skills s ON s.offer_id = o.offer_id
+                GROUP BY o.group_id, s.tech_id, IFNULL(s.level, -1);
+            """)
+            self.cursor.execute("DELETE FROM offer_group_ids;")
+            self.connection.commit()
+            self.logger.info("The rollup tables have been rebuilt.")
+        except sqlite3.Error as e:
+            self.logger.error(f"Error while rebuilding the rollup tables: {e}")
+
+    @_synchronized
+    def get_manifest(self):
+        """
+        Returns the source files already loaded by the ETL as a dictionary:
+        path -> {'size', 'mtime', 'content_hash', 'rows', 'processed_at'}.
+        """
+        try:
+            self.cursor.execute(
+                "SELECT path, size, mtime, content_hash, rows, processed_at FROM etl_manifest;")
+
+            return {
+                path: {'size': size, 'mtime': mtime, 'content_hash': content_hash,
+                       'rows': rows, 'processed_at': processed_at}
+                for path, size, mtime, content_hash, rows, processed_at in self.cursor.fetchall()
+            }
+        except sqlite3.Error as e:
+            self.logger.error(f"Error while reading the ETL manifest: {e}")
+
+            return {}
+
+    @_synchronized
+    def update_manifest(self, path, size, mtime, content_hash, rows):
+        """
+        Records (or refreshes) a source file loaded by the ETL in the manifest.
+        """
+        query = """
+            INSERT INTO etl_manifest (path, size, mtime, content_hash, rows, processed_at)
+            VALUES (?, ?, ?, ?, ?, DATETIME('now'))
+            ON CONFLICT (path)
+            DO UPDATE SET size         = excluded.size,
+                          mtime        = excluded.mtime,
+                          content_hash = excluded.content_hash,
+                          rows         = excluded.rows,
+                          processed_at = excluded.processed_at;
+        """
+        try:
+            self.cursor.execute(query, (path, size, mtime, content_hash, rows))
             self.connection.commit()
-            self.logger.debug("Temporary table 'job_offers_temp' was created successfully!")
+            self.logger.debug(f"The file {path} has been recorded in the ETL manifest.")
         except sqlite3.Error as e:
-            self.logger.error(f"Error while creating temp table: {e}")
+            self.logger.error(f"Error while updating the ETL manifest: {e}")
 
+    @_synchronized
+    def set_filters(self, filters=None):
+        """
+        Sets the filters used by the get_* methods when they are called without their own filters.
+        Nothing is copied, every method pushes the filters down into its own SQL statement.
+        """
+        self.filters = filters or OfferFilter()
+        self.logger.debug(f"Filters were set: {self.filters}")
+
+    @_synchronized
     def fill_temp_table_with_filters(
             self,
             date_from=None,
@@ -327,208 +1041,308 @@ class Database:
             operating_modes=None
     ):
         """
-        Clears the temporary table (or creates it right away)
-        and inserts records from 'job_offers' into it,
-        taking into account the passed filters in the WHERE clause.
+        Kept for compatibility: sets the filters used by the get_* methods (see set_filters()).
+        Records are no longer copied into the 'job_offers_temp' table.
         """
-        # Optionally, you can call create_temp_table() again each time:
-        self.create_temp_table()
-        # Now we are dynamically building a WHERE clause.
-        conditions = []
-        params = []
+        self.set_filters(OfferFilter(date_from, date_to, categories, locations, positions, experiences,
+                                     operating_modes))
 
-        if date_from:
-            conditions.append("DATE(date_add) >= DATE(?)")
-            params.append(date_from)
+    def _read_filtered(self, query, filters=None, limit=None, alias=None, rollup_query=None, query_params=()):
+        # The queries have to contain {where} and {limit} placeholders.
+        # rollup_query reads the rollup tables, with 'offer_groups' aliased as 'g'.
+        # query_params are the parameters of the query placed before the WHERE clause.
+        filters = filters or self.filters
+        rollup_clause = filters.rollup_where_clause("g") if rollup_query and self.use_rollups else None
 
-        if date_to:
-            conditions.append("DATE(date_add) <= DATE(?)")
-            params.append(date_to)
+        if rollup_clause is not None:
+            query = rollup_query
+            where_clause, params = rollup_clause
+        else:
+            where_clause, params = filters.where_clause(alias)
 
-        if categories and len(categories) > 0:
-            placeholders = ",".join(["?"] * len(categories))
-            conditions.append(f"category IN ({placeholders})")
-            params.extend(categories)
+        params = list(query_params) + params
+        limit_clause = ""
 
-        if locations and len(locations) > 0:
-            placeholders = ",".join(["?"] * len(locations))
-            conditions.append(f"location IN ({placeholders})")
-            params.extend(locations)
+        if limit is not None:
+            limit_clause = "LIMIT ?"
+            params.append(limit)
 
-        if positions and len(positions) > 0:
-            placeholders = ",".join(["?"] * len(positions))
-            conditions.append(f"location IN ({placeholders})")
-            params.extend(positions)
+        query = query.format(where=where_clause, limit=limit_clause)
+        key = (query, filters.cache_key(), limit, tuple(query_params))
+        df, version = self._cache_get(key)
 
-        if experiences and len(experiences) > 0:
-            placeholders = ",".join(["?"] * len(experiences))
-            conditions.append(f"experience IN ({placeholders})")
-            params.extend(experiences)
+        if df is None:
+            self.logger.debug(f"Query: {query}")
 
-        if operating_modes and len(operating_modes) > 0:
-            placeholders = ",".join(["?"] * len(operating_modes))
-            conditions.append(f"operating_mode IN ({placeholders})")
-            params.extend(operating_modes)
+            with self._read_connection() as connection:
+                df = pd.read_sql_query(query, connection, params=params)
 
-        where_clause = ""
-        if conditions:
-            where_clause = "WHERE " + " AND ".join(conditions)
+            self._cache_put(key, df, version)
 
-        insert_query = f"""
-            INSERT INTO job_offers_temp
-            SELECT *
-            FROM job_offers
-            {where_clause};
-        """
-        self.logger.debug(f"Query: {insert_query}")
+        # Copies, so changing a returned DataFrame does not change the cached one
+        return df.copy()
 
-        try:
-            self.cursor.execute(insert_query, params)
-            self.connection.commit()
-            self.logger.debug("Temp table was filled with filtered data.")
-        except sqlite3.Error as e:
-            self.logger.error(f"Error while filling temp table: {e}")
+    def _data_version(self):
+        # data_version changes after commits of other connections, total_changes after writes of this one
+        if self._version_connection is not None:
+            return self._version_connection.execute("PRAGMA data_version;").fetchone()[0]
 
-    def get_unique_categories(self):
-        query = """
-            SELECT DISTINCT category
-            FROM job_offers
-            WHERE category IS NOT NULL
-            ORDER BY category;
-        """
-        df = pd.read_sql_query(query, self.connection)
+        with self._write_lock:
+            return self.connection.execute("PRAGMA data_version;").fetchone()[0], self.connection.total_changes
 
-        # We return a list of categories
-        return df['category'].tolist()
+    def _cache_get(self, key):
+        # Returns the cached result (None if missing) and the data version it belongs to,
+        # a result read afterwards is cached only under the same version, see _cache_put()
+        if not self.cache_size:
+            return None, None
 
-    def get_unique_locations(self):
-        query = """
-            SELECT DISTINCT location
-            FROM job_offers
-            WHERE location IS NOT NULL
-            ORDER BY location;
-        """
-        df = pd.read_sql_query(query, self.connection)
+        with self._cache_lock:
+            version = self._data_version()
 
-        return df['location'].tolist()
+            if version != self._cache_version:
+                self._cache.clear()
+                self._cache_version = version
 
-    def get_unique_positions(self):
-        query = """
-            SELECT DISTINCT position
-            FROM job_offers
-            WHERE position IS NOT NULL
-            ORDER BY position;
+            df = self._cache.get(key)
+
+            if df is None:
+                self._cache_misses += 1
+            else:
+                self._cache_hits += 1
+                self._cache.move_to_end(key)
+
+        return df, version
+
+    def _cache_put(self, key, df, version):
+        if not self.cache_size:
+            return
+
+        with self._cache_lock:
+            # In pooled mode a reader may have read an older snapshot while a writer committed,
+            # such a result is not cached
+            if version != self._cache_version:
+                return
+
+            self._cache[key] = df
+
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def cache_info(self):
+        """
+        Returns statistics of the query-result cache: hits, misses, current and maximum size.
         """
-        df = pd.read_sql_query(query, self.connection)
+        return {'hits': self._cache_hits, 'misses': self._cache_misses,
+                'size': len(self._cache), 'max_size': self.cache_size}
 
-        return df['position'].tolist()
+    def clear_cache(self):
+        """
+        Empties the query-result cache and resets its statistics.
+        """
+        with self._cache_lock:
+            self._cache.clear()
+            self._cache_hits = self._cache_misses = 0
 
-    def get_unique_experiences(self):
+    def fetch_offers(self, filters=None, limit=None):
+        """
+        Returns offers matching the filters (by default the ones set by set_filters()), newest first.
+        """
         query = """
-            SELECT DISTINCT experience
-            FROM job_offers
-            WHERE experience IS NOT NULL
-            ORDER BY experience;
+        SELECT *
+        FROM job_offers
+        {where}
+        ORDER BY date_add DESC
+        {limit};
         """
-        df = pd.read_sql_query(query, self.connection)
 
-        return df['experience'].tolist()
+        return self._read_filtered(query, filters, limit)
 
-    def get_unique_operating_modes(self):
-        query = """
-            SELECT DISTINCT operating_mode
-            FROM job_offers
-            WHERE operating_mode IS NOT NULL
-            ORDER BY operating_mode;
+    def get_facets(self, with_counts=False):
+        """
+        Returns the distinct values of every filter, keyed like the arguments of OfferFilter:
+        'categories', 'locations', 'positions', 'experiences' and 'operating_modes'.
+        Values are sorted lists, or dictionaries value -> number of offers with with_counts=True.
+
+        All facets are read in one statement, from the rollups and the partial index on positions,
+        and cached until the data changes.
         """
-        df = pd.read_sql_query(query, self.connection)
+        key = ('facets',)
+        facets, version = self._cache_get(key)
+
+        if facets is None:
+            rollup_facet = """
+                SELECT '{name}', g.{column}, SUM(r.total_offers)
+                FROM offers_rollup r
+                         JOIN offer_groups g ON g.id = r.group_id
+                WHERE g.{column} IS NOT NULL
+                GROUP BY g.{column}
+            """
+            query = " UNION ALL ".join(
+                [rollup_facet.format(name=name, column=column)
+                 for name, column in OfferFilter.columns.items() if name != 'positions'] +
+                ["SELECT 'positions', position, COUNT(*) FROM job_offers WHERE position IS NOT NULL GROUP BY position"]
+            ) + " ORDER BY 1, 2;"
+
+            facets = {name: {} for name in OfferFilter.columns}
 
-        return df['operating_mode'].tolist()
+            try:
+                with self._read_connection() as connection:
+                    for name, value, total_offers in connection.execute(query):
+                        facets[name][value] = total_offers
+            except sqlite3.Error as e:
+                self.logger.error(f"Error while reading facets: {e}")
 
-    def get_offers_by_location(self):
+                return {name: {} if with_counts else [] for name in OfferFilter.columns}
+
+            self._cache_put(key, facets, version)
+
+        if with_counts:
+            return {name: dict(counts) for name, counts in facets.items()}
+
+        return {name: list(counts) for name, counts in facets.items()}
+
+    def get_unique_categories(self):
+        return self.get_facets()['categories']
+
+    def get_unique_locations(self):
+        return self.get_facets()['locations']
+
+    def get_unique_positions(self):
+        return self.get_facets()['positions']
+
+    def get_unique_experiences(self):
+        return self.get_facets()['experiences']
+
+    def get_unique_operating_modes(self):
+        return self.get_facets()['operating_modes']
+
+    def get_offers_by_location(self, filters=None, limit=None):
         query = """
         SELECT location, COUNT(*) AS total_offers
-        FROM job_offers_temp
+        FROM job_offers
+        {where}
         GROUP BY location
-        ORDER BY total_offers DESC;
+        ORDER BY total_offers DESC
+        {limit};
         """
-        df = pd.read_sql_query(query, self.connection)
 
-        return df
+        rollup_query = """
+        SELECT g.location, SUM(r.total_offers) AS total_offers
+        FROM offers_rollup r
+                 JOIN offer_groups g ON g.id = r.group_id
+        {where}
+        GROUP BY g.location
+        ORDER BY total_offers DESC
+        {limit};
+        """
+
+        return self._read_filtered(query, filters, limit, rollup_query=rollup_query)
 
-    def get_offers_by_experience(self):
+    def get_offers_by_experience(self, filters=None, limit=None):
         query = """
         SELECT experience, COUNT(*) AS total_offers
-        FROM job_offers_temp
+        FROM job_offers
+        {where}
         GROUP BY experience
-        ORDER BY total_offers DESC;
+        ORDER BY total_offers DESC
+        {limit};
         """
-        df = pd.read_sql_query(query, self.connection)
 
-        return df
+        rollup_query = """
+        SELECT g.experience, SUM(r.total_offers) AS total_offers
+        FROM offers_rollup r
+                 JOIN offer_groups g ON g.id = r.group_id
+        {where}
+        GROUP BY g.experience
+        ORDER BY total_offers DESC
+        {limit};
+        """
+
+        return self._read_filtered(query, filters, limit, rollup_query=rollup_query)
 
-    def get_avg_salary_by_experience_and_currency(self):
+    def get_avg_salary_by_experience_and_currency(self, filters=None, limit=None):
         query = """
-        WITH combined AS (
-          SELECT 
-            experience,
-            UPPER(JSON_EXTRACT(salary, '$.b2b.currency')) AS currency,
-            ROUND((JSON_EXTRACT(salary, '$.b2b.from') + JSON_EXTRACT(salary, '$.b2b.to')) / 2) AS b2b_value,
-            NULL AS permanent_value
-          FROM job_offers_temp
-          WHERE salary IS NOT NULL
-            AND JSON_EXTRACT(salary, '$.b2b.from') IS NOT NULL
-            AND JSON_EXTRACT(salary, '$.b2b.to') IS NOT NULL
-            AND JSON_EXTRACT(salary, '$.b2b.currency') IS NOT NULL
-          UNION ALL
-          SELECT 
-            experience,
-            UPPER(JSON_EXTRACT(salary, '$.permanent.currency')) AS currency,
-            NULL AS b2b_value,
-            ROUND((JSON_EXTRACT(salary, '$.permanent.from') + JSON_EXTRACT(salary, '$.permanent.to')) / 2) 
-                AS permanent_value
-          FROM job_offers_temp
-          WHERE salary IS NOT NULL
-            AND JSON_EXTRACT(salary, '$.permanent.from') IS NOT NULL
-            AND JSON_EXTRACT(salary, '$.permanent.to') IS NOT NULL
-            AND JSON_EXTRACT(salary, '$.permanent.currency') IS NOT NULL
-        )
-        SELECT 
-          experience,
-          currency,
-          ROUND(AVG(b2b_value)) AS avg_b2b_salary,
-          ROUND(AVG(permanent_value)) AS avg_permanent_salary
-        FROM combined
-        GROUP BY experience, currency;
-        """
-        df = pd.read_sql_query(query, self.connection)
+        SELECT o.experience,
+               s.currency,
+               ROUND(AVG(CASE WHEN s.contract_type = 'b2b'
+                              THEN ROUND((s.salary_from + s.salary_to) / 2) END)) AS avg_b2b_salary,
+               ROUND(AVG(CASE WHEN s.contract_type = 'permanent'
+                              THEN ROUND((s.salary_from + s.salary_to) / 2) END)) AS avg_permanent_salary
+        FROM job_offers o
+                 JOIN offer_salaries s ON s.offer_id = o.id
+                  AND s.contract_type IN ('b2b', 'permanent')
+                  AND s.salary_from IS NOT NULL
+                  AND s.salary_to IS NOT NULL
+                  AND s.currency IS NOT NULL
+        {where}
+        GROUP BY o.experience, s.currency
+        {limit};
+        """
 
-        return df
+        rollup_query = """
+        SELECT g.experience,
+               r.currency,
+               ROUND(SUM(CASE WHEN r.contract_type = 'b2b' THEN r.salary_sum END) /
+                     SUM(CASE WHEN r.contract_type = 'b2b' THEN r.total_offers END)) AS avg_b2b_salary,
+               ROUND(SUM(CASE WHEN r.contract_type = 'permanent' THEN r.salary_sum END) /
+                     SUM(CASE WHEN r.contract_type = 'permanent' THEN r.total_offers END)) AS avg_permanent_salary
+        FROM salaries_rollup r
+                 JOIN offer_groups g ON g.id = r.group_id
+                  AND r.contract_type IN ('b2b', 'permanent')
+        {where}
+        GROUP BY g.experience, r.currency
+        {limit};
+        """
+
+        return self._read_filtered(query, filters, limit, alias="o", rollup_query=rollup_query)
 
-    def get_offers_by_year_month(self):
+    def get_offers_by_year_month(self, filters=None, limit=None):
         query = """
-        SELECT STRFTIME('%Y-%m', date_add) AS year_month,
+        SELECT SUBSTR(date_add, 1, 7) AS year_month,
                COUNT(*) AS total_offers
-        FROM job_offers_temp
-        GROUP BY STRFTIME('%Y-%m', date_add)
-        ORDER BY year_month;
+        FROM job_offers
+        {where}
+        GROUP BY SUBSTR(date_add, 1, 7)
+        ORDER BY year_month
+        {limit};
         """
-        df = pd.read_sql_query(query, self.connection)
 
-        return df
+        rollup_query = """
+        SELECT g.month AS year_month,
+               SUM(r.total_offers) AS total_offers
+        FROM offers_rollup r
+                 JOIN offer_groups g ON g.id = r.group_id
+        {where}
+        GROUP BY g.month
+        ORDER BY year_month
+        {limit};
+        """
+
+        return self._read_filtered(query, filters, limit, rollup_query=rollup_query)
 
-    def get_offers_by_operating_mode(self):
+    def get_offers_by_operating_mode(self, filters=None, limit=None):
         query = """
         SELECT operating_mode, COUNT(*) AS total_offers
-        FROM job_offers_temp
+        FROM job_offers
+        {where}
         GROUP BY operating_mode
-        ORDER BY total_offers DESC;
+        ORDER BY total_offers DESC
+        {limit};
         """
-        df = pd.read_sql_query(query, self.connection)
 
-        return df
+        rollup_query = """
+        SELECT g.operating_mode, SUM(r.total_offers) AS total_offers
+        FROM offers_rollup r
+                 JOIN offer_groups g ON g.id = r.group_id
+        {where}
+        GROUP BY g.operating_mode
+        ORDER BY total_offers DESC
+        {limit};
+        """
+
+        return self._read_filtered(query, filters, limit, rollup_query=rollup_query)
 
-    def get_technology_with_levels_sorted(self):
+    def get_technology_with_levels_sorted(self, filters=None, limit=None):
         """
         Returns a DataFrame with columns:
           - technology
@@ -539,30 +1353,100 @@ class Database:
         and within technologies, levels are also sorted in descending order.
         """
         query = """
-        WITH skill_count AS (SELECT json_each.key AS technology,
-                                    CAST(json_each.value AS INT) AS skill_level,
-                                    COUNT(*) AS total_offers
-                             FROM job_offers_temp
-                                      CROSS JOIN JSON_EACH(job_offers_temp.tech_stack)
-                             GROUP BY json_each.key, json_each.value
-            ),
-             tech_count AS (SELECT json_each.key AS technology,
-                                   COUNT(*) AS total_offers
-                            FROM job_offers_temp
-                                     CROSS JOIN JSON_EACH(job_offers_temp.tech_stack)
-                            GROUP BY json_each.key
-            )
-        SELECT s.technology,
-               s.skill_level,
-               s.total_offers,
-               t.total_offers AS total_for_tech
-        FROM skill_count s
-                 JOIN tech_count t ON s.technology = t.technology
-        ORDER BY t.total_offers DESC, s.total_offers DESC;
+        SELECT t.name AS technology,
+               s.level AS skill_level,
+               COUNT(*) AS total_offers,
+               SUM(COUNT(*)) OVER (PARTITION BY s.tech_id) AS total_for_tech
+        FROM job_offers o
+                 JOIN offer_skills s ON s.offer_id = o.id
+                 JOIN technologies t ON t.id = s.tech_id
+        {where}
+        GROUP BY s.tech_id, s.level
+        ORDER BY total_for_tech DESC, total_offers DESC
+        {limit};
         """
-        df = pd.read_sql_query(query, self.connection)
 
-        return df
+        rollup_query = """
+        SELECT t.name AS technology,
+               NULLIF(r.level, -1) AS skill_level,
+               SUM(r.total_offers) AS total_offers,
+               SUM(SUM(r.total_offers)) OVER (PARTITION BY r.tech_id) AS total_for_tech
+        FROM skills_rollup r
+                 JOIN offer_groups g ON g.id = r.group_id
+                 JOIN technologies t ON t.id = r.tech_id
+        {where}
+        GROUP BY r.tech_id, r.level
+        ORDER BY total_for_tech DESC, total_offers DESC
+        {limit};
+        """
+
+        return self._read_filtered(query, filters, limit, alias="o", rollup_query=rollup_query)
+
+    def get_technologies_with(self, technology, filters=None, limit=None):
+        """
+        Returns the technologies required together with the given one, e.g. "Python".
+
+        :return: DataFrame with columns: technology, total_offers (offers requiring both technologies),
+                 sorted by total_offers descending.
+        """
+        query = """
+        SELECT t.name AS technology,
+               COUNT(*) AS total_offers
+        FROM technologies x
+                 JOIN offer_skills a ON a.tech_id = x.id AND x.name = ?
+                 JOIN job_offers o ON o.id = a.offer_id
+                 JOIN offer_skills b ON b.offer_id = a.offer_id AND b.tech_id <> a.tech_id
+                 JOIN technologies t ON t.id = b.tech_id
+        {where}
+        GROUP BY b.tech_id
+        ORDER BY total_offers DESC, technology
+        {limit};
+        """
+
+        return self._read_filtered(query, filters, limit, alias="o", query_params=(technology,))
+
+    def get_technology_cooccurrence(self, filters=None, top=20):
+        """
+        Returns the co-occurrence matrix of the most popular technologies in the filtered offers:
+        a square DataFrame, technology x technology, with the number of offers requiring both of them.
+        The diagonal holds the number of offers requiring the technology.
+
+        The (offer, technology) pairs are read once, and the pairs of technologies of every offer are counted
+        by NumPy with np.bincount on chunks of offers. Results are cached per filters.
+
+        :param top: Number of technologies, the most frequent ones.
+        """
+        filters = filters or self.filters
+        key = ('cooccurrence', filters.cache_key(), top)
+        matrix, version = self._cache_get(key)
+
+        if matrix is None:
+            where_clause, params = filters.where_clause("o")
+            query = f"""
+                SELECT s.offer_id, s.tech_id
+                FROM job_offers o
+                         JOIN offer_skills s ON s.offer_id = o.id
+                {where_clause}
+                ORDER BY s.offer_id;
+            """
+
+            with self._read_connection() as connection:
+                pairs = np.array(connection.execute(query, params).fetchall(), dtype=np.int64).reshape(-1, 2)
+                names = dict(connection.execute("SELECT id, name FROM technologies;").fetchall())
+
+            matrix = _cooccurrence_matrix(pairs, top, names)
+            self._cache_put(key, matrix, version)
+
+        return matrix.copy()
 
     def close_connection(self):
+        for writer in self._writers:
+            writer.flush()
+
         self.connection.close()
+
+        while not self._readers.empty():
+            self._readers.get().close()
+
+        if self._version_connection is not None:
+            self._version_connection.close()
@@ -1,14 +1,329 @@
+import bisect
 import json
 import os
 import re
 
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.filter import ElementFilter
 
+SALARY_PATTERN = re.compile(r'(\d[\d\s]*\d)\s*-\s*(\d[\d\s]*\d)\s*(\w+)')
+CONTRACT_PATTERN = re.compile(r'-\s*(\w+)$')
+PUBLISHED_AT_PATTERN = re.compile(r'\\"publishedAt\\":\\"(.*?)\\"')
+SAVED_FROM_PATTERN = re.compile(r'Saved from\s*(http[^\s<>"]*)')
 
-def find_original_url(file_path):
-    with open(file_path, "r", encoding="utf-8") as file:
-        soup = BeautifulSoup(file, "html.parser")
+# Comments and elements whose content is not markup, tags inside them are not elements of the page
+RAW_TEXT_START_PATTERN = re.compile(r'<!--|<(script|style|textarea)\b', re.I)
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+# Start of the chunks of the embedded state of Next.js pages, followed by an escaped JSON string
+NEXT_F_PUSH = "self.__next_f.push([1,"
+JSON_DECODER = json.JSONDecoder()
+
+# Labels of the 'details' elements -> (column, whether the value is lowercased)
+DETAILS_COLUMNS = {
+    "Type of work": ("type", False),
+    "Experience": ("experience", True),
+    "Employment Type": ("employment", True),
+    "Operating mode": ("operating_mode", True)
+}
+
+
+def _embedded_payloads(text, key):
+    # The page itself (e.g. __NEXT_DATA__) and the decoded Next.js chunks containing the key
+    yield text
+
+    escaped_key = f'\\"{key}\\"'
+    position = text.find(escaped_key)
+
+    while position != -1:
+        start = text.rfind(NEXT_F_PUSH, 0, position)
+
+        if start == -1:
+            return
+
+        try:
+            payload, end = JSON_DECODER.raw_decode(text, start + len(NEXT_F_PUSH))
+        except ValueError:
+            return
+
+        if isinstance(payload, str):
+            yield payload
+
+        position = text.find(escaped_key, max(end, position + 1))
+
+
+def find_embedded_object(text, key, required=()):
+    """
+    Returns the first JSON object embedded in a page, which has the key and all the required keys, or None.
+
+    The object is the innermost one around an occurrence of the key, decoded from the nearest '{' before it
+    which opens an object reaching past the key.
+    """
+    for payload in _embedded_payloads(text, key):
+        position = payload.find(f'"{key}"')
+
+        while position != -1:
+            start = payload.rfind("{", 0, position)
+
+            while start != -1:
+                try:
+                    candidate, end = JSON_DECODER.raw_decode(payload, start)
+                except ValueError:
+                    candidate, end = None, start
+
+                if end > position:
+                    if isinstance(candidate, dict) and key in candidate and all(k in candidate for k in required):
+                        return candidate
+
+                    break
+
+                start = payload.rfind("{", 0, start)
+
+            position = payload.find(f'"{key}"', position + 1)
+
+    return None
+
+
+def justjoin_embedded_offer(text, tech_levels):
+    """
+    Maps the offer embedded in a justjoin.it page to the columns of 'job_offers', like transform() in etl.py:
+    salary per employment type, skills with levels and the workplace type. Both the camelCase state
+    of the pages and the snake_case keys of the Kaggle files are read.
+
+    :return: Dictionary of columns, with 'link' built from the slug, or None if the page has no offer state.
+    """
+    offer = find_embedded_object(text, "publishedAt", ("title",)) or \
+        find_embedded_object(text, "published_at", ("title",))
+
+    if offer is None:
+        return None
+
+    def get(*keys):
+        return next((offer[key] for key in keys if offer.get(key) is not None), None)
+
+    salary = {}
+    employment_types = []
+
+    for emp in get('employmentTypes', 'employment_types') or []:
+        emp_type = emp.get('type') or ''
+        # Kaggle files nest the salary, the pages keep it in the employment type
+        emp_salary = emp.get('salary') if 'salary' in emp else emp
+
+        if emp_salary:
+            salary[emp_type] = {'from': emp_salary.get('from'), 'to': emp_salary.get('to'),
+                                'currency': emp_salary.get('currency')}
+        else:
+            salary[emp_type] = {'from': None, 'to': None, 'currency': None}
+
+        employment_types.append(emp_type)
+
+    skills = {skill['name']: skill.get('level') for skill in get('requiredSkills', 'skills') or []}
+    # Nice-to-have skills have the level of 'nice to have' on the page
+    skills.update({skill['name']: tech_levels.get("nice to have", 1)
+                   for skill in get('niceToHaveSkills') or [] if skill['name'] not in skills})
+
+    category = get('marker_icon', 'markerIcon', 'category') or ''
+    slug = get('slug', 'id')
+
+    return {
+        'title': offer['title'],
+        'company': get('companyName', 'company_name'),
+        'location': (get('city') or '').lower(),
+        'category': (category.get('key', '') if isinstance(category, dict) else str(category)).lower(),
+        'date_add': (get('publishedAt', 'published_at') or '').lower().replace('t', ' ').replace('z', ''),
+        'salary': json.dumps(salary),
+        'experience': (get('experienceLevel', 'experience_level') or '').lower(),
+        'employment': ', '.join(employment_types).lower(),
+        'operating_mode': (get('workplaceType', 'workplace_type') or '').lower(),
+        'tech_stack': json.dumps(skills),
+        'link': f"https://justjoin.it/job-offer/{slug}" if slug else None
+    }
+
+
+# Site -> function reading the offer embedded in the raw page, the DOM is parsed only when it returns None
+EMBEDDED_OFFER_EXTRACTORS = {
+    "justjoin.it": justjoin_embedded_offer
+}
+
+
+def _raw_text_ranges(text):
+    # (start, end) of the comments and the raw text elements of a page, in the order of the page
+    ranges = []
+    match = RAW_TEXT_START_PATTERN.search(text)
+
+    while match:
+        closing = "-->" if match.group(1) is None else f"</{match.group(1).lower()}"
+        end = text.find(closing, match.end())
+
+        if end == -1 and match.group(1):
+            end_match = re.compile(re.escape(closing), re.I).search(text, match.end())
+            end = end_match.start() if end_match else -1
+
+        end = len(text) if end == -1 else text.find(">", end) + 1 or len(text)
+        ranges.append((match.start(), end))
+        match = RAW_TEXT_START_PATTERN.search(text, end)
+
+    return ranges
+
+
+class AnyStrainer(ElementFilter):
+    """
+    Parse filter keeping the elements matched by any of the strainers, together with their descendants.
+
+    elements are the (tag, attribute, value) triples matched by the strainers. With them, slice() cuts a page
+    down to those elements before it is parsed, html.parser then tokenizes only them instead of the whole page.
+    """
+
+    def __init__(self, strainers, elements=None):
+        super().__init__()
+        self.strainers = strainers
+        self._start_tags = None
+        self._end_tags = {}
+
+        # A value is needed to find the elements in the raw text, without one the whole page is parsed
+        if elements and all(value for _, _, value in elements):
+            self._start_tags = [(value, self._start_tag_pattern(tag, attribute, value))
+                                for tag, attribute, value in elements]
+
+    @staticmethod
+    def _start_tag_pattern(tag, attribute, value):
+        # Start tags with the value in the attribute, the strainers check whether it is the whole value
+        name = re.escape(tag) if tag else r'[a-z][\w:-]*'
+        value = re.escape(value)
+
+        return re.compile(rf'<({name})\b[^>]*?\s{re.escape(attribute)}\s*=\s*'
+                          rf'(?:"[^"]*?{value}[^"]*"|\'[^\']*?{value}[^\']*\')[^>]*>', re.I)
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return any(strainer.allow_tag_creation(nsprefix, name, attrs) for strainer in self.strainers)
+
+    def allow_string_creation(self, string):
+        return any(strainer.allow_string_creation(string) for strainer in self.strainers)
+
+    def match(self, element, _known_rules=False):
+        return any(strainer.match(element, _known_rules) for strainer in self.strainers)
+
+    def slice(self, text):
+        """
+        Returns the markup of the elements which may be matched by the strainers, with their descendants,
+        in the order of the page. The strainers still filter the result, so a tag found here by mistake
+        is not kept.
+        """
+        if self._start_tags is None:
+            return text
+
+        raw_text = _raw_text_ranges(text)
+        raw_starts = [start for start, _ in raw_text]
+
+        def in_raw_text(position):
+            index = bisect.bisect_right(raw_starts, position) - 1
+
+            return index >= 0 and position < raw_text[index][1]
+
+        fragments = []
+
+        # The values are searched for as plain text, a start tag is matched only around them
+        for value, start_tag in self._start_tags:
+            position = text.find(value)
+
+            while position != -1:
+                start = text.rfind("<", 0, position)
+                match = start_tag.match(text, start) if start != -1 else None
+
+                if match is None or match.end() <= position or in_raw_text(start):
+                    position = text.find(value, position + 1)
+                    continue
+
+                name = match.group(1).lower()
+                end = match.end()
+
+                if name not in VOID_TAGS and not match.group(0).endswith("/>"):
+                    end = self._element_end(text, name, end, in_raw_text)
+
+                fragments.append((start, end))
+                position = text.find(value, match.end())
+
+        parts = []
+        last_end = 0
+
+        # Elements nested in an element already taken are a part of it
+        for start, end in sorted(fragments):
+            if start >= last_end:
+                parts.append(text[start:end])
+                last_end = end
+            elif end > last_end:
+                parts.append(text[last_end:end])
+                last_end = end
+
+        return "".join(parts)
+
+    def _element_end(self, text, name, position, in_raw_text):
+        # Position after the end tag closing an element whose start tag ends at the position,
+        # the end of the page if it is not closed
+        if name not in self._end_tags:
+            self._end_tags[name] = re.compile(rf'<(/?){re.escape(name)}\b[^>]*>', re.I)
+
+        depth = 1
+
+        for match in self._end_tags[name].finditer(text, position):
+            if in_raw_text(match.start()) or match.group(0).endswith("/>"):
+                continue
+
+            depth += -1 if match.group(1) else 1
+
+            if depth == 0:
+                return match.end()
+
+        return len(text)
+
+
+# Elements read by find_original_url()
+ORIGINAL_URL_ELEMENTS = [("link", "rel", "canonical"), ("meta", "property", "og:url")]
+
+
+class Document:
+    """
+    An HTML page read once and parsed at most once.
+
+    The URL lookup, the selectors (soup) and the regexes on the raw text (text) share one Document,
+    so a downloaded file is no longer opened and parsed again for every one of them.
+    With a strainer, the page is cut down to the elements it matches before parsing (AnyStrainer.slice()),
+    and only they are built into the soup.
+    """
+
+    def __init__(self, content, text=None, strainer=None):
+        self.content = content
+        self.text = content.decode("utf-8") if text is None else text
+        self.strainer = strainer
+        self._soup = None
+
+    @classmethod
+    def from_file(cls, file_path, strainer=None):
+        with open(file_path, "rb") as file:
+            return cls(file.read(), strainer=strainer)
+
+    @property
+    def strained(self):
+        return self.strainer is not None
+
+    @property
+    def soup(self):
+        if self._soup is None:
+            text = self.text if self.strainer is None else self.strainer.slice(self.text)
+            self._soup = BeautifulSoup(text, "html.parser", parse_only=self.strainer)
+
+        return self._soup
+
+
+def find_original_url(document):
+    """
+    Returns the original URL of a saved page: a Document or a path to the file.
+    """
+    if not isinstance(document, Document):
+        document = Document.from_file(document)
+
+    soup = document.soup
 
     # Szukamy <link rel="canonical">
     canonical = soup.find("link", rel="canonical")
@@ -20,7 +335,12 @@ def find_original_url(file_path):
     if og_url and og_url.has_attr("content"):
         return og_url["content"]
 
-    # Szukamy w komentarzach (np. 'Saved from')
+    # Szukamy w komentarzach (np. 'Saved from'), a strained soup has no comments
+    if document.strained:
+        match = SAVED_FROM_PATTERN.search(document.text)
+
+        return match.group(1) if match else "Nie znaleziono oryginalnego URL-a."
+
     for comment in soup.find_all(string=lambda text: isinstance(text, str) and "Saved from" in text):
         url = comment.split("Saved from")[-1].strip()
         if url.startswith("http"):
@@ -29,10 +349,172 @@ def find_original_url(file_path):
     return "Nie znaleziono oryginalnego URL-a."
 
 
+class ExtractionPlan:
+    """
+    Selectors of one site from sites_structure.json compiled into a list of field handlers.
+
+    The structure is read once, when Extraction is created: every column gets a handler bound to
+    its tags, classes and pre-compiled regexes, so a page is processed by calling the handlers
+    in the order of the columns, without looking the selectors up again, e.g.:
+        plan = ExtractionPlan(sites_structure["justjoin.it"], tech_levels)
+        plan.run(Document.from_file(file_path), job_offer_data, logger, file_path)
+
+    The strainer keeps only the elements named by the selectors and the ones of find_original_url(),
+    a Document parsed with it gives the same values: Document.from_file(file_path, plan.strainer).
+    """
+
+    def __init__(self, site_structure, tech_levels):
+        self.tech_levels = tech_levels
+        self.steps = [(column, self._compile(column, selector)) for column, selector in site_structure.items()]
+        self.strainer = self._compile_strainer(site_structure)
+
+    @staticmethod
+    def _compile_strainer(site_structure):
+        elements = list(ORIGINAL_URL_ELEMENTS)
+
+        for column, selector in site_structure.items():
+            # The date is read from the raw text
+            if column == "date_add":
+                continue
+
+            elements.append((selector.get("tag"), "class", selector.get("class")))
+
+            # A strained soup has no parents of the details, their values are found as the next elements
+            if column == "details":
+                elements.append((selector.get("child_tag"), "class", selector.get("child_class")))
+
+        return AnyStrainer([SoupStrainer(tag, attrs={attribute: value}) for tag, attribute, value in elements],
+                           elements)
+
+    def run(self, document, job_offer_data, logger, source):
+        """
+        Fills job_offer_data with the values found in the document.
+        A missing element skips its column, other errors (e.g. an invalid salary) are raised.
+        """
+        for column, handler in self.steps:
+            try:
+                handler(document, job_offer_data)
+            except AttributeError as e:
+                logger.error(f"Attribute error while extracting data '{column}' from {source}: {e}")
+
+        return job_offer_data
+
+    def _compile(self, column, selector):
+        tag_name = selector.get("tag")
+        class_name = selector.get("class")
+
+        if column == "title":
+            def extract_title(document, data):
+                data["title"] = document.soup.find(tag_name, class_=class_name).find("h1").text.strip()
+
+            return extract_title
+
+        if column == "date_add":
+            def extract_date_add(document, data):
+                match = PUBLISHED_AT_PATTERN.search(document.text)
+
+                if match:
+                    data["date_add"] = match.group(1).replace("T", " ").replace("Z", "")
+
+            return extract_date_add
+
+        if column == "salary":
+            salary_tag_name = selector.get("salary_tag")
+            salary_class_name = selector.get("salary_class")
+            contract_tag_name = selector.get("contract_tag")
+            contract_class_name = selector.get("contract_class")
+
+            def extract_salary(document, data):
+                existing_salary = {}
+
+                for element in document.soup.find_all(tag_name, class_=class_name):
+                    salary = element.find(salary_tag_name, class_=salary_class_name).text.strip()
+                    contract = element.find(contract_tag_name, class_=contract_class_name).text.strip()
+
+                    salary_match = SALARY_PATTERN.match(salary)
+
+                    if not salary_match:
+                        raise ValueError("Format wartości 'salary' jest nieprawidłowy")
+
+                    contract_match = CONTRACT_PATTERN.search(contract)
+
+                    if not contract_match:
+                        raise ValueError("Format wartości 'contract' jest nieprawidłowy")
+
+                    existing_salary[contract_match.group(1)] = {
+                        'from': salary_match.group(1).replace(" ", ""),
+                        'to': salary_match.group(2).replace(" ", ""),
+                        'currency': salary_match.group(3)
+                    }
+
+                data["salary"] = json.dumps(existing_salary).lower()
+
+            return extract_salary
+
+        if column == "details":
+            child_tag_name = selector.get("child_tag")
+            child_class_name = selector.get("child_class")
+
+            def extract_details(document, data):
+                for element in document.soup.find_all(tag_name, class_=class_name):
+                    detail = DETAILS_COLUMNS.get(element.text.strip())
+
+                    if document.strained:
+                        value = element.find_next(child_tag_name, class_=child_class_name).text.strip()
+                    else:
+                        value = element.parent.find(child_tag_name, class_=child_class_name).text.strip()
+
+                    if detail is not None:
+                        detail_column, lower = detail
+                        data[detail_column] = value.lower() if lower else value
+
+            return extract_details
+
+        if column == "technology_level":
+            technology_tag_name = selector.get("technology_tag")
+            technology_class_name = selector.get("technology_class")
+            level_tag_name = selector.get("level_tag")
+            level_class_name = selector.get("level_class")
+            tech_levels = self.tech_levels
+
+            def extract_technology_level(document, data):
+                technology_levels = {}
+
+                for element in document.soup.find_all(tag_name, class_=class_name):
+                    technology = element.find(technology_tag_name, class_=technology_class_name).text.strip()
+                    level = element.find(level_tag_name, class_=level_class_name).text.strip()
+
+                    technology_levels[technology] = tech_levels.get(level, 0)
+
+                data["tech_stack"] = json.dumps(technology_levels)
+
+            return extract_technology_level
+
+        lower = column in ("location", "category")
+
+        def extract_text(document, data):
+            if data[column] is None:
+                value = document.soup.find(tag_name, class_=class_name).text.strip()
+                data[column] = value.lower() if lower else value
+
+        return extract_text
+
+
 class Extraction:
-    def __init__(self, logger, db, sites_structure, downloaded_offers):
+    def __init__(self, logger, db, sites_structure, downloaded_offers, strained=False, embedded=True, cache=None,
+                 store=None):
         self.logger = logger
         self.db = db
+        # PageStore of the downloaded pages, without it they are saved as files in downloaded_offers
+        self.store = store
+        # HttpCache of link_extraction, pages not modified since they were cached are not extracted again
+        self.cache = cache
+        # Saved pages are parsed only partially, with the strainers of the site plans
+        self.strained = strained
+        # Offers embedded in the pages as JSON are read without parsing the HTML
+        self.embedded = embedded
+        # Offers are written in batches, the rest of them when the database is closed
+        self.writer = db.buffered_writer()
         self.sites_structure = sites_structure
         self.downloaded_offers = downloaded_offers
         self.headers = {
@@ -48,6 +530,10 @@ class Extraction:
             "master": 5
         }
 
+        # sites_structure.json compiled once, into a plan of field handlers per site
+        self.plans = {site: ExtractionPlan(structure, self.tech_levels)
+                      for site, structure in sites_structure.items()}
+
     def save_file_locally(self, html):
         """A function to download jobs locally."""
         # Check if the folder exists, if not, create it
@@ -79,23 +565,10 @@ class Extraction:
             except Exception as e:
                 self.logger.error(f"Error while saving file {safe_title}.html: {e}")
 
-    def link_extraction(self, url, offer_site):
-        try:
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()
-        except requests.RequestException as e:
-            self.logger.error(f"Page download error for URL {url}: {e}")
-            return
-
-        try:
-            soup = BeautifulSoup(response.content, "html.parser")
-        except Exception as e:
-            self.logger.error(f"Unexpected error for URL {url}: {e}")
-            return
-
-        self.save_file_locally(soup)
-
-        job_offer_data = {
+    @staticmethod
+    def _offer_data(link, source):
+        # Columns of 'job_offers' filled by the extraction, the ones not found on the page stay None
+        return {
             "title": None,
             "company": None,
             "location": None,
@@ -107,245 +580,107 @@ class Extraction:
             "employment": None,
             "operating_mode": None,
             "tech_stack": None,
-            "link": url,
-            "source": "url"
+            "link": link,
+            "source": source
         }
 
+    def _extract(self, document, offer_site, job_offer_data, source):
+        # Reads the embedded offer, or runs the plan of the site on a page, the same way for a response
+        # and a saved file
+        plan = self.plans.get(offer_site)
+        embedded_offer = EMBEDDED_OFFER_EXTRACTORS.get(offer_site) if self.embedded else None
+
         try:
-            for column, selector in self.sites_structure.get(offer_site, {}).items():
-                try:
-                    tag_name = selector.get("tag")
-                    class_name = selector.get("class")
-
-                    if column == "title":
-                        job_offer_data["title"] = soup.find(tag_name, class_=class_name).find("h1").text.strip()
-                    if column == "date_add":
-                        match = re.search(r'\\"publishedAt\\":\\"(.*?)\\"', response.text)
-
-                        if match:
-                            published_at = match.group(1)  # Pobieramy tylko datę
-                            formatted_date = published_at.replace("T", " ").replace("Z", "")
-                            job_offer_data["date_add"] = formatted_date
-                    elif column == "salary":
-                        salary_tag_name = selector.get("salary_tag")
-                        salary_class_name = selector.get("salary_class")
-                        contract_tag_name = selector.get("contract_tag")
-                        contract_class_name = selector.get("contract_class")
-                        elements = soup.find_all(tag_name, class_=class_name)
-
-                        existing_salary = {}
-
-                        for element in elements:
-                            salary = element.find(salary_tag_name, class_=salary_class_name).text.strip()
-                            contract = element.find(contract_tag_name, class_=contract_class_name).text.strip()
-
-                            salary_pattern = r'(\d[\d\s]*\d)\s*-\s*(\d[\d\s]*\d)\s*(\w+)'
-                            salary_match = re.match(salary_pattern, salary)
-
-                            if not salary_match:
-                                raise ValueError("Format wartości 'salary' jest nieprawidłowy")
-
-                            min_salary = salary_match.group(1).replace(" ", "")
-                            max_salary = salary_match.group(2).replace(" ", "")
-                            currency = salary_match.group(3)
-
-                            contract = contract.strip()
-                            contract_pattern = r'-\s*(\w+)$'
-                            contract_match = re.search(contract_pattern, contract)
-
-                            if not contract_match:
-                                raise ValueError("Format wartości 'contract' jest nieprawidłowy")
-
-                            contract_type = contract_match.group(1)
-
-                            # return min_salary, max_salary, currency, contract_type
-                            existing_salary[contract_type] = {
-                                'from': min_salary,
-                                'to': max_salary,
-                                'currency': currency
-                            }
-
-                        job_offer_data["salary"] = json.dumps(existing_salary).lower()
-                    elif column == "details":
-                        child_tag_name = selector.get("child_tag")
-                        child_class_name = selector.get("child_class")
-
-                        elements = soup.find_all(tag_name, class_=class_name)
-
-                        for element in elements:
-                            element_text = element.text.strip()
-                            elements_value = element.parent.find(child_tag_name, class_=child_class_name).text.strip()
-
-                            if element_text == "Type of work":
-                                job_offer_data["type"] = elements_value
-                            if element_text == "Experience":
-                                job_offer_data["experience"] = elements_value.lower()
-                            elif element_text == "Employment Type":
-                                job_offer_data["employment"] = elements_value.lower()
-                            elif element_text == "Operating mode":
-                                job_offer_data["operating_mode"] = elements_value.lower()
-                    elif column == "technology_level":
-                        technology_tag_name = selector.get("technology_tag")
-                        technology_tag_class = selector.get("technology_class")
-                        level_tag_name = selector.get("level_tag")
-                        level_class_name = selector.get("level_class")
-
-                        technology_levels = {}
-
-                        elements = soup.find_all(tag_name, class_=class_name)
-
-                        for element in elements:
-                            technology = element.find(technology_tag_name, class_=technology_tag_class).text.strip()
-                            level = element.find(level_tag_name, class_=level_class_name).text.strip()
-
-                            technology_levels[technology] = self.tech_levels.get(level, 0)
-
-                        job_offer_data["tech_stack"] = json.dumps(technology_levels)
-                    elif column == "location" or column == "category":
-                        if job_offer_data[column] is None:
-                            job_offer_data[column] = soup.find(tag_name, class_=class_name).text.strip().lower()
-                    else:
-                        if job_offer_data[column] is None:
-                            job_offer_data[column] = soup.find(tag_name, class_=class_name).text.strip()
+            offer = embedded_offer(document.text, self.tech_levels) if embedded_offer else None
+
+            if offer is not None:
+                link = offer.pop("link")
+                job_offer_data.update(offer)
+                job_offer_data["link"] = job_offer_data["link"] or link
+            elif plan is not None:
+                plan.run(document, job_offer_data, self.logger, source)
 
-                except AttributeError as e:
-                    self.logger.error(f"Attribute error while extracting data '{column}' from file {url}: {e}")
+            if job_offer_data["link"] is None:
+                job_offer_data["link"] = find_original_url(document)
 
-            self.db.insert_job_offer(job_offer_data)
+            self.writer.add(job_offer_data)
         except Exception as e:
-            self.logger.error(f"Unexpected error while extracting data: {e}")
+            self.logger.error(f"Unexpected error while extracting data from {source}: {e}")
+
+    def link_extraction(self, url, offer_site):
+        try:
+            if self.cache is not None:
+                response = self.cache.get(requests, url, headers=self.headers, timeout=10)
+            else:
+                response = requests.get(url, headers=self.headers, timeout=10)
+
+            response.raise_for_status()
+        except requests.RequestException as e:
+            self.logger.error(f"Page download error for URL {url}: {e}")
+            return
+
+        if getattr(response, "not_modified", False):
+            self.logger.debug(f"The page {url} has not been modified since it was cached. Skipping.")
+            return
+
+        self.page_extraction(url, offer_site, response)
+
+    def page_extraction(self, url, offer_site, response):
+        """
+        Extracts the offer from a downloaded page, e.g. one fetched by Crawler.
+        """
+        if self.store is not None:
+            # The original bytes are stored, the page is parsed only as far as the extraction needs
+            self.store.save(url, response.content)
+            document = Document(response.content, response.text, self._strainer(offer_site))
+        else:
+            # The whole page is saved locally, so it is parsed without a strainer
+            try:
+                document = Document(response.content, response.text)
+                soup = document.soup
+            except Exception as e:
+                self.logger.error(f"Unexpected error for URL {url}: {e}")
+                return
+
+            self.save_file_locally(soup)
+
+        job_offer_data = self._offer_data(url, "url")
+
+        self._extract(document, offer_site, job_offer_data, url)
+
+    def _strainer(self, offer_site):
+        plan = self.plans.get(offer_site)
+
+        return plan.strainer if self.strained and plan else None
 
     def file_extraction(self, file_path, offer_site):
         try:
-            with open(file_path, "r", encoding="utf-8") as file:
-                soup = BeautifulSoup(file, "html.parser")
+            document = Document.from_file(file_path, self._strainer(offer_site))
         except Exception as e:
             self.logger.error(f"Unexpected error for file {file_path}: {e}")
             return
 
-        job_offer_data = {
-            "title": None,
-            "company": None,
-            "location": None,
-            "category": None,
-            "position": None,
-            "date_add": None,
-            "salary": None,
-            "experience": None,
-            "employment": None,
-            "operating_mode": None,
-            "tech_stack": None,
-            "link": find_original_url(file_path),
-            "source": "file"
-        }
+        # The link is the URL of the embedded offer, or the one found by find_original_url()
+        job_offer_data = self._offer_data(None, "file")
 
-        try:
-            for column, selector in self.sites_structure.get(offer_site, {}).items():
-                try:
-                    tag_name = selector.get("tag")
-                    class_name = selector.get("class")
-
-                    if column == "title":
-                        job_offer_data["title"] = soup.find(tag_name, class_=class_name).find("h1").text.strip()
-                    if column == "date_add":
-                        with open(file_path, "r", encoding="utf-8") as file:
-                            response_text = file.read()
-
-                        match = re.search(r'\\"publishedAt\\":\\"(.*?)\\"', response_text)
-
-                        if match:
-                            published_at = match.group(1)  # Pobieramy tylko datę
-                            formatted_date = published_at.replace("T", " ").replace("Z", "")
-                            job_offer_data["date_add"] = formatted_date
-                    elif column == "salary":
-                        salary_tag_name = selector.get("salary_tag")
-                        salary_class_name = selector.get("salary_class")
-                        contract_tag_name = selector.get("contract_tag")
-                        contract_class_name = selector.get("contract_class")
-                        elements = soup.find_all(tag_name, class_=class_name)
-
-                        existing_salary = {}
-
-                        for element in elements:
-                            salary = element.find(salary_tag_name, class_=salary_class_name).text.strip()
-                            contract = element.find(contract_tag_name, class_=contract_class_name).text.strip()
-
-                            salary_pattern = r'(\d[\d\s]*\d)\s*-\s*(\d[\d\s]*\d)\s*(\w+)'
-                            salary_match = re.match(salary_pattern, salary)
-
-                            if not salary_match:
-                                raise ValueError("Format wartości 'salary' jest nieprawidłowy")
-
-                            min_salary = salary_match.group(1).replace(" ", "")
-                            max_salary = salary_match.group(2).replace(" ", "")
-                            currency = salary_match.group(3)
-
-                            contract = contract.strip()
-                            contract_pattern = r'-\s*(\w+)$'
-                            contract_match = re.search(contract_pattern, contract)
-
-                            if not contract_match:
-                                raise ValueError("Format wartości 'contract' jest nieprawidłowy")
-
-                            contract_type = contract_match.group(1)
-
-                            # return min_salary, max_salary, currency, contract_type
-                            existing_salary[contract_type] = {
-                                'from': min_salary,
-                                'to': max_salary,
-                                'currency': currency
-                            }
-
-                        job_offer_data["salary"] = json.dumps(existing_salary).lower()
-                    elif column == "details":
-                        child_tag_name = selector.get("child_tag")
-                        child_class_name = selector.get("child_class")
-
-                        elements = soup.find_all(tag_name, class_=class_name)
-
-                        for element in elements:
-                            element_text = element.text.strip()
-                            elements_value = element.parent.find(child_tag_name, class_=child_class_name).text.strip()
-
-                            if element_text == "Type of work":
-                                job_offer_data["type"] = elements_value
-                            if element_text == "Experience":
-                                job_offer_data["experience"] = elements_value.lower()
-                            elif element_text == "Employment Type":
-                                job_offer_data["employment"] = elements_value.lower()
-                            elif element_text == "Operating mode":
-                                job_offer_data["operating_mode"] = elements_value.lower()
-                    elif column == "technology_level":
-                        technology_tag_name = selector.get("technology_tag")
-                        technology_tag_class = selector.get("technology_class")
-                        level_tag_name = selector.get("level_tag")
-                        level_class_name = selector.get("level_class")
-
-                        technology_levels = {}
-
-                        elements = soup.find_all(tag_name, class_=class_name)
-
-                        for element in elements:
-                            technology = element.find(technology_tag_name, class_=technology_tag_class).text.strip()
-                            level = element.find(level_tag_name, class_=level_class_name).text.strip()
-
-                            technology_levels[technology] = self.tech_levels.get(level, 0)
-
-                        job_offer_data["tech_stack"] = json.dumps(technology_levels)
-                    elif column == "location" or column == "category":
-                        if job_offer_data[column] is None:
-                            job_offer_data[column] = soup.find(tag_name, class_=class_name).text.strip().lower()
-                    else:
-                        if job_offer_data[column] is None:
-                            job_offer_data[column] = soup.find(tag_name, class_=class_name).text.strip()
+        self._extract(document, offer_site, job_offer_data, f"file {file_path}")
 
-                except AttributeError as e:
-                    self.logger.error(f"Attribute error while extracting data '{column}' from file {file_path}: {e}")
+    def store_extraction(self, offer_site, store=None):
+        """
+        Extracts the offers from the pages of a PageStore, by default the one of this Extraction.
+        """
+        store = store or self.store
 
-            self.db.insert_job_offer(job_offer_data)
+        for url, content, fetched_at in store.pages():
+            try:
+                document = Document(content, strainer=self._strainer(offer_site))
+            except Exception as e:
+                self.logger.error(f"Unexpected error for page {url} from the store: {e}")
+                continue
 
-        except Exception as e:
-            self.logger.error(f"Unexpected error while extracting data from file {file_path}: {e}")
+            job_offer_data = self._offer_data(url, "file")
+
+            self._extract(document, offer_site, job_offer_data, f"page {url}")
 
     def text_extraction(self):
         pass
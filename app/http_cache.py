@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class CachedResponse:
+    """
+    A page served from the cache, with the attributes of requests.Response used by Extraction.
+    not_modified is True: the page has not changed since it was downloaded, so it does not need parsing.
+    """
+    status_code = 200
+    not_modified = True
+
+    def __init__(self, url, content, encoding, headers):
+        self.url = url
+        self.content = content
+        self.encoding = encoding
+        self.headers = headers
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def raise_for_status(self):
+        pass
+
+
+class HttpCache:
+    """
+    On-disk cache of pages for conditional GET requests, keyed by URL.
+
+    Every page is stored as '<sha256 of the URL>.body' with its ETag and Last-Modified headers
+    in '<sha256 of the URL>.json'. A cached URL is requested with If-None-Match / If-Modified-Since,
+    and a 304 response is answered with the cached body marked as not_modified, e.g.:
+        cache = HttpCache("data/raw/http_cache", logger)
+        response = cache.get(requests, url, timeout=10)
+        if not response.not_modified:
+            ...parse the page...
+
+    Pages neither downloaded nor revalidated by a 304 for ttl seconds are downloaded again without conditions.
+    When the bodies exceed max_bytes, the least recently used pages are evicted.
+    """
+
+    def __init__(self, folder, logger, ttl=7 * 24 * 3600, max_bytes=512 * 1024 * 1024):
+        self.folder = folder
+        self.logger = logger
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._size = 0
+
+        os.makedirs(folder, exist_ok=True)
+
+        for name in os.listdir(folder):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(folder, name), "r", encoding="utf-8") as file:
+                        entry = json.load(file)
+                except (OSError, ValueError) as e:
+                    self.logger.warning(f"Skipping the invalid cache entry {name}: {e}")
+                    continue
+
+                self._entries[entry["url"]] = entry
+                self._size += entry["size"]
+
+    def _path(self, url, extension):
+        return os.path.join(self.folder, f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.{extension}")
+
+    def _write_entry(self, entry):
+        # The metadata is replaced at once, so a reader never sees half of it
+        path = self._path(entry["url"], "json")
+
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            json.dump(entry, file)
+
+        os.replace(f"{path}.tmp", path)
+
+    def _remove(self, url):
+        entry = self._entries.pop(url)
+        self._size -= entry["size"]
+
+        for extension in ("json", "body"):
+            try:
+                os.remove(self._path(url, extension))
+            except FileNotFoundError:
+                pass
+
+    def _lookup(self, url):
+        # Entry of a URL, None if it is missing or expired
+        with self._lock:
+            entry = self._entries.get(url)
+
+            if entry is not None and time.time() - entry["fetched_at"] > self.ttl:
+                self._remove(url)
+                entry = None
+
+            return entry
+
+    def get(self, session, url, headers=None, **kwargs):
+        """
+        Sends a GET request, conditional if the URL is cached.
+
+        :param session: requests.Session or the requests module.
+        :param url:     URL of the page.
+        :param headers: Headers of the request.
+        :param kwargs:  Other arguments of session.get(), e.g. timeout.
+        :return:        CachedResponse for a 304, otherwise requests.Response with not_modified = False.
+        """
+        entry = self._lookup(url)
+        headers = dict(headers or {})
+
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = session.get(url, headers=headers, **kwargs)
+
+        if entry is not None and response.status_code == 304:
+            cached = self._read(entry)
+
+            if cached is not None:
+                return cached
+
+            # The body is gone, e.g. evicted meanwhile, so the page is downloaded again
+            response = session.get(url, headers={key: value for key, value in headers.items()
+                                                 if not key.startswith("If-")}, **kwargs)
+
+        response.not_modified = False
+
+        if response.status_code == 200:
+            with self._lock:
+                self.misses += 1
+
+            self.store(url, response)
+
+        return response
+
+    def _read(self, entry):
+        try:
+            with open(self._path(entry["url"], "body"), "rb") as file:
+                content = file.read()
+        except FileNotFoundError:
+            with self._lock:
+                if entry["url"] in self._entries:
+                    self._remove(entry["url"])
+
+            return None
+
+        with self._lock:
+            # The 304 confirmed the page: it is fresh for another ttl seconds and the most recently used.
+            # The entry is written back, so the order of eviction and the freshness survive a restart.
+            entry["fetched_at"] = entry["used_at"] = time.time()
+            self.hits += 1
+
+            if self._entries.get(entry["url"]) is entry:
+                try:
+                    self._write_entry(entry)
+                except OSError as e:
+                    self.logger.error(f"Error while caching the page {entry['url']}: {e}")
+
+        return CachedResponse(entry["url"], content, entry.get("encoding"), {
+            key: value for key, value in (("ETag", entry.get("etag")), ("Last-Modified", entry.get("last_modified")))
+            if value
+        })
+
+    def store(self, url, response):
+        """
+        Stores a downloaded page, if it has an ETag or Last-Modified header to validate it later.
+        Otherwise an older version of the page is removed from the cache.
+        """
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        content = response.content
+
+        if not (etag or last_modified) or len(content) > self.max_bytes:
+            # The cached version is outdated, its validators must not be sent for the new one
+            with self._lock:
+                if url in self._entries:
+                    self._remove(url)
+
+            return
+
+        now = time.time()
+        entry = {"url": url, "etag": etag, "last_modified": last_modified, "encoding": response.encoding,
+                 "size": len(content), "fetched_at": now, "used_at": now}
+
+        try:
+            with self._lock:
+                if url in self._entries:
+                    self._remove(url)
+
+                # The least recently used pages make room for the new one
+                for old_entry in sorted(self._entries.values(), key=lambda e: e["used_at"]):
+                    if self._size + len(content) <= self.max_bytes:
+                        break
+
+                    self._remove(old_entry["url"])
+
+                # Replaced at once, a page served after a 304 is read outside the lock
+                path = self._path(url, "body")
+
+                with open(f"{path}.tmp", "wb") as file:
+                    file.write(content)
+
+                os.replace(f"{path}.tmp", path)
+
+                self._write_entry(entry)
+                self._entries[url] = entry
+                self._size += len(content)
+        except OSError as e:
+            self.logger.error(f"Error while caching the page {url}: {e}")
+
+    def info(self):
+        """
+        Returns statistics of the cache: hits (304 responses), misses (downloaded pages), entries and bytes.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries), 'bytes': self._size}
+
+    def clear(self):
+        with self._lock:
+            for url in list(self._entries):
+                self._remove(url)
+
@@ -3,6 +3,7 @@ import os
 from database import Database
 from extraction import Extraction
 from logger import Logger
+from page_store import PageStore
 from utilities import Utilities
 
 
@@ -43,7 +44,10 @@ def main():
     # We initialize the Extraction class
     downloaded_offers = os.path.join(project_root, 'data', 'raw', 'downloaded_sites')
 
-    ex = Extraction(logger, db, offers_sites, downloaded_offers)
+    # Pages downloaded by link extraction, compressed and addressed by their content
+    store = PageStore(os.path.join(project_root, 'data', 'raw', 'page_store'), logger)
+
+    ex = Extraction(logger, db, offers_sites, downloaded_offers, store=store)
 
     # extraction for files
     try:
@@ -56,14 +60,25 @@ def main():
                 ex.file_extraction(full_path, site)
     except FileNotFoundError as e:
         logger.warning(f"There is no file with downloaded sites: {e}")
+
+    # extraction for pages in the store
+    ex.store_extraction("justjoin.it")  # na sztywno narazie
     """
-    # extraction for sites
-    for offer in offers:
-        site = ut.is_valid_url(offer, offers_sites)
+    from crawler import Crawler
+    from http_cache import HttpCache
+
+    # extraction for sites, downloaded concurrently and extracted in this thread
+    sites = {offer: ut.is_valid_url(offer, offers_sites) for offer in offers}
+
+    # Pages not modified since the last crawl are not downloaded and extracted again
+    cache = HttpCache(os.path.join(project_root, 'data', 'raw', 'http_cache'), logger)
 
-        if site is not None:
-            ex.link_extraction(offer, site)
+    crawler = Crawler(logger, workers=8, per_domain=4, rate=5, headers=ex.headers, cache=cache)
+    crawler.crawl([offer for offer, site in sites.items() if site is not None],
+                  lambda url, response: ex.page_extraction(url, sites[url], response))
+    crawler.close()
     """
+    store.close()
     db.close_connection()
 
 
@@ -0,0 +1,110 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+from datetime import datetime
+
+
+class PageStore:
+    """
+    Store of downloaded pages: the original bytes, gzip-compressed and addressed by their SHA-256.
+
+    Pages are kept in 'objects/<first 2 characters of the hash>/<hash>.html.gz', so the same page saved
+    for two URLs or twice for one URL is stored once. The index ('index.db') maps every URL to the hash
+    of its latest page and the time it was fetched, e.g.:
+        store = PageStore("data/raw/page_store", logger)
+        store.save(url, response.content)
+        for url, content, fetched_at in store.pages():
+            ...
+    """
+
+    def __init__(self, folder, logger, compress_level=6):
+        self.folder = folder
+        self.logger = logger
+        self.compress_level = compress_level
+
+        os.makedirs(os.path.join(folder, "objects"), exist_ok=True)
+
+        self.connection = sqlite3.connect(os.path.join(folder, "index.db"))
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS pages
+            (
+                url        TEXT PRIMARY KEY,
+                hash       TEXT NOT NULL,
+                fetched_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_pages_hash ON pages (hash);
+        """)
+
+    def _path(self, content_hash):
+        return os.path.join(self.folder, "objects", content_hash[:2], f"{content_hash}.html.gz")
+
+    def save(self, url, content, fetched_at=None):
+        """
+        Saves the bytes of a page downloaded from the URL. The page it replaces is removed,
+        unless another URL still has it.
+
+        :return: Hash of the page, None on error.
+        """
+        content_hash = hashlib.sha256(content).hexdigest()
+        path = self._path(content_hash)
+        fetched_at = fetched_at or datetime.now().isoformat(sep=" ", timespec="seconds")
+
+        try:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+
+                # Written next to the page and renamed, so a page in the store is always complete
+                with open(f"{path}.tmp", "wb") as file:
+                    file.write(gzip.compress(content, compresslevel=self.compress_level, mtime=0))
+
+                os.replace(f"{path}.tmp", path)
+
+            with self.connection:
+                previous = self.connection.execute("SELECT hash FROM pages WHERE url = ?;", (url,)).fetchone()
+                self.connection.execute("""
+                    INSERT INTO pages (url, hash, fetched_at) VALUES (?, ?, ?)
+                    ON CONFLICT (url) DO UPDATE SET hash = excluded.hash, fetched_at = excluded.fetched_at;
+                """, (url, content_hash, fetched_at))
+
+                if previous and previous[0] != content_hash and not self.connection.execute(
+                        "SELECT 1 FROM pages WHERE hash = ?;", previous).fetchone():
+                    os.remove(self._path(previous[0]))
+
+            return content_hash
+        except (OSError, sqlite3.Error) as e:
+            self.logger.error(f"Error while saving the page {url} to the store: {e}")
+
+            return None
+
+    def load(self, content_hash):
+        """
+        Returns the bytes of a page by its hash.
+        """
+        with open(self._path(content_hash), "rb") as file:
+            return gzip.decompress(file.read())
+
+    def get(self, url):
+        """
+        Returns the bytes of the latest page of the URL, None if it is not in the store.
+        """
+        row = self.connection.execute("SELECT hash FROM pages WHERE url = ?;", (url,)).fetchone()
+
+        return self.load(row[0]) if row else None
+
+    def pages(self):
+        """
+        Yields (url, bytes, fetched_at) of the latest page of every URL, the pages are read one by one.
+        """
+        for url, content_hash, fetched_at in self.connection.execute(
+                "SELECT url, hash, fetched_at FROM pages ORDER BY url;").fetchall():
+            try:
+                yield url, self.load(content_hash), fetched_at
+            except OSError as e:
+                self.logger.error(f"Error while reading the page {url} from the store: {e}")
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM pages;").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,257 @@
+import json
+import os
+import re
+import shutil
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Columns of job_offers stored in a snapshot, the text ones are dictionary-encoded.
+# salary and tech_stack are JSON documents, their statistics come from the database.
+TEXT_COLUMNS = ("title", "company", "location", "category", "position", "experience", "employment",
+                "operating_mode", "link", "source")
+FETCH_SIZE = 50_000
+
+# Names of the versions in the folder of a snapshot, and of the files of a snapshot written before versions existed
+_VERSION = re.compile(r"\d{20}")
+_UNVERSIONED_FILES = {"snapshot.json", "id.npy", "date_add.npy"} | {
+    f"{column}.{kind}.npy" for column in TEXT_COLUMNS for kind in ("codes", "values")}
+
+
+def export_snapshot(connection, folder, logger):
+    """
+    Writes the 'job_offers' table as a columnar snapshot: one .npy file per column.
+
+    Text columns are stored as int32 codes ('<column>.codes.npy', -1 for NULL) and a sorted dictionary
+    of values ('<column>.values.npy'), 'date_add' as datetime64[ms] and 'id' as int64. The rows are
+    written into the memory-mapped files chunk by chunk, only the dictionaries are kept in memory.
+
+    Every export is a new version, a subfolder of the folder named by its creation time. The file 'CURRENT'
+    names the version to read and is replaced at once when the new version is complete, so readers never
+    see half of a snapshot or no snapshot at all. The previous version is kept for readers which have
+    just read the old pointer, older ones are removed.
+
+    :param connection:  sqlite3 connection to the database.
+    :param folder:      Folder of the snapshot.
+    :param logger:      Logger.
+    :return:            Number of exported offers, None on error.
+    """
+    version = datetime.now().strftime("%Y%m%d%H%M%S%f")
+    temp_folder = os.path.join(folder, f"{version}.tmp")
+    dictionaries = {column: {} for column in TEXT_COLUMNS}
+    # The number of rows and the rows are read in one transaction, unless the connection is already in one
+    transaction = not connection.in_transaction
+
+    try:
+        if transaction:
+            connection.execute("BEGIN;")
+
+        rows_count = connection.execute("SELECT COUNT(*) FROM job_offers;").fetchone()[0]
+        os.makedirs(temp_folder)
+
+        def column_file(name, dtype):
+            return np.lib.format.open_memmap(os.path.join(temp_folder, f"{name}.npy"), mode="w+",
+                                             dtype=dtype, shape=(rows_count,))
+
+        ids = column_file("id", np.int64)
+        dates = column_file("date_add", "datetime64[ms]")
+        codes = {column: column_file(f"{column}.codes", np.int32) for column in TEXT_COLUMNS}
+
+        cursor = connection.execute(f"SELECT id, date_add, {', '.join(TEXT_COLUMNS)} FROM job_offers ORDER BY id;")
+        start = 0
+
+        while rows := cursor.fetchmany(FETCH_SIZE):
+            end = start + len(rows)
+            columns = list(zip(*rows))
+            ids[start:end] = columns[0]
+            dates[start:end] = np.array(columns[1], dtype="datetime64[ms]")
+
+            for column, values in zip(TEXT_COLUMNS, columns[2:]):
+                # Codes in the order of appearance, sorted once all values are known
+                dictionary = dictionaries[column]
+                codes[column][start:end] = [-1 if value is None else dictionary.setdefault(value, len(dictionary))
+                                            for value in values]
+
+            start = end
+
+        if transaction:
+            connection.commit()
+            transaction = False
+
+        for column in TEXT_COLUMNS:
+            values = np.array(list(dictionaries[column]), dtype=str)
+            order = np.argsort(values, kind="stable")
+            # Maps the codes in the order of appearance to the codes of the sorted dictionary, -1 stays -1
+            recode = np.empty(len(values) + 1, dtype=np.int32)
+            recode[order] = np.arange(len(values), dtype=np.int32)
+            recode[-1] = -1
+
+            np.save(os.path.join(temp_folder, f"{column}.values.npy"), values[order])
+
+            for chunk in range(0, rows_count, FETCH_SIZE):
+                codes[column][chunk:chunk + FETCH_SIZE] = recode[codes[column][chunk:chunk + FETCH_SIZE]]
+
+        for array in (ids, dates, *codes.values()):
+            array.flush()
+
+        del ids, dates, codes
+
+        with open(os.path.join(temp_folder, "snapshot.json"), "w", encoding="utf-8") as file:
+            json.dump({"rows": rows_count, "text_columns": list(TEXT_COLUMNS),
+                       "created_at": datetime.now().isoformat(sep=" ", timespec="seconds")}, file)
+
+        previous = _current_version(folder)
+        os.replace(temp_folder, os.path.join(folder, version))
+
+        with open(os.path.join(folder, "CURRENT.tmp"), "w", encoding="utf-8") as file:
+            file.write(version)
+
+        os.replace(os.path.join(folder, "CURRENT.tmp"), os.path.join(folder, "CURRENT"))
+
+        # Older versions, and the files of a snapshot written before versions existed. Other files,
+        # e.g. the temporary folder of another export, are left alone.
+        for name in os.listdir(folder):
+            if name in (version, previous) or not (_VERSION.fullmatch(name) or name in _UNVERSIONED_FILES):
+                continue
+
+            path = os.path.join(folder, name)
+
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+
+        logger.info(f"A snapshot of {rows_count} offers has been exported to {folder}.")
+
+        return rows_count
+    except Exception as e:
+        logger.error(f"Error while exporting the snapshot to {folder}: {e}")
+        shutil.rmtree(temp_folder, ignore_errors=True)
+
+        if transaction:
+            connection.rollback()
+
+        return None
+
+
+def _current_version(folder):
+    # Name of the version the pointer file of the folder refers to, None without one
+    try:
+        with open(os.path.join(folder, "CURRENT"), encoding="utf-8") as file:
+            return file.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+class Snapshot:
+    """
+    Read-only view of a snapshot written by export_snapshot().
+
+    Columns are memory-mapped, so opening the snapshot reads only the metadata and the dictionaries,
+    and filters and aggregates are vectorized operations on the integer codes, e.g.:
+        snapshot = Snapshot("data/snapshot")
+        snapshot.count_by("location", snapshot.mask(OfferFilter(categories=["python"])))
+    """
+
+    def __init__(self, folder):
+        # The current version, or the folder itself for a snapshot written before versions existed
+        version = _current_version(folder)
+        folder = os.path.join(folder, version) if version else folder
+        self.folder = folder
+
+        with open(os.path.join(folder, "snapshot.json"), encoding="utf-8") as file:
+            self.metadata = json.load(file)
+
+        self.rows = self.metadata["rows"]
+        self.id = np.load(os.path.join(folder, "id.npy"), mmap_mode="r")
+        self.date_add = np.load(os.path.join(folder, "date_add.npy"), mmap_mode="r")
+        self.codes = {column: np.load(os.path.join(folder, f"{column}.codes.npy"), mmap_mode="r")
+                      for column in self.metadata["text_columns"]}
+        self.values = {column: np.load(os.path.join(folder, f"{column}.values.npy"), mmap_mode="r")
+                       for column in self.metadata["text_columns"]}
+
+    def encode(self, column, values):
+        """
+        Returns the codes of the values in the dictionary of the column, values missing from it are skipped.
+        """
+        dictionary = self.values[column]
+        positions = np.searchsorted(dictionary, values)
+        found = positions < len(dictionary)
+        found[found] = dictionary[positions[found]] == np.asarray(values)[found]
+
+        return positions[found].astype(np.int32)
+
+    def mask(self, filters=None):
+        """
+        Returns a boolean array selecting the offers matched by an OfferFilter, like its WHERE clause.
+        """
+        mask = np.ones(self.rows, dtype=bool)
+
+        if filters is None:
+            return mask
+
+        if filters.empty:
+            mask[:] = False
+
+        # Whole days, as in OfferFilter.where_clause(), invalid dates match nothing
+        for date, compare, shift in ((filters.date_from, np.greater_equal, 0), (filters.date_to, np.less, 1)):
+            if date:
+                try:
+                    day = datetime.fromisoformat(str(date).strip()[:10]) + timedelta(days=shift)
+                except ValueError:
+                    mask[:] = False
+                else:
+                    mask &= compare(self.date_add, np.datetime64(day, "ms"))
+
+        for name, column in filters.columns.items():
+            values = getattr(filters, name)
+
+            if values:
+                mask &= np.isin(self.codes[column], self.encode(column, [value for value in values
+                                                                         if value is not None]))
+
+        return mask
+
+    def decode(self, column, mask=None):
+        """
+        Returns the values of a text column (of the selected offers), None for NULL.
+        """
+        codes = self.codes[column] if mask is None else self.codes[column][mask]
+        values = np.append(np.asarray(self.values[column], dtype=object), None)
+
+        return values[codes]
+
+    def count_by(self, column, mask=None):
+        """
+        Counts offers by the values of a text column, like the get_offers_by_* methods of Database.
+
+        :return: DataFrame with columns: <column>, total_offers, sorted by total_offers descending.
+        """
+        codes = self.codes[column] if mask is None else self.codes[column][mask]
+        # NULL (-1) is counted in the first bin
+        counts = np.bincount(codes + 1, minlength=len(self.values[column]) + 1)
+        present = np.flatnonzero(counts)
+        values = np.insert(np.asarray(self.values[column], dtype=object), 0, None)
+
+        df = pd.DataFrame({column: values[present], "total_offers": counts[present]})
+
+        return df.sort_values("total_offers", ascending=False, kind="stable").reset_index(drop=True)
+
+    def count_by_month(self, mask=None):
+        """
+        Counts offers by month of 'date_add', like Database.get_offers_by_year_month().
+
+        :return: DataFrame with columns: year_month, total_offers, sorted by year_month.
+        """
+        dates = self.date_add if mask is None else self.date_add[mask]
+        missing = np.isnat(dates)
+        months, counts = np.unique(dates[~missing].astype("datetime64[M]"), return_counts=True)
+        df = pd.DataFrame({"year_month": months.astype(str).astype(object), "total_offers": counts})
+
+        # Offers without a date come first, like NULL in ORDER BY
+        if missing.any():
+            df = pd.concat([pd.DataFrame({"year_month": [None], "total_offers": [missing.sum()]}), df],
+                           ignore_index=True)
+
+        return df
@@ -19,20 +19,298 @@ CREATE TABLE IF NOT EXISTS job_offers
     UNIQUE (title, company, location, category)
 );
 
-CREATE INDEX idx_offers_category
+CREATE INDEX IF NOT EXISTS idx_offers_category
     ON job_offers (category);
 
-CREATE INDEX idx_offers_location
+CREATE INDEX IF NOT EXISTS idx_offers_location
     ON job_offers (location);
 
-CREATE INDEX idx_offers_experience
+CREATE INDEX IF NOT EXISTS idx_offers_experience
     ON job_offers (experience);
 
-CREATE INDEX idx_offers_date_add
+CREATE INDEX IF NOT EXISTS idx_offers_date_add
     ON job_offers (date_add);
 
---CREATE UNIQUE INDEX job_offers_uindex_link
-    --ON job_offers (link);
+-- positions are mostly empty, so only offers having one are indexed
+CREATE INDEX IF NOT EXISTS idx_offers_position
+    ON job_offers (position)
+    WHERE position IS NOT NULL;
+
+-- month key of the canonical date_add ('YYYY-MM-DD HH:MM:SS')
+CREATE INDEX IF NOT EXISTS idx_offers_date_month
+    ON job_offers (SUBSTR(date_add, 1, 7));
+
+-- source files already loaded by the ETL
+CREATE TABLE IF NOT EXISTS etl_manifest
+(
+    path         TEXT PRIMARY KEY,
+    size         INTEGER NOT NULL,
+    mtime        REAL    NOT NULL,
+    content_hash TEXT    NOT NULL,
+    rows         INTEGER NOT NULL,
+    processed_at TEXT    NOT NULL
+);
+
+-- dictionary of technologies from tech_stack
+CREATE TABLE IF NOT EXISTS technologies
+(
+    id   INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+
+-- tech_stack of each offer, kept in sync with job_offers by the triggers below
+CREATE TABLE IF NOT EXISTS offer_skills
+(
+    offer_id INTEGER NOT NULL REFERENCES job_offers (id),
+    tech_id  INTEGER NOT NULL REFERENCES technologies (id),
+    level    INTEGER,
+    PRIMARY KEY (offer_id, tech_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_offer_skills_tech
+    ON offer_skills (tech_id, level);
+
+-- salary of each offer per contract type, kept in sync with job_offers by the triggers below
+-- NUMERIC keeps integer amounts as integers, so averages are computed as on the JSON values
+CREATE TABLE IF NOT EXISTS offer_salaries
+(
+    offer_id      INTEGER NOT NULL REFERENCES job_offers (id),
+    contract_type TEXT    NOT NULL,
+    salary_from   NUMERIC,
+    salary_to     NUMERIC,
+    currency      TEXT,
+    PRIMARY KEY (offer_id, contract_type)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_offer_salaries_contract
+    ON offer_salaries (contract_type, currency);
+
+-- combinations of the filter dimensions of offers, the rollup tables below are keyed on them
+-- group_key is the JSON array of the dimensions, so NULL and '' are different groups
+CREATE TABLE IF NOT EXISTS offer_groups
+(
+    id             INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_key      TEXT NOT NULL UNIQUE,
+    month          TEXT,
+    category       TEXT,
+    location       TEXT,
+    experience     TEXT,
+    operating_mode TEXT
+);
+
+-- number of offers in each group
+CREATE TABLE IF NOT EXISTS offers_rollup
+(
+    group_id     INTEGER PRIMARY KEY REFERENCES offer_groups (id),
+    total_offers INTEGER NOT NULL
+);
+
+-- number of offers with a complete salary and the sum of their mean salaries, per contract type and currency
+CREATE TABLE IF NOT EXISTS salaries_rollup
+(
+    group_id      INTEGER NOT NULL REFERENCES offer_groups (id),
+    contract_type TEXT    NOT NULL,
+    currency      TEXT    NOT NULL,
+    total_offers  INTEGER NOT NULL,
+    salary_sum    REAL    NOT NULL,
+    PRIMARY KEY (group_id, contract_type, currency)
+) WITHOUT ROWID;
+
+-- number of offers per technology and level, level -1 stands for a missing level
+CREATE TABLE IF NOT EXISTS skills_rollup
+(
+    group_id     INTEGER NOT NULL REFERENCES offer_groups (id),
+    tech_id      INTEGER NOT NULL REFERENCES technologies (id),
+    level        INTEGER NOT NULL,
+    total_offers INTEGER NOT NULL,
+    PRIMARY KEY (group_id, tech_id, level)
+) WITHOUT ROWID;
+
+-- offers inserted or updated since the last remove_older_duplicates(), only their groups are checked
+CREATE TABLE IF NOT EXISTS dedup_queue
+(
+    offer_id INTEGER PRIMARY KEY
+);
+
+-- a row here marks a bulk load (Database.begin_bulk_load()): the triggers below skip the derived tables,
+-- which are rebuilt at once by Database.end_bulk_load()
+CREATE TABLE IF NOT EXISTS bulk_load
+(
+    id INTEGER PRIMARY KEY CHECK (id = 1)
+);
+
+-- offers added to (sign = 1) or removed from (sign = -1) the tables derived from job_offers,
+-- the triggers of job_offers insert here and the INSTEAD OF trigger below applies the change
+-- group_key is the JSON array of the dimensions of offer_groups
+DROP VIEW IF EXISTS offer_changes;
+CREATE VIEW offer_changes (sign, offer_id, group_key, tech_stack, salary) AS
+SELECT NULL, NULL, NULL, NULL, NULL
+WHERE 0;
+
+-- an added offer gets its derived rows before the rollups count them,
+-- a removed one loses them after the rollups are decremented
+CREATE TRIGGER offer_changes_apply
+    INSTEAD OF INSERT
+    ON offer_changes
+BEGIN
+    -- OR IGNORE would be overridden by the conflict policy of an upsert, hence NOT EXISTS and GROUP BY
+    INSERT INTO technologies (name)
+    SELECT DISTINCT key
+    FROM JSON_EACH(CASE WHEN NEW.sign = 1 AND JSON_VALID(NEW.tech_stack) THEN NEW.tech_stack END)
+    WHERE NOT EXISTS (SELECT 1 FROM technologies WHERE name = key);
+
+    INSERT INTO offer_skills (offer_id, tech_id, level)
+    SELECT NEW.offer_id, t.id, MAX(CAST(j.value AS INT))
+    FROM JSON_EACH(CASE WHEN NEW.sign = 1 AND JSON_VALID(NEW.tech_stack) THEN NEW.tech_stack END) j
+             JOIN technologies t ON t.name = j.key
+    GROUP BY t.id;
+
+    INSERT INTO offer_salaries (offer_id, contract_type, salary_from, salary_to, currency)
+    SELECT NEW.offer_id,
+           j.key,
+           JSON_EXTRACT(j.value, '$.from'),
+           JSON_EXTRACT(j.value, '$.to'),
+           UPPER(JSON_EXTRACT(j.value, '$.currency'))
+    FROM JSON_EACH(CASE WHEN NEW.sign = 1 AND JSON_VALID(NEW.salary) THEN NEW.salary END) j
+    WHERE j.type = 'object'
+    GROUP BY j.key;
+
+    INSERT INTO offer_groups (group_key, month, category, location, experience, operating_mode)
+    SELECT NEW.group_key,
+           JSON_EXTRACT(NEW.group_key, '$[0]'),
+           JSON_EXTRACT(NEW.group_key, '$[1]'),
+           JSON_EXTRACT(NEW.group_key, '$[2]'),
+           JSON_EXTRACT(NEW.group_key, '$[3]'),
+           JSON_EXTRACT(NEW.group_key, '$[4]')
+    WHERE NEW.sign = 1
+    ON CONFLICT (group_key) DO NOTHING;
+
+    INSERT INTO offers_rollup (group_id, total_offers)
+    SELECT g.id, NEW.sign
+    FROM offer_groups g
+    WHERE g.group_key = NEW.group_key
+    ON CONFLICT (group_id) DO UPDATE SET total_offers = total_offers + excluded.total_offers;
+
+    INSERT INTO salaries_rollup (group_id, contract_type, currency, total_offers, salary_sum)
+    SELECT g.id, s.contract_type, s.currency, NEW.sign, NEW.sign * ROUND((s.salary_from + s.salary_to) / 2)
+    FROM offer_salaries s
+             JOIN offer_groups g ON g.group_key = NEW.group_key
+    WHERE s.offer_id = NEW.offer_id
+      AND s.salary_from IS NOT NULL
+      AND s.salary_to IS NOT NULL
+      AND s.currency IS NOT NULL
+    ON CONFLICT (group_id, contract_type, currency) DO UPDATE
+        SET total_offers = total_offers + excluded.total_offers,
+            salary_sum   = salary_sum + excluded.salary_sum;
+
+    INSERT INTO skills_rollup (group_id, tech_id, level, total_offers)
+    SELECT g.id, s.tech_id, IFNULL(s.level, -1), NEW.sign
+    FROM offer_skills s
+             JOIN offer_groups g ON g.group_key = NEW.group_key
+    WHERE s.offer_id = NEW.offer_id
+    ON CONFLICT (group_id, tech_id, level) DO UPDATE SET total_offers = total_offers + excluded.total_offers;
+
+    DELETE
+    FROM offer_skills
+    WHERE NEW.sign = -1
+      AND offer_id = NEW.offer_id;
+
+    DELETE
+    FROM offer_salaries
+    WHERE NEW.sign = -1
+      AND offer_id = NEW.offer_id;
+
+    -- groups left without offers
+    DELETE
+    FROM offers_rollup
+    WHERE group_id = (SELECT id FROM offer_groups WHERE group_key = NEW.group_key)
+      AND total_offers = 0;
+
+    DELETE
+    FROM salaries_rollup
+    WHERE group_id = (SELECT id FROM offer_groups WHERE group_key = NEW.group_key)
+      AND total_offers = 0;
+
+    DELETE
+    FROM skills_rollup
+    WHERE group_id = (SELECT id FROM offer_groups WHERE group_key = NEW.group_key)
+      AND total_offers = 0;
+END;
+
+-- triggers maintaining the tables derived from job_offers, an update removes the old offer and adds the new one
+DROP TRIGGER IF EXISTS job_offers_after_insert;
+CREATE TRIGGER job_offers_after_insert
+    AFTER INSERT
+    ON job_offers
+    WHEN NOT EXISTS (SELECT 1 FROM bulk_load)
+BEGIN
+    INSERT INTO offer_changes (sign, offer_id, group_key, tech_stack, salary)
+    VALUES (1, NEW.id, JSON_ARRAY(SUBSTR(NEW.date_add, 1, 7), NEW.category, NEW.location, NEW.experience,
+                                  NEW.operating_mode), NEW.tech_stack, NEW.salary);
+END;
+
+-- only changes of the columns read by the derived tables, an upsert sets all columns of the offer
+DROP TRIGGER IF EXISTS job_offers_after_update;
+CREATE TRIGGER job_offers_after_update
+    AFTER UPDATE OF date_add, category, location, experience, operating_mode, salary, tech_stack
+    ON job_offers
+    WHEN NOT EXISTS (SELECT 1 FROM bulk_load)
+        AND (OLD.date_add IS NOT NEW.date_add OR OLD.category IS NOT NEW.category
+            OR OLD.location IS NOT NEW.location OR OLD.experience IS NOT NEW.experience
+            OR OLD.operating_mode IS NOT NEW.operating_mode OR OLD.salary IS NOT NEW.salary
+            OR OLD.tech_stack IS NOT NEW.tech_stack)
+BEGIN
+    INSERT INTO offer_changes (sign, offer_id, group_key, tech_stack, salary)
+    VALUES (-1, OLD.id, JSON_ARRAY(SUBSTR(OLD.date_add, 1, 7), OLD.category, OLD.location, OLD.experience,
+                                   OLD.operating_mode), NULL, NULL),
+           (1, NEW.id, JSON_ARRAY(SUBSTR(NEW.date_add, 1, 7), NEW.category, NEW.location, NEW.experience,
+                                  NEW.operating_mode), NEW.tech_stack, NEW.salary);
+END;
+
+DROP TRIGGER IF EXISTS job_offers_after_delete;
+CREATE TRIGGER job_offers_after_delete
+    AFTER DELETE
+    ON job_offers
+    WHEN NOT EXISTS (SELECT 1 FROM bulk_load)
+BEGIN
+    INSERT INTO offer_changes (sign, offer_id, group_key, tech_stack, salary)
+    VALUES (-1, OLD.id, JSON_ARRAY(SUBSTR(OLD.date_add, 1, 7), OLD.category, OLD.location, OLD.experience,
+                                   OLD.operating_mode), NULL, NULL);
+END;
+
+-- the queue of remove_older_duplicates() is kept during bulk loads as well
+DROP TRIGGER IF EXISTS job_offers_after_insert_dedup;
+CREATE TRIGGER job_offers_after_insert_dedup
+    AFTER INSERT
+    ON job_offers
+BEGIN
+    INSERT INTO dedup_queue (offer_id)
+    VALUES (NEW.id)
+    ON CONFLICT (offer_id) DO NOTHING;
+END;
+
+DROP TRIGGER IF EXISTS job_offers_after_update_dedup;
+CREATE TRIGGER job_offers_after_update_dedup
+    AFTER UPDATE
+    ON job_offers
+BEGIN
+    INSERT INTO dedup_queue (offer_id)
+    VALUES (NEW.id)
+    ON CONFLICT (offer_id) DO NOTHING;
+END;
+
+DROP TRIGGER IF EXISTS job_offers_after_delete_dedup;
+CREATE TRIGGER job_offers_after_delete_dedup
+    AFTER DELETE
+    ON job_offers
+BEGIN
+    DELETE
+    FROM dedup_queue
+    WHERE offer_id = OLD.id;
+END;
+
+-- the unique index on link (job_offers_uindex_link) is created by Database,
+-- so that a database with duplicated links can still be opened
 
 --CREATE UNIQUE INDEX job_offers_uindex_offer
     --ON job_offers (title, company, category, location, source, link, date_add, operating_mode);
@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from app.database import Database
+from app.extraction import Document, Extraction, ExtractionPlan, find_original_url
+from app.logger import Logger
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+CITIES = ["Warszawa", "Kraków", "Wrocław", "Poznań", "Gdańsk"]
+SKILLS = ["Python", "Java", "SQL", "Docker", "AWS", "React", "Kubernetes", "Git", "Linux", "Spark"]
+LEVELS = ["nice to have", "junior", "regular", "advanced", "master"]
+
+PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<title>{title} - {company}</title>
+<link rel="canonical" href="https://justjoin.it/job-offer/{slug}"/>
+<meta property="og:url" content="https://justjoin.it/job-offer/{slug}"/>
+{scripts}
+<script>self.__next_f.push([1,{state}])</script>
+</head>
+<body>
+<div id="__next">{layout}
+<div class="MuiBox-root css-s52zl1"><div><h1>{title}</h1></div></div>
+<h2 class="MuiTypography-root MuiTypography-body1 css-77dijd">{company}</h2>
+<span class="css-1o4wo1x">{city}</span>
+<div class="MuiBox-root css-1aq4u2o">{category}</div>
+<div class="MuiBox-root css-1km0bek"><span class="css-1pavfqb">{salary_from} - {salary_to} PLN</span>
+<span class="css-1waow8k">Net per month - B2B</span></div>
+<div><div class="MuiBox-root css-1k7fv8q">Type of work</div><div class="MuiBox-root css-ktfb40">Full-time</div></div>
+<div><div class="MuiBox-root css-1k7fv8q">Experience</div><div class="MuiBox-root css-ktfb40">{experience}</div></div>
+<div><div class="MuiBox-root css-1k7fv8q">Employment Type</div><div class="MuiBox-root css-ktfb40">B2B</div></div>
+<div><div class="MuiBox-root css-1k7fv8q">Operating mode</div><div class="MuiBox-root css-ktfb40">{mode}</div></div>
+{skills}{layout}
+</div>
+</body>
+</html>
+"""
+SKILL = """<div class="MuiBox-root css-jfr3nf"><h4 class="MuiTypography-root MuiTypography-subtitle2 css-b849nv">{name}</h4>
+<span class="MuiTypography-root MuiTypography-subtitle4 css-3d5s10">{level}</span></div>
+"""
+
+
+def generate_pages(folder, count, seed=2023):
+    """
+    Writes justjoin.it offer pages padded with scripts and layout, like the pages saved by link_extraction.
+
+    :param folder:  Folder of the pages.
+    :param count:   Number of pages.
+    :param seed:    Seed of the random generator, so every run uses the same pages.
+    """
+    generator = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+
+    for number in range(count):
+        # Most of a real page is inline state and layout which no selector needs
+        scripts = "\n".join(f"<script>self.__next_f.push([1,{json.dumps('x' * 2000 + str(part))}])</script>"
+                            for part in range(20))
+        layout = "".join(f'<div class="MuiBox-root css-{part}"><a href="/offers/{part}"><span>Offer {part}</span>'
+                         f'</a></div>' for part in range(150))
+        levels = {name: generator.randint(1, 5) for name in generator.sample(SKILLS, 4)}
+        skills = "".join(SKILL.format(name=name, level=LEVELS[level - 1]) for name, level in levels.items())
+
+        values = dict(title=f"Developer {number}", company=f"Company {number % 50}", slug=f"offer-{number}",
+                      published_at=f"2023-{1 + number % 12:02d}-{1 + number % 28:02d}T10:00:00.000Z",
+                      city=generator.choice(CITIES), category=generator.choice(["Python", "Java", "DevOps"]),
+                      salary_from=generator.randint(8, 20) * 1000, salary_to=generator.randint(21, 30) * 1000,
+                      experience=generator.choice(["Junior", "Mid", "Senior"]),
+                      mode=generator.choice(["Remote", "Hybrid", "Office"]))
+        # The offer is also embedded as the escaped Next.js state, like on justjoin.it
+        state = {"offer": {"slug": values["slug"], "title": values["title"], "companyName": values["company"],
+                           "city": values["city"], "markerIcon": values["category"].lower(),
+                           "experienceLevel": values["experience"].lower(), "workplaceType": values["mode"].lower(),
+                           "employmentTypes": [{"type": "b2b", "from": values["salary_from"],
+                                                "to": values["salary_to"], "currency": "pln"}],
+                           "requiredSkills": [{"name": name, "level": level} for name, level in levels.items()],
+                           "publishedAt": values["published_at"]}}
+
+        page = PAGE.format(**dict(values, salary_from=f"{values['salary_from'] // 1000} 000",
+                                  salary_to=f"{values['salary_to'] // 1000} 000"),
+                           state=json.dumps(f"5:{json.dumps(['$', 'div', None, state], separators=(',', ':'))}"),
+                           scripts=scripts, layout=layout, skills=skills)
+
+        with open(os.path.join(folder, f"offer_{number}.html"), "w", encoding="utf-8") as file:
+            file.write(page)
+
+
+def extract_as_before(ex, file_path, site):
+    """
+    Extracts a saved page the way file_extraction() did before the pages were read once into a Document
+    and the selectors compiled into plans: find_original_url() opens and parses the file a second time,
+    and the selectors of the site are interpreted again for every page.
+    """
+    job_offer_data = ex._offer_data(find_original_url(file_path), "file")
+    plan = ExtractionPlan(ex.sites_structure[site], ex.tech_levels)
+
+    try:
+        plan.run(Document.from_file(file_path), job_offer_data, ex.logger, file_path)
+        ex.writer.add(job_offer_data)
+    except Exception as e:
+        ex.logger.error(f"Unexpected error while extracting data from file {file_path}: {e}")
+
+
+def measure(pages, sites_structure, site, strained, embedded, baseline=False):
+    """
+    Extracts offers from the pages into a new, empty database and measures the time.
+    With baseline, the pages are extracted by extract_as_before().
+
+    :return: Tuple (seconds, number of rows in the table).
+    """
+    folder = tempfile.mkdtemp()
+    logger = Logger(log_to_file=False, log_to_console=False)
+
+    try:
+        db = Database(logger, db_folder=folder)
+        ex = Extraction(logger, db, sites_structure, folder, strained=strained, embedded=embedded)
+
+        start_time = time.perf_counter()
+
+        for page in pages:
+            if baseline:
+                extract_as_before(ex, page, site)
+            else:
+                ex.file_extraction(page, site)
+
+        ex.writer.flush()
+
+        seconds = time.perf_counter() - start_time
+        rows_count = db.execute_query("SELECT COUNT(*) FROM job_offers;")[0][0]
+        db.close_connection()
+
+        return seconds, rows_count
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def measure_parsing(pages, strainer):
+    """
+    Parses the pages and measures the time and the peak of memory allocated while parsing one page.
+    The memory is traced in a second pass, tracemalloc slows allocations down.
+
+    :return: Tuple (milliseconds per page, average peak in KiB per page).
+    """
+    documents = [Document.from_file(page, strainer) for page in pages]
+
+    start_time = time.perf_counter()
+
+    for document in documents:
+        document.soup
+
+    milliseconds = (time.perf_counter() - start_time) * 1000 / len(pages)
+    peaks = 0
+
+    for page in pages:
+        document = Document.from_file(page, strainer)
+
+        tracemalloc.start()
+        document.soup
+        peaks += tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return milliseconds, peaks / 1024 / len(pages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the throughput of the extraction of saved pages.")
+    parser.add_argument("--pages", default=os.path.join(project_root, 'data', 'raw', 'downloaded_sites'),
+                        help="folder of saved pages, synthetic pages are generated if it is missing or empty")
+    parser.add_argument("--generate", type=int, default=200, help="number of generated pages")
+    parser.add_argument("--site", default="justjoin.it", help="site from sites_structure.json")
+    arguments = parser.parse_args()
+
+    with open(os.path.join(project_root, 'app', 'sites_structure.json'), "r", encoding="utf-8") as file:
+        sites_structure = json.load(file)
+
+    generated = None
+
+    if os.path.isdir(arguments.pages) and os.listdir(arguments.pages):
+        folder = arguments.pages
+    else:
+        generated = folder = tempfile.mkdtemp()
+        generate_pages(folder, arguments.generate)
+
+    try:
+        pages = sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(".html"))
+        plan = ExtractionPlan(sites_structure[arguments.site], {})
+
+        # Pages parsed twice and selectors interpreted per page, as before Document and ExtractionPlan
+        seconds, rows_count = measure(pages, sites_structure, arguments.site, strained=False, embedded=False,
+                                      baseline=True)
+        print(f"{'baseline':<10} {seconds:8.2f} s  {len(pages) / seconds:8.1f} pages/s  ({rows_count} rows)")
+
+        for name, strained in (("full", False), ("strained", True)):
+            seconds, rows_count = measure(pages, sites_structure, arguments.site, strained, embedded=False)
+            milliseconds, peak = measure_parsing(pages[:20], plan.strainer if strained else None)
+
+            print(f"{name:<10} {seconds:8.2f} s  {len(pages) / seconds:8.1f} pages/s  ({rows_count} rows)  "
+                  f"parse {milliseconds:6.1f} ms/page  peak {peak:8.0f} KiB/page")
+
+        # Offers embedded in the pages as JSON, the DOM is parsed only for the pages without them
+        seconds, rows_count = measure(pages, sites_structure, arguments.site, strained=False, embedded=True)
+        print(f"{'embedded':<10} {seconds:8.2f} s  {len(pages) / seconds:8.1f} pages/s  ({rows_count} rows)")
+    finally:
+        if generated:
+            shutil.rmtree(generated, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
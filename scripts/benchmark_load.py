@@ -0,0 +1,100 @@
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+from app.database import Database
+from app.logger import Logger
+from scripts.etl import transform_rows
+
+CATEGORIES = ["python", "java", "javascript", "devops", "data", "testing", "php", "net", "mobile", "other"]
+CITIES = ["Warszawa", "Kraków", "Wrocław", "Poznań", "Gdańsk", "Łódź", "Katowice", "Remote"]
+SKILLS = ["Python", "Java", "SQL", "Docker", "AWS", "React", "Kubernetes", "Git", "Linux", "Spark"]
+
+
+def generate_offers(count, seed=2023):
+    """
+    Generates offers in the Kaggle format. About 10% of them repeat an earlier offer with a newer date.
+
+    :param count:   Number of offers.
+    :param seed:    Seed of the random generator, so every run loads the same data.
+    :return:        List of offers.
+    """
+    generator = random.Random(seed)
+    offers = []
+
+    for number in range(count):
+        repeated = number > 10 and generator.random() < 0.1
+        offer_number = generator.randrange(number) if repeated else number
+
+        offers.append({
+            "title": f"Developer {offer_number}",
+            "company_name": f"Company {offer_number % 5000}",
+            "city": CITIES[offer_number % len(CITIES)],
+            "marker_icon": CATEGORIES[offer_number % len(CATEGORIES)],
+            "published_at": f"20{21 + number * 3 // count}-{1 + number % 12:02d}-{1 + number % 28:02d}"
+                            f"T{number % 24:02d}:00:00.000Z",
+            "employment_types": [{"type": "b2b", "salary": {"from": 10000 + number % 9000, "to": 20000,
+                                                            "currency": "pln"}},
+                                 {"type": "permanent", "salary": None}],
+            "experience_level": generator.choice(["junior", "mid", "senior"]),
+            "workplace_type": generator.choice(["remote", "hybrid", "office"]),
+            "skills": [{"name": skill, "level": generator.randint(1, 5)} for skill in generator.sample(SKILLS, 4)],
+            "id": f"offer-{number}"
+        })
+
+    return offers
+
+
+def measure(offers, chunk_size, bulk):
+    """
+    Loads offers into a new, empty database and measures the time.
+
+    :return: Tuple (seconds, number of rows in the table).
+    """
+    folder = tempfile.mkdtemp()
+    logger = Logger(log_to_file=False, log_to_console=False)
+
+    try:
+        db = Database(logger, db_folder=folder)
+        chunks = [transform_rows(offers[start:start + chunk_size], logger, db.fields)
+                  for start in range(0, len(offers), chunk_size)]
+
+        start_time = time.perf_counter()
+
+        if bulk:
+            db.begin_bulk_load(apply_pragmas=True, defer_indexes=True)
+
+            for rows in chunks:
+                db.bulk_load_job_offers(rows)
+
+            db.end_bulk_load()
+        else:
+            for rows in chunks:
+                db.insert_job_offers_batch(rows)
+
+        seconds = time.perf_counter() - start_time
+        rows_count = db.execute_query("SELECT COUNT(*) FROM job_offers;")[0][0]
+        db.close_connection()
+
+        return seconds, rows_count
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the throughput of the batch and bulk-load modes.")
+    parser.add_argument("--offers", type=int, default=300_000, help="number of generated offers")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="number of offers loaded at once")
+    arguments = parser.parse_args()
+
+    offers = generate_offers(arguments.offers)
+
+    for name, bulk in (("insert_job_offers_batch", False), ("bulk_load_job_offers", True)):
+        seconds, rows_count = measure(offers, arguments.chunk_size, bulk)
+        print(f"{name:<25} {seconds:8.2f} s  {len(offers) / seconds:10.0f} offers/s  ({rows_count} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,35 @@
+import argparse
+import hashlib
 import json
 import os
+import queue
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import Manager
 
 from app.database import Database
 from app.logger import Logger
+from app.snapshot import export_snapshot
+
+# Number of characters read from a JSON file at once in the streaming mode
+READ_BLOCK_SIZE = 64 * 1024
+
+# Number of offers transformed and inserted into the database at once
+DEFAULT_CHUNK_SIZE = 1000
+
+_WHITESPACE = re.compile(r'\s*')
+_SEPARATORS = re.compile(r'[\s,]*')
+
+# Number of chunks of rows a worker of the parallel mode can transform ahead of the database writer
+BUFFERED_CHUNKS = 2
+
+# Number of bytes read at once while hashing a source file
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# State of a worker process in the parallel mode, set once by _init_worker()
+_worker_state = {}
 
 
 def extract(file, logger):
@@ -25,6 +52,101 @@ def extract(file, logger):
     return all_data
 
 
+def iter_offers(file, logger, block_size=READ_BLOCK_SIZE):
+    """
+    Streams offers one by one from the top-level JSON array in the specified file.
+
+    Only the current read block and the offer being decoded are kept in memory,
+    so the peak memory usage does not depend on the size of the file.
+
+    :param logger:      The logger object.
+    :param file:        The path to the JSON file.
+    :param block_size:  Number of characters read from the file at once.
+    :return:            Generator of offers loaded from the file. It returns True if the whole array was read,
+                        False if the streaming stopped on an error (logged).
+    """
+    decoder = json.JSONDecoder()
+
+    try:
+        with open(file, 'r', encoding='utf-8') as f:
+            buffer = ''
+            position = 0
+            eof = False
+
+            def read_more():
+                nonlocal buffer, position, eof
+                # We drop the already decoded part of the buffer before appending the next block
+                block = f.read(block_size)
+                buffer = buffer[position:] + block
+                position = 0
+                eof = not block
+
+            def skip(pattern):
+                nonlocal position
+                position = pattern.match(buffer, position).end()
+                while position == len(buffer) and not eof:
+                    read_more()
+                    position = pattern.match(buffer, position).end()
+
+                if position == len(buffer):
+                    raise ValueError("unexpected end of file, the JSON array is not closed")
+
+            skip(_WHITESPACE)
+            if buffer[position] != '[':
+                raise ValueError("the file does not contain a top-level JSON array")
+            position += 1
+
+            while True:
+                skip(_SEPARATORS)
+                if buffer[position] == ']':
+                    return True
+
+                try:
+                    offer, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    # The offer is split between blocks
+                    read_more()
+                    continue
+
+                # A value that ends exactly at the end of the buffer may be truncated (e.g. a number)
+                if end == len(buffer) and not eof:
+                    read_more()
+                    continue
+
+                position = end
+                yield offer
+    except Exception as e:
+        logger.error(f"An error occurred while streaming data from {file}: {e}")
+
+        return False
+
+
+def _yield_from(generator, results):
+    # Yields the items of the generator and appends its return value to results
+    results.append((yield from generator))
+
+
+def extract_chunks(file, logger, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Streams JSON data from the specified file in chunks of a fixed size.
+
+    :param logger:      The logger object.
+    :param file:        The path to the JSON file.
+    :param chunk_size:  Maximum number of offers in one chunk.
+    :return:            Generator of lists of offers loaded from the file.
+                        It returns True if the whole file was read.
+    """
+    read = []
+    offers = _yield_from(iter_offers(file, logger), read)
+
+    while chunk := list(islice(offers, chunk_size)):
+        yield chunk
+
+    return read == [True]
+
+
 def transform(data, logger):
     """
     Processes JSON data into a format suitable for the database.
@@ -68,43 +190,370 @@ def transform(data, logger):
         return []
 
 
-def etl() -> None:
-    processed_files = 0
+def transform_rows(data, logger, fields):
+    """
+    Processes JSON data column by column into rows ready for insertion into the database.
 
-    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    The values are the same as those returned by transform(), but each column is collected
+    into a list in a single pass over the offers (walking employment_types only once per offer)
+    and the rows are assembled by zipping the columns, without a dictionary per offer.
 
-    logger = Logger(log_folder=os.path.join(project_root, 'logs'))
-    db = Database(logger, db_folder=os.path.join(project_root, 'data'))
+    :param logger:  The logger object.
+    :param data:    List of jobs loaded from JSON.
+    :param fields:  Names of the columns, in the order of values in a row.
+    :return:        List of tuples with values in the order of fields.
+    """
+    titles, companies, locations, categories, dates = [], [], [], [], []
+    salaries, experiences, employments, operating_modes, tech_stacks, links = [], [], [], [], [], []
+    dumps = json.dumps
 
-    path_to_offers = os.path.join(project_root, 'data', 'raw', 'downloaded_offers',
-                                  'justjoinit-job-offers-data-2021-10-2023-09')
+    try:
+        for offer in data:
+            get = offer.get
 
-    logger.debug("The ETL process has begun...")
+            titles.append(offer['title'])
+            companies.append(offer['company_name'])
+            locations.append(get('city', '').lower())
+            categories.append(get('marker_icon', '').lower())
+            dates.append(get('published_at', '').lower().replace('t', ' ').replace('z', ''))
+
+            salary = {}
+            employment_types = []
+
+            for emp in get('employment_types', []) or []:
+                emp_type = emp.get('type', '')
+                emp_salary = emp.get('salary')
+
+                if emp_salary:
+                    salary[emp_type] = {'from': emp_salary.get('from'), 'to': emp_salary.get('to'),
+                                        'currency': emp_salary.get('currency')}
+                else:
+                    salary[emp_type] = {'from': None, 'to': None, 'currency': None}
+
+                employment_types.append(emp_type)
+
+            salaries.append(dumps(salary))
+            experiences.append(get('experience_level', '').lower())
+            employments.append(', '.join(employment_types).lower())
+            operating_modes.append(get('workplace_type', '').lower())
+            tech_stacks.append(dumps({skill['name']: skill['level'] for skill in get('skills', []) or []}))
+            links.append('https://justjoin.it/job-offer/' + get('id', ''))
+
+        columns = {
+            'title': titles,
+            'company': companies,
+            'location': locations,
+            'category': categories,
+            'date_add': dates,
+            'salary': salaries,
+            'experience': experiences,
+            'employment': employments,
+            'operating_mode': operating_modes,
+            'tech_stack': tech_stacks,
+            'link': links,
+            'source': ['justjoin.it'] * len(titles)
+        }
 
+        return list(zip(*(columns[field] for field in fields)))
+    except Exception as e:
+        logger.error(f"An error occurred while transforming data: {e}")
+        return []
+
+
+def transform_file(file, logger, fields, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Streams one JSON file as chunks of rows ready for insertion into the database.
+
+    :param file:        The path to the JSON file.
+    :param logger:      The logger object.
+    :param fields:      Names of the columns, in the order of values in a row.
+    :param chunk_size:  Number of offers transformed at once.
+    :return:            Generator of lists of tuples with values in the order of fields. It returns True
+                        if the whole file was read and every chunk was transformed.
+    """
+    read = []
+    transformed = True
+
+    for extracted_data in _yield_from(extract_chunks(file, logger, chunk_size), read):
+        rows = transform_rows(extracted_data, logger, fields)
+
+        if rows:
+            yield rows
+        else:
+            # The chunk contains an invalid offer, see transform_rows()
+            transformed = False
+
+    return read == [True] and transformed
+
+
+def find_offer_files(path_to_offers):
     """
     Searches a folder recursively for JSON files.
 
+    The files are sorted, so every run (serial or parallel) processes them in the same order.
+
     :param path_to_offers:  The path from which we start the search.
+    :return:                Sorted list of paths to the JSON files.
     """
+    offer_files = []
+
     for root, dirs, files in os.walk(path_to_offers):
         for file in files:
             if file.endswith(".json"):
-                logger.debug(f"Found file {file} in {root}")
+                offer_files.append(os.path.join(root, file))
 
-                extracted_data = extract(os.path.join(root, file), logger)
-                transformed_data = transform(extracted_data, logger)
+    return sorted(offer_files)
 
-                if not transformed_data:
-                    logger.warning(f"No data to insert from {file}")
-                    continue
-                else:
-                    processed_files += 1
-                    db.insert_job_offers_batch(transformed_data)
+
+def hash_file(file, block_size=HASH_BLOCK_SIZE):
+    """
+    Calculates the SHA-256 hash of the file content.
+
+    :param file:        The path to the file.
+    :param block_size:  Number of bytes read from the file at once.
+    :return:            Hexadecimal digest of the file content.
+    """
+    digest = hashlib.sha256()
+
+    with open(file, 'rb') as f:
+        while block := f.read(block_size):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def select_changed_files(offer_files, path_to_offers, db, logger, full=False):
+    """
+    Compares JSON files with the ETL manifest and selects those which have to be loaded.
+
+    A file is skipped when its size and modification time match the manifest. When only
+    the metadata differs, the content hash decides and the manifest entry is refreshed.
+
+    :param offer_files:     Paths to the JSON files.
+    :param path_to_offers:  The folder the manifest paths are relative to.
+    :param db:              The database object.
+    :param logger:          The logger object.
+    :param full:            If True, all files are selected regardless of the manifest.
+    :return:                Dictionary: file -> (manifest path, size, mtime, content hash).
+    """
+    manifest = {} if full else db.get_manifest()
+    changed_files = {}
+
+    for file in offer_files:
+        path = os.path.relpath(file, path_to_offers).replace(os.sep, '/')
+        stat = os.stat(file)
+        entry = manifest.get(path)
+
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            logger.debug(f"The file {path} has not changed since the last run. Skipping.")
+            continue
+
+        content_hash = hash_file(file)
+
+        if entry and entry['content_hash'] == content_hash:
+            logger.debug(f"The content of the file {path} has not changed since the last run. Skipping.")
+            db.update_manifest(path, stat.st_size, stat.st_mtime, content_hash, entry['rows'])
+            continue
+
+        changed_files[file] = (path, stat.st_size, stat.st_mtime, content_hash)
+
+    return changed_files
+
+
+def _init_worker(fields, chunk_size):
+    # Workers log only to the console, the log file is owned by the main process
+    _worker_state['logger'] = Logger(log_to_file=False)
+    _worker_state['fields'] = fields
+    _worker_state['chunk_size'] = chunk_size
+
+
+def _process_file(file, chunks):
+    # Sends the chunks of rows of the file one by one, then None, and returns True if the file was complete
+    complete = []
+
+    try:
+        for rows in _yield_from(transform_file(file, _worker_state['logger'], _worker_state['fields'],
+                                               _worker_state['chunk_size']), complete):
+            chunks.put(rows)
+    finally:
+        chunks.put(None)
+
+    return complete == [True]
+
+
+def _received_chunks(chunks, future):
+    # Yields the chunks sent by _process_file() and returns its result
+    while True:
+        try:
+            rows = chunks.get(timeout=1)
+        except queue.Empty:
+            # The error of a worker which stopped without sending None, e.g. a killed process
+            if future.done():
+                future.result()
+
+            continue
+
+        if rows is None:
+            return future.result()
+
+        yield rows
+
+
+def transform_files_in_parallel(offer_files, fields, chunk_size=DEFAULT_CHUNK_SIZE, workers=None,
+                                buffered_chunks=BUFFERED_CHUNKS):
+    """
+    Extracts and transforms JSON files in a pool of worker processes.
+
+    Results are returned in the order of offer_files, no matter which worker finishes first,
+    so the single writer receives rows in the same sequence as in a serial run.
+    Every worker processes one file and sends its rows back chunk by chunk through a bounded queue,
+    waiting when buffered_chunks chunks are not taken yet. The memory used for rows is therefore
+    about chunk_size * workers * (buffered_chunks + 1) offers, whatever the size of the files.
+
+    :param offer_files:     Paths to the JSON files.
+    :param fields:          Names of the columns, in the order of values in a row.
+    :param chunk_size:      Number of offers transformed at once by a worker.
+    :param workers:         Number of worker processes (by default the number of CPUs).
+    :param buffered_chunks: Number of chunks of a file a worker can transform ahead of the consumer.
+    :return:                Generator of tuples (file, generator of chunks of rows), see transform_file().
+    """
+    workers = workers or os.cpu_count() or 1
+    files = iter(offer_files)
+    pending = deque()
+
+    with Manager() as manager, ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                   initargs=(fields, chunk_size)) as executor:
+        def submit(file):
+            chunks = manager.Queue(maxsize=buffered_chunks)
+            pending.append((file, chunks, executor.submit(_process_file, file, chunks)))
+
+        try:
+            for file in islice(files, workers):
+                submit(file)
+
+            while pending:
+                file, chunks, future = pending[0]
+                received = _received_chunks(chunks, future)
+
+                yield file, received
+
+                # Chunks not taken by the consumer are dropped, so the worker is not blocked
+                deque(received, maxlen=0)
+                pending.popleft()
+
+                next_file = next(files, None)
+                if next_file is not None:
+                    submit(next_file)
+        finally:
+            # When the consumer stops early, the workers still waiting to send chunks are released
+            for _, chunks, future in pending:
+                future.cancel()
+
+                while not future.done():
+                    try:
+                        chunks.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+
+
+def etl(chunk_size=DEFAULT_CHUNK_SIZE, workers=1, full=False, bulk=False, snapshot=False) -> None:
+    """
+    Loads offers from the Kaggle JSON files into the database.
+
+    The files are streamed in chunks, so only one chunk of offers is kept in memory at a time.
+    With more than one worker, files are extracted and transformed in a pool of processes,
+    while the main process remains the only one writing to the database.
+    Files recorded in the ETL manifest and unchanged since then are skipped. A file is recorded only
+    if it was read to the end of its JSON array and every chunk was transformed and loaded.
+
+    :param chunk_size:  Number of offers transformed and inserted into the database at once.
+    :param workers:     Number of worker processes, 1 means the serial mode.
+    :param full:        If True, all files are loaded again regardless of the manifest.
+    :param bulk:        If True, chunks are loaded through a staging table with load-time PRAGMAs,
+                        and on the first load the secondary indexes are created at the end.
+    :param snapshot:    If True, the columnar snapshot in data/snapshot is exported again after the load.
+    """
+    processed_files = 0
+
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+    logger = Logger(log_folder=os.path.join(project_root, 'logs'))
+    db = Database(logger, db_folder=os.path.join(project_root, 'data'))
+
+    path_to_offers = os.path.join(project_root, 'data', 'raw', 'downloaded_offers',
+                                  'justjoinit-job-offers-data-2021-10-2023-09')
+
+    logger.debug("The ETL process has begun...")
+
+    offer_files = find_offer_files(path_to_offers)
+    changed_files = select_changed_files(offer_files, path_to_offers, db, logger, full)
+    logger.info(f"{len(changed_files)} of {len(offer_files)} files are new or modified.")
+
+    offer_files = list(changed_files)
+
+    if workers > 1:
+        logger.debug(f"Processing {len(offer_files)} files with {workers} workers")
+        results = transform_files_in_parallel(offer_files, db.fields, chunk_size, workers)
+    else:
+        results = ((file, transform_file(file, logger, db.fields, chunk_size)) for file in offer_files)
+
+    if bulk:
+        db.begin_bulk_load(apply_pragmas=True, defer_indexes=True)
+        load = db.bulk_load_job_offers
+    else:
+        load = db.insert_job_offers_batch
+
+    try:
+        for file, chunks in results:
+            logger.debug(f"Found file {file}")
+
+            inserted_offers = 0
+            loaded = True
+            read = []
+
+            for rows in _yield_from(chunks, read):
+                loaded = load(rows) and loaded
+                inserted_offers += len(rows)
+
+            if read == [True] and loaded:
+                db.update_manifest(*changed_files[file], inserted_offers)
+            else:
+                logger.warning(f"The file {file} was not loaded completely, it is not recorded in the ETL manifest.")
+
+            if not inserted_offers:
+                logger.warning(f"No data to insert from {file}")
+                continue
+            else:
+                processed_files += 1
+    finally:
+        if bulk:
+            db.end_bulk_load()
 
     logger.info(f"The ETL process has been completed successfully! Proccesed {processed_files} files.")
 
+    if snapshot:
+        export_snapshot(db.connection, os.path.join(project_root, 'data', 'snapshot'), logger)
+
     db.close_connection()
 
 
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Loads job offers from the Kaggle JSON files into the database.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes extracting and transforming files (default: 1)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"number of offers inserted into the database at once (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--full", action="store_true",
+                        help="load all files again, including those unchanged since the last run")
+    parser.add_argument("--bulk", action="store_true",
+                        help="use the bulk-load mode (staging table, load-time PRAGMAs, deferred indexes)")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="export the columnar snapshot of job_offers to data/snapshot after the load")
+
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    etl()
+    arguments = parse_arguments()
+    etl(chunk_size=arguments.chunk_size, workers=arguments.workers, full=arguments.full, bulk=arguments.bulk,
+        snapshot=arguments.snapshot)
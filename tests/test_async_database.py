@@ -0,0 +1,138 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from app.async_database import AsyncDatabase
+from app.database import Database, OfferFilter
+from app.logger import Logger
+
+sample_offer = {
+    "title": "Python Developer",
+    "company": "Software House",
+    "location": "warsaw",
+    "link": "http://justjoin.it/python-offer",
+    "date_add": "2023-01-01 10:00:00",
+    "category": "python",
+    "experience": "mid",
+    "employment": "b2b",
+    "operating_mode": "remote",
+    "salary": '{"b2b": {"from": 10000, "to": 15000, "currency": "pln"}}',
+    "tech_stack": '{"Python": 3, "Django": 3}',
+    "source": "justjoin.it"
+}
+
+
+@pytest.fixture
+def test_logger():
+    """
+    Fixture that creates a logger with a temporary log file.
+    """
+    return Logger(log_folder="tmp")
+
+
+@pytest.fixture
+def test_database(test_logger):
+    """
+    Fixture to create a Database object in pooled mode with a few offers.
+    """
+    db = Database(test_logger, db_folder="tmp", read_connections=3)
+    db.insert_job_offers_batch([
+        dict(sample_offer, title=f"Developer {number}", link=f"http://justjoin.it/developer-{number}",
+             location=["warsaw", "krakow", "gdansk"][number % 3],
+             category=["python", "java"][number % 2], date_add=f"2023-0{number % 3 + 1}-10 10:00:00")
+        for number in range(12)
+    ])
+
+    yield db
+
+    db.execute_query("DELETE FROM job_offers;")
+    db.close_connection()
+
+
+def test_refresh_matches_sync_methods(test_database):
+    """
+    Check that the concurrent refresh returns the same DataFrames as the methods of Database.
+    """
+    filters = OfferFilter(categories=["python"])
+    adb = AsyncDatabase(test_database)
+
+    try:
+        results = asyncio.run(adb.refresh(filters, limits={'get_offers_by_location': 2}))
+    finally:
+        adb.close()
+
+    assert list(results) == list(AsyncDatabase.methods)
+    assert len(results['get_offers_by_location']) == 2
+
+    for name, df in results.items():
+        assert df.equals(getattr(test_database, name)(filters, 2 if name == 'get_offers_by_location' else None))
+
+
+def test_newer_refresh_cancels_older(test_database):
+    """
+    Check that starting a refresh cancels the one still in progress.
+    """
+    adb = AsyncDatabase(test_database)
+
+    async def change_filters():
+        stale = asyncio.create_task(adb.refresh(OfferFilter(categories=["java"])))
+        await asyncio.sleep(0)
+        current = await adb.refresh(OfferFilter(categories=["python"]))
+
+        with pytest.raises(asyncio.CancelledError):
+            await stale
+
+        return current
+
+    try:
+        results = asyncio.run(change_filters())
+    finally:
+        adb.close()
+
+    assert results['get_offers_by_location']['total_offers'].sum() == 6
+
+
+def test_interrupt_reads(test_database):
+    """
+    Check that a query running on a read-only connection is aborted by interrupt_reads().
+    """
+    started = threading.Event()
+    errors = []
+
+    def long_query():
+        with test_database._read_connection() as connection:
+            started.set()
+
+            try:
+                connection.execute("""
+                    WITH RECURSIVE numbers(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM numbers)
+                    SELECT COUNT(*) FROM numbers;
+                """).fetchone()
+            except sqlite3.OperationalError as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=long_query)
+    thread.start()
+    started.wait()
+
+    # The query may not be running yet, so the interrupt is repeated until the thread ends
+    while thread.is_alive():
+        test_database.interrupt_reads({thread.ident})
+        thread.join(0.05)
+
+    assert errors and "interrupted" in str(errors[0])
+
+
+def test_requires_pooled_database(test_logger):
+    """
+    Check that a database without read-only connections is rejected.
+    """
+    db = Database(test_logger, db_folder="tmp")
+
+    try:
+        with pytest.raises(ValueError):
+            AsyncDatabase(db)
+    finally:
+        db.close_connection()
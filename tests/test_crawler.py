@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.crawler import Crawler, DomainLimiter
+from app.database import Database
+from app.extraction import Extraction
+from app.logger import Logger
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def offer_page(number):
+    """
+    Returns a saved justjoin.it page with the offer embedded in the Next.js state.
+    """
+    offer = {"slug": f"offer-{number}", "title": f"Developer {number}", "companyName": "Software House",
+             "city": "Warszawa", "markerIcon": "python", "experienceLevel": "mid", "workplaceType": "remote",
+             "employmentTypes": [{"type": "b2b", "from": 10000, "to": 15000, "currency": "pln"}],
+             "requiredSkills": [{"name": "Python", "level": 4}], "publishedAt": "2023-01-01T10:00:00.000Z"}
+    state = json.dumps(f'5:["$","div",null,{json.dumps({"offer": offer}, separators=(",", ":"))}]')
+
+    return (f"<html><head><title>Developer {number}</title>"
+            f"<script>self.__next_f.push([1,{state}])</script></head><body></body></html>").encode("utf-8")
+
+
+class PageServer(ThreadingHTTPServer):
+    """
+    Local HTTP server serving saved pages, it records the number of requests in progress.
+    """
+    daemon_threads = True
+
+    def __init__(self, pages, delay=0.05):
+        super().__init__(("127.0.0.1", 0), PageHandler)
+        self.pages = pages
+        self.delay = delay
+        self.in_progress = 0
+        self.max_in_progress = 0
+        self.connections = set()
+        self.started = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+
+        with server.lock:
+            server.in_progress += 1
+            server.max_in_progress = max(server.max_in_progress, server.in_progress)
+            server.connections.add(self.client_address)
+            server.started.append(time.monotonic())
+
+        time.sleep(server.delay)
+        page = server.pages.get(self.path)
+
+        with server.lock:
+            server.in_progress -= 1
+
+        self.send_response(200 if page else 404)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(page or b"")))
+        self.end_headers()
+        self.wfile.write(page or b"")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def page_server():
+    server = PageServer({f"/job-offer/offer-{number}": offer_page(number) for number in range(12)})
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def test_logger():
+    """
+    Fixture that creates a logger with a temporary log file.
+    """
+    return Logger(log_folder="tmp")
+
+
+def test_crawl_limits_concurrency(page_server, test_logger):
+    """
+    Check that pages are downloaded concurrently within the limit of the domain, over kept-alive connections,
+    and handled in the calling thread.
+    """
+    urls = [f"{page_server.url}/job-offer/offer-{number}" for number in range(12)] + [f"{page_server.url}/missing"]
+    handled = []
+    crawler = Crawler(test_logger, workers=8, per_domain=3)
+
+    try:
+        stats = crawler.crawl(urls, lambda url, response: handled.append((url, threading.get_ident(),
+                                                                           response.content)))
+    finally:
+        crawler.close()
+
+    assert stats['pages'] == 12 and stats['errors'] == 1 and stats['pages_per_second'] > 0
+    assert sorted(url for url, _, _ in handled) == sorted(urls[:-1])
+    assert {thread_id for _, thread_id, _ in handled} == {threading.get_ident()}
+    assert all(content == offer_page(int(url.rsplit("-", 1)[1])) for url, _, content in handled)
+    # Limited by the domain, not by the 8 workers, and the connections of the pool are reused
+    assert 1 < page_server.max_in_progress <= 3
+    assert len(page_server.connections) <= 3
+
+
+def test_domain_rate_limit(page_server, test_logger):
+    """
+    Check that requests to one domain start at most 'rate' per second.
+    """
+    crawler = Crawler(test_logger, workers=4, per_domain=4, rate=20)
+    page_server.delay = 0
+
+    try:
+        crawler.crawl([f"{page_server.url}/job-offer/offer-{number}" for number in range(6)], lambda *args: None)
+    finally:
+        crawler.close()
+
+    intervals = [second - first for first, second in zip(page_server.started, page_server.started[1:])]
+    assert page_server.started[-1] - page_server.started[0] >= 5 / 20 - 0.01
+    # Requests are timed by the server, so an interval may be shorter than 1 / rate by the scheduling jitter
+    assert min(intervals) >= 0.5 / 20
+
+
+def test_domain_limiter_concurrency():
+    """
+    Check that a limiter lets only max_concurrent threads in at a time.
+    """
+    limiter = DomainLimiter(2)
+    inside, peaks = [], []
+    lock = threading.Lock()
+
+    def enter():
+        with limiter:
+            with lock:
+                inside.append(1)
+                peaks.append(len(inside))
+
+            time.sleep(0.02)
+
+            with lock:
+                inside.pop()
+
+    threads = [threading.Thread(target=enter) for _ in range(6)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert max(peaks) == 2
+
+
+def test_crawl_into_database(page_server, test_logger, tmp_path):
+    """
+    Check that crawled pages are extracted into the database by Extraction.page_extraction().
+    """
+    with open(os.path.join(project_root, 'app', 'sites_structure.json'), encoding="utf-8") as file:
+        sites_structure = json.load(file)
+
+    db = Database(test_logger, db_folder="tmp")
+    ex = Extraction(test_logger, db, sites_structure, str(tmp_path / "downloaded_sites"))
+    crawler = Crawler(test_logger, workers=4, per_domain=4, headers=ex.headers)
+
+    try:
+        crawler.crawl([f"{page_server.url}/job-offer/offer-{number}" for number in range(12)],
+                      lambda url, response: ex.page_extraction(url, "justjoin.it", response))
+        ex.writer.flush()
+
+        rows = db.execute_query("SELECT title, link, source FROM job_offers ORDER BY link;")
+        assert len(rows) == 12
+        assert all(link.startswith(page_server.url) and source == "url" for _, link, source in rows)
+    finally:
+        crawler.close()
+        db.execute_query("DELETE FROM job_offers;")
+        db.close_connection()
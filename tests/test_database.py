@@ -1,8 +1,13 @@
+import json
 import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
 
+import pandas as pd
 import pytest
 
-from app.database import Database
+from app.database import Database, OfferFilter, normalize_date
 from app.logger import Logger
 
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -91,7 +96,6 @@ def test_insert_duplicate_offer(test_database, caplog):
     assert "Duplicate entry or integrity error" in caplog.text or "Database error" in caplog.text
 
 
-'''
 def test_remove_older_duplicates(test_database):
     """
     Przykładowy test dla metody remove_older_duplicates,
@@ -101,8 +105,9 @@ def test_remove_older_duplicates(test_database):
     sample_offer = {
         "title": "Programista C++",
         "company": "Software Interactive Sp. z o.o.",
-        "location": "warszawa",
-        "link": "https://justjoin.it/job-offer/unique-link",
+        # Bez lokalizacji i linku, inaczej unikalne indeksy nie pozwalają na duplikaty
+        "location": None,
+        "link": None,
         "date_add": "2023-03-01 12:00:00",
         "category": "c++",
         "experience": "mid",
@@ -116,9 +121,7 @@ def test_remove_older_duplicates(test_database):
     sample_offer2 = dict(sample_offer, date_add="2023-03-05 09:00:00")
     sample_offer3 = dict(sample_offer, date_add="2023-02-25 10:00:00")
 
-    test_database.insert_job_offer(sample_offer)
-    test_database.insert_job_offer(sample_offer2)
-    test_database.insert_job_offer(sample_offer3)
+    test_database.insert_job_offers_batch([sample_offer, sample_offer2, sample_offer3])
 
     df_before = test_database.fetch_all_offers()
     assert len(df_before) == 3, "Powinny być 3 wiersze (duplikaty)."
@@ -126,11 +129,554 @@ def test_remove_older_duplicates(test_database):
     # Usuwamy starsze duplikaty
     # (metoda remove_older_duplicates to Twój pomysł,
     #  który wybiera MAX(date_add) w każdej grupie i usuwa resztę)
-    test_database.remove_older_duplicates()
+    assert test_database.remove_older_duplicates() == 2
 
     df_after = test_database.fetch_all_offers()
     assert len(df_after) == 1, "Powinien zostać tylko 1 najnowszy wpis."
 
     row = df_after.iloc[0]
     assert row["date_add"] == "2023-03-05 09:00:00", "Najświeższa data to 2023-03-05."
-'''
+
+
+def test_bulk_load_matches_batch_insert(test_database):
+    """
+    Check that the bulk-load mode gives the same table as the batch insert
+    and that deferred indexes and the journal mode are restored.
+    """
+    offers = [
+        dict(sample_offer, title=f"Developer {number % 3}", link=f"http://justjoin.it/developer-{number % 3}",
+             date_add=f"2023-01-0{number + 1} 10:00:00",
+             salary=f'{{"b2b": {{"from": {number}, "to": 15000, "currency": "pln"}}}}')
+        for number in range(6)
+    ]
+    offers.append(dict(offers[0], date_add="2022-01-01 10:00:00", salary="older"))
+
+    test_database.insert_job_offers_batch(offers)
+    expected = test_database.fetch_all_offers().drop(columns="id")
+    expected_aggregates = [test_database.get_avg_salary_by_experience_and_currency(),
+                           test_database.get_technology_with_levels_sorted(), test_database.get_offers_by_year_month()]
+    test_database.execute_query("DELETE FROM job_offers;")
+    # Other tests leave the database in the WAL mode, which is persistent
+    test_database.cursor.execute("PRAGMA journal_mode = DELETE;")
+
+    test_database.begin_bulk_load(apply_pragmas=True, defer_indexes=True)
+    assert test_database.cursor.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+    assert "idx_offers_category" not in [row[1] for row in test_database.cursor.execute("PRAGMA index_list(job_offers)")]
+
+    test_database.bulk_load_job_offers(offers[:4])
+    test_database.bulk_load_job_offers(offers[4:])
+    # The triggers do not maintain the derived tables during the load
+    assert test_database.execute_query("SELECT COUNT(*) FROM offer_salaries;") == [(0,)]
+    test_database.end_bulk_load()
+
+    indexes = [row[1] for row in test_database.cursor.execute("PRAGMA index_list(job_offers)")]
+    for index in ["idx_offers_category", "idx_offers_location", "idx_offers_experience", "idx_offers_date_add"]:
+        assert index in indexes, f"Index {index} was not created again..."
+
+    assert test_database.cursor.execute("PRAGMA journal_mode;").fetchone()[0] == "delete"
+
+    assert test_database.fetch_all_offers().drop(columns="id").equals(expected)
+    assert len(expected) == 3
+
+    # The derived tables are rebuilt at the end, the triggers work again afterwards
+    aggregates = [test_database.get_avg_salary_by_experience_and_currency(),
+                  test_database.get_technology_with_levels_sorted(), test_database.get_offers_by_year_month()]
+    for df, expected_df in zip(aggregates, expected_aggregates):
+        pd.testing.assert_frame_equal(df, expected_df)
+
+    test_database.insert_job_offers_batch([dict(sample_offer, title="Go Developer", link="http://justjoin.it/go")])
+    assert test_database.get_offers_by_year_month()["total_offers"].sum() == 4
+
+
+def test_offer_skills_in_sync(test_database):
+    """
+    Check that 'offer_skills' follows inserts, updates and deletes of offers
+    and that technology statistics match the tech_stack JSON.
+    """
+    def skills():
+        return sorted(test_database.execute_query("""
+            SELECT o.title, t.name, s.level
+            FROM offer_skills s
+                     JOIN job_offers o ON o.id = s.offer_id
+                     JOIN technologies t ON t.id = s.tech_id;
+        """))
+
+    test_database.insert_job_offer(sample_offer)
+    test_database.insert_job_offers_batch([dict(sample_offer, title="Go Developer", link="http://justjoin.it/go-offer",
+                                                tech_stack='{"Go": 4}')])
+    assert skills() == [("Go Developer", "Go", 4), ("Python Developer", "Django", 3),
+                        ("Python Developer", "Python", 3)]
+
+    test_database.insert_job_offers_batch([dict(sample_offer, date_add="2023-02-01 10:00:00",
+                                                tech_stack='{"Python": 4, "Go": 2}')])
+    assert skills() == [("Go Developer", "Go", 4), ("Python Developer", "Go", 2),
+                        ("Python Developer", "Python", 4)]
+
+    df = test_database.get_technology_with_levels_sorted()
+    assert df.iloc[0]["technology"] == "Go" and df.iloc[0]["total_for_tech"] == 2
+    assert sorted(map(tuple, df[["technology", "skill_level", "total_offers"]].values.tolist())) == sorted(
+        test_database.execute_query("""
+            SELECT json_each.key, CAST(json_each.value AS INT), COUNT(*)
+            FROM job_offers
+                     CROSS JOIN JSON_EACH(job_offers.tech_stack)
+            GROUP BY json_each.key, json_each.value;
+        """))
+
+    test_database.execute_query("DELETE FROM job_offers WHERE title = 'Go Developer';")
+    assert skills() == [("Python Developer", "Go", 2), ("Python Developer", "Python", 4)]
+
+
+def test_avg_salary_matches_json_salaries(test_database):
+    """
+    Check that salary statistics from 'offer_salaries' are the same as those computed from the salary JSON.
+    """
+    salaries = [
+        '{"b2b": {"from": 10000, "to": 15001, "currency": "pln"}, "permanent": {"from": 9000, "to": 12000, '
+        '"currency": "pln"}}',
+        '{"b2b": {"from": "12000", "to": "18000", "currency": "PLN"}}',
+        '{"b2b": {"from": 3000, "to": 4000.5, "currency": "eur"}, "mandate_contract": {"from": 1, "to": 2, '
+        '"currency": "pln"}}',
+        '{"permanent": {"from": null, "to": null, "currency": null}}',
+        None
+    ]
+    test_database.insert_job_offers_batch([
+        dict(sample_offer, title=f"Developer {number}", link=f"http://justjoin.it/developer-{number}",
+             experience=["junior", "mid"][number % 2], salary=salary)
+        for number, salary in enumerate(salaries)
+    ])
+
+    df = test_database.get_avg_salary_by_experience_and_currency()
+    expected = pd.read_sql_query("""
+        WITH combined AS (
+          SELECT experience,
+                 UPPER(JSON_EXTRACT(salary, '$.b2b.currency')) AS currency,
+                 ROUND((JSON_EXTRACT(salary, '$.b2b.from') + JSON_EXTRACT(salary, '$.b2b.to')) / 2) AS b2b_value,
+                 NULL AS permanent_value
+          FROM job_offers
+          WHERE JSON_EXTRACT(salary, '$.b2b.from') IS NOT NULL
+            AND JSON_EXTRACT(salary, '$.b2b.to') IS NOT NULL
+            AND JSON_EXTRACT(salary, '$.b2b.currency') IS NOT NULL
+          UNION ALL
+          SELECT experience,
+                 UPPER(JSON_EXTRACT(salary, '$.permanent.currency')) AS currency,
+                 NULL AS b2b_value,
+                 ROUND((JSON_EXTRACT(salary, '$.permanent.from') + JSON_EXTRACT(salary, '$.permanent.to')) / 2)
+          FROM job_offers
+          WHERE JSON_EXTRACT(salary, '$.permanent.from') IS NOT NULL
+            AND JSON_EXTRACT(salary, '$.permanent.to') IS NOT NULL
+            AND JSON_EXTRACT(salary, '$.permanent.currency') IS NOT NULL
+        )
+        SELECT experience, currency, ROUND(AVG(b2b_value)) AS avg_b2b_salary,
+               ROUND(AVG(permanent_value)) AS avg_permanent_salary
+        FROM combined
+        GROUP BY experience, currency;
+    """, test_database.connection)
+
+    assert len(df) == 3
+    assert df.equals(expected)
+
+
+def test_filters_pushed_down(test_database):
+    """
+    Check that filters and limits are applied by the get_* methods without copying rows.
+    """
+    test_database.insert_job_offers_batch([
+        dict(sample_offer, title=f"Developer {number}", link=f"http://justjoin.it/developer-{number}",
+             location=["warsaw", "krakow", "gdansk"][number % 3],
+             experience=["junior", "mid"][number % 2], date_add=f"2023-0{number % 3 + 1}-15 10:00:00")
+        for number in range(9)
+    ])
+    test_database.execute_query("UPDATE job_offers SET position = 'backend' WHERE location = 'gdansk';")
+
+    df = test_database.get_offers_by_location(limit=2)
+    assert len(df) == 2 and df["total_offers"].tolist() == [3, 3]
+
+    # Positions are filtered by the 'position' column
+    filters = OfferFilter(positions=["backend"])
+    assert test_database.get_offers_by_location(filters).values.tolist() == [["gdansk", 3]]
+
+    filters = OfferFilter(locations=["warsaw", "krakow"]) & OfferFilter(experiences=["mid"], date_to="2023-01-31")
+    assert test_database.fetch_offers(filters)["title"].tolist() == ["Developer 3"]
+
+    assert (OfferFilter(locations=["warsaw"]) & OfferFilter(locations=["krakow"])).where_clause()[0].startswith(
+        "WHERE 0")
+
+    # Filters set once are used by every method, like fill_temp_table_with_filters() before
+    test_database.fill_temp_table_with_filters(date_from="2023-02-01", locations=["krakow", "gdansk"])
+    assert test_database.get_offers_by_year_month().values.tolist() == [["2023-02", 3], ["2023-03", 3]]
+    assert test_database.execute_query(
+        "SELECT name FROM sqlite_master WHERE name = 'job_offers_temp';") == []
+
+
+def test_normalize_date():
+    """
+    Check conversion of dates into the canonical, sortable form.
+    """
+    assert normalize_date("2023-01-01 10:00:00.123") == "2023-01-01 10:00:00.123"
+    assert normalize_date("2023-01-01T10:00:00Z") == "2023-01-01 10:00:00"
+    assert normalize_date("2023-01-01t10:00:00.5z") == "2023-01-01 10:00:00.500000"
+    assert normalize_date("2023-01-01 12:00:00+02:00") == "2023-01-01 10:00:00"
+    assert normalize_date("2023-01-01") == "2023-01-01 00:00:00"
+    assert normalize_date("yesterday") is None
+    assert normalize_date("") is None
+    assert normalize_date(date(2023, 1, 1)) == "2023-01-01 00:00:00"
+    assert normalize_date(datetime(2023, 1, 1, 12, tzinfo=timezone(timedelta(hours=2)))) == "2023-01-01 10:00:00"
+
+
+def test_date_range_uses_index(test_database):
+    """
+    Check that dates are normalized on insert and that date filters are index range scans.
+    """
+    test_database.insert_job_offers_batch([
+        dict(sample_offer, title="Old", link="http://justjoin.it/old-offer", date_add="2023-01-31T23:59:59Z"),
+        dict(sample_offer, title="New", link="http://justjoin.it/new-offer", date_add="2023-02-01T00:00:00Z"),
+    ])
+    assert sorted(test_database.execute_query("SELECT date_add FROM job_offers;")) == [
+        ("2023-01-31 23:59:59",), ("2023-02-01 00:00:00",)]
+
+    assert test_database.fetch_offers(OfferFilter(date_to="2023-01-31"))["title"].tolist() == ["Old"]
+    assert test_database.fetch_offers(OfferFilter(date_from="2023-02-01"))["title"].tolist() == ["New"]
+    assert test_database.fetch_offers(OfferFilter(date_from="not a date")).empty
+    assert test_database.fetch_offers(OfferFilter(date_from=date(2023, 2, 1)))["title"].tolist() == ["New"]
+    assert (OfferFilter(date_from="2023-01-15") & OfferFilter(date_from=date(2023, 2, 1))).date_from == date(2023, 2, 1)
+
+    where_clause, params = OfferFilter(date_from="2023-01-01", date_to="2023-01-31").where_clause()
+    plan = test_database.cursor.execute(
+        f"EXPLAIN QUERY PLAN SELECT COUNT(*) FROM job_offers {where_clause};", params).fetchall()
+    assert "idx_offers_date_add" in str(plan)
+
+
+def test_rollups_match_raw_queries(test_database):
+    """
+    Check that the get_* methods give the same answers from the rollup tables as from 'job_offers',
+    after inserts, updates and deletes, and that filters the rollups cannot answer fall back to 'job_offers'.
+    """
+    test_database.insert_job_offers_batch([
+        dict(sample_offer, title=f"Developer {number}", link=f"http://justjoin.it/developer-{number}",
+             location=["warsaw", "krakow", None][number % 3],
+             experience=["junior", "mid", "senior"][number % 4 % 3], operating_mode=["remote", "office"][number % 2],
+             date_add=f"2023-0{number % 3 + 1}-{number + 1:02d} 10:00:00",
+             salary=f'{{"b2b": {{"from": {1000 * number}, "to": 15001, "currency": "pln"}}, '
+                    f'"permanent": {{"from": 9000, "to": 12000, "currency": "{["pln", "eur"][number % 2]}"}}}}',
+             tech_stack=f'{{"Python": {number % 5}, "SQL": null, "Go": {number % 2 + 1}}}')
+        for number in range(12)
+    ])
+    # An update moves offers between groups, then a delete removes some of them
+    test_database.insert_job_offers_batch([dict(sample_offer, title="Developer 1", location="krakow",
+                                                link="http://justjoin.it/developer-1",
+                                                date_add="2023-03-20 10:00:00", tech_stack='{"Rust": 5}')])
+    test_database.execute_query("DELETE FROM job_offers WHERE title IN ('Developer 2', 'Developer 7');")
+
+    methods = [test_database.get_offers_by_location, test_database.get_offers_by_experience,
+               test_database.get_offers_by_year_month, test_database.get_offers_by_operating_mode,
+               test_database.get_avg_salary_by_experience_and_currency,
+               test_database.get_technology_with_levels_sorted]
+    filters = [OfferFilter(), OfferFilter(date_from="2023-02-01", date_to="2023-03-31", locations=["krakow"]),
+               OfferFilter(experiences=["mid", "senior"]), OfferFilter(date_from="2023-02-15")]
+
+    for offer_filter in filters:
+        for method in methods:
+            test_database.use_rollups = True
+            from_rollups = method(offer_filter)
+            test_database.use_rollups = False
+            from_offers = method(offer_filter)
+
+            assert not from_offers.empty
+            pd.testing.assert_frame_equal(
+                from_rollups.sort_values(list(from_rollups.columns)).reset_index(drop=True),
+                from_offers.sort_values(list(from_offers.columns)).reset_index(drop=True))
+
+    assert OfferFilter(date_from="2023-02-15").rollup_where_clause() is None
+    assert OfferFilter(positions=["backend"]).rollup_where_clause() is None
+
+    # The rebuilt rollups are the same as the ones maintained by the triggers, also after an update
+    # of a column they do not read
+    test_database.execute_query("UPDATE job_offers SET title = title || ' (updated)' WHERE title = 'Developer 3';")
+    queries = ["""
+        SELECT g.group_key, r.total_offers FROM offers_rollup r JOIN offer_groups g ON g.id = r.group_id;
+    """, """
+        SELECT g.group_key, r.contract_type, r.currency, r.total_offers, r.salary_sum
+        FROM salaries_rollup r JOIN offer_groups g ON g.id = r.group_id;
+    """, """
+        SELECT g.group_key, r.tech_id, r.level, r.total_offers
+        FROM skills_rollup r JOIN offer_groups g ON g.id = r.group_id;
+    """]
+    rollups = [test_database.execute_query(query) for query in queries]
+    test_database.rebuild_rollups()
+    assert [sorted(test_database.execute_query(query)) for query in queries] == [sorted(rows) for rows in rollups]
+
+
+def test_technology_cooccurrence(test_database, monkeypatch):
+    """
+    Check the co-occurrence matrix and get_technologies_with() against counts over the tech stacks,
+    with the incidence matrix split into many chunks of offers.
+    """
+    stacks = [["Python", "SQL", "Docker"], ["Python", "SQL"], ["Java", "SQL", "Docker"], ["Python", "Go"],
+              ["Java", "Spring"], ["Python", "Docker", "Go"], ["Python"]]
+    test_database.insert_job_offers_batch([
+        dict(sample_offer, title=f"Developer {number}", link=f"http://justjoin.it/developer-{number}",
+             location=["warsaw", "krakow"][number % 2], category="golang" if number == 3 else "python",
+             tech_stack=json.dumps(dict.fromkeys(stack, 3)))
+        for number, stack in enumerate(stacks)
+    ])
+    monkeypatch.setattr("app.database.COOCCURRENCE_CHUNK_SIZE", 2)
+
+    # 7 offers and (7 - 1) % 2 == 0: the last chunk holds one offer, 4 offers in Warsaw, a single offer in Go
+    for offer_filter, matches in [(OfferFilter(), lambda number: True),
+                                  (OfferFilter(locations=["warsaw"]), lambda number: number % 2 == 0),
+                                  (OfferFilter(categories=["golang"]), lambda number: number == 3)]:
+        selected = [set(stack) for number, stack in enumerate(stacks) if matches(number)]
+        matrix = test_database.get_technology_cooccurrence(offer_filter, top=4)
+
+        assert len(matrix) == min(4, len(set().union(*selected))) and list(matrix.index) == list(matrix.columns)
+        # The most frequent technologies, most frequent first
+        totals = pd.Series([tech for stack in selected for tech in stack]).value_counts()
+        assert sorted(totals[matrix.index].tolist(), reverse=True) == totals.head(4).tolist()
+
+        for first in matrix.index:
+            for second in matrix.columns:
+                assert matrix.loc[first, second] == sum(first in stack and second in stack for stack in selected)
+
+        with_python = test_database.get_technologies_with("Python", offer_filter)
+        assert dict(zip(with_python["technology"], with_python["total_offers"])) == dict(
+            pd.Series([tech for stack in selected if "Python" in stack for tech in stack
+                       if tech != "Python"], dtype=object).value_counts())
+
+    # Cached per filters, a returned matrix can be changed safely
+    matrix = test_database.get_technology_cooccurrence()
+    matrix.iloc[:, :] = 0
+    assert test_database.get_technology_cooccurrence().loc["Python", "Python"] == 5
+    assert test_database.get_technology_cooccurrence(OfferFilter(categories=["rust"])).empty
+
+
+def test_query_cache(test_database, test_logger):
+    """
+    Check that results are cached per filter, evicted by size and invalidated by writes of any connection.
+    """
+    test_database.insert_job_offers_batch([dict(sample_offer, title=f"Developer {number}",
+                                                 link=f"http://justjoin.it/developer-{number}",
+                                                 location=["warsaw", "krakow"][number % 2]) for number in range(4)])
+    test_database.clear_cache()
+    test_database.cache_size = 2
+
+    df = test_database.get_offers_by_location(OfferFilter(locations=["warsaw", "krakow"]))
+    df["total_offers"] = 0
+    # The same filter with values in another order is a hit, changing the returned DataFrame changed nothing
+    assert test_database.get_offers_by_location(
+        OfferFilter(locations=["krakow", "warsaw"]))["total_offers"].tolist() == [2, 2]
+    assert test_database.cache_info() == {'hits': 1, 'misses': 1, 'size': 1, 'max_size': 2}
+
+    test_database.get_offers_by_experience()
+    test_database.get_offers_by_operating_mode()
+    assert test_database.cache_info()["size"] == 2
+
+    # Writes of this connection
+    test_database.insert_job_offer(dict(sample_offer, title="Go Developer", link="http://justjoin.it/go-offer"))
+    assert test_database.get_offers_by_experience()["total_offers"].tolist() == [5]
+    assert test_database.cache_info()["misses"] == 4
+
+    # Commits of another connection
+    other = Database(test_logger, db_folder="tmp")
+    other.execute_query("DELETE FROM job_offers WHERE title = 'Go Developer';")
+    other.close_connection()
+    assert test_database.get_offers_by_experience()["total_offers"].tolist() == [4]
+    assert test_database.cache_info()["misses"] == 5
+
+    # A result read before a commit is not cached once the cache has moved to the new data
+    _, version = test_database._cache_get(("stale",))
+    test_database.insert_job_offer(dict(sample_offer, title="Go Developer", link="http://justjoin.it/go-offer"))
+    test_database.get_offers_by_experience()
+    test_database._cache_put(("stale",), pd.DataFrame(), version)
+    assert test_database._cache_get(("stale",))[0] is None
+
+
+def test_get_facets(test_database):
+    """
+    Check that facets read from the rollups are the distinct values of the columns and follow changes of data.
+    """
+    test_database.insert_job_offers_batch([
+        dict(sample_offer, title=f"Developer {number}", link=f"http://justjoin.it/developer-{number}",
+             location=["warsaw", "krakow", None][number % 3],
+             category=["python", "java"][number % 2], experience=["junior", "mid", "senior"][number % 3])
+        for number in range(6)
+    ])
+    test_database.execute_query("UPDATE job_offers SET position = 'backend' WHERE category = 'java';")
+
+    facets = test_database.get_facets()
+    for name, column in OfferFilter.columns.items():
+        expected = [row[0] for row in test_database.execute_query(
+            f"SELECT DISTINCT {column} FROM job_offers WHERE {column} IS NOT NULL ORDER BY {column};")]
+        assert facets[name] == expected, f"Facet {name} is different from the column..."
+
+    assert test_database.get_facets(with_counts=True)["locations"] == {"krakow": 2, "warsaw": 2}
+    assert test_database.get_unique_positions() == ["backend"]
+
+    test_database.execute_query("DELETE FROM job_offers WHERE location = 'krakow';")
+    assert test_database.get_unique_locations() == ["warsaw"]
+    assert test_database.get_unique_experiences() == ["junior", "senior"]
+
+    plan = test_database.cursor.execute(
+        "EXPLAIN QUERY PLAN SELECT position, COUNT(*) FROM job_offers WHERE position IS NOT NULL "
+        "GROUP BY position;").fetchall()
+    assert "idx_offers_position" in str(plan)
+
+
+def test_pooled_readers_during_load(test_database, test_logger):
+    """
+    Check that in pooled mode the get_* methods run from a thread pool while another thread loads offers,
+    and that the read connections are read-only.
+    """
+    db = Database(test_logger, db_folder="tmp", read_connections=3)
+
+    def load():
+        for chunk in range(10):
+            db.insert_job_offers_batch([dict(sample_offer, title=f"Developer {chunk}-{number}",
+                                             link=f"http://justjoin.it/developer-{chunk}-{number}",
+                                             location=["warsaw", "krakow"][number % 2]) for number in range(50)])
+
+    def read(_):
+        return db.get_offers_by_location(OfferFilter(categories=["python"]))["total_offers"].sum()
+
+    try:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            loader = executor.submit(load)
+            totals = list(executor.map(read, range(30)))
+            loader.result()
+
+        assert all(0 <= total <= 500 for total in totals)
+        assert read(None) == 500
+        assert db.cursor.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+
+        with db._read_connection() as connection:
+            with pytest.raises(sqlite3.OperationalError):
+                connection.execute("DELETE FROM job_offers;")
+    finally:
+        db.close_connection()
+
+
+def test_pooled_mode_special_path(test_logger, tmp_path):
+    """
+    Check that the read-only connections open a database whose path is not a valid URI as it is.
+    """
+    folder = tmp_path / "job offers #1?%20"
+    folder.mkdir()
+    db = Database(test_logger, db_folder=str(folder), read_connections=1)
+
+    try:
+        db.insert_job_offers_batch([sample_offer])
+
+        with db._read_connection() as connection:
+            assert connection.execute("SELECT COUNT(*) FROM job_offers;").fetchone()[0] == 1
+    finally:
+        db.close_connection()
+
+
+def test_remove_older_duplicates_incremental(test_database):
+    """
+    Check that only groups changed since the last run are deduplicated, that offers without
+    a link are grouped instead of being removed, and that a full run checks all groups.
+    """
+    offers = [dict(sample_offer, location=None, link=link, date_add=f"2023-01-0{day} 10:00:00")
+              for link in ("http://justjoin.it/a", None) for day in (1, 2, 3)]
+    offers.append(dict(sample_offer, title="Unique", location=None, link=None))
+    test_database.insert_job_offers_batch(offers)
+
+    # Offers with the same link are already merged when they are inserted
+    assert test_database.remove_older_duplicates() == 2
+    assert sorted(test_database.execute_query("SELECT title, link, date_add FROM job_offers;"), key=str) == [
+        ("Python Developer", "http://justjoin.it/a", "2023-01-03 10:00:00"),
+        ("Python Developer", None, "2023-01-03 10:00:00"),
+        ("Unique", None, "2023-01-01 10:00:00")]
+    assert test_database.execute_query("SELECT COUNT(*) FROM dedup_queue;") == [(0,)]
+
+    # Duplicates from before the queue existed (simulated by emptying it) are found only by a full run
+    test_database.execute_query("INSERT INTO job_offers (title, company, location, category, date_add, experience, "
+                                "employment, operating_mode, link, source) SELECT title, company, location, category, "
+                                "'2022-01-01 10:00:00', experience, employment, operating_mode, link, source "
+                                "FROM job_offers WHERE link IS NULL;")
+    test_database.execute_query("DELETE FROM dedup_queue;")
+    assert test_database.remove_older_duplicates() == 0
+    assert test_database.remove_older_duplicates(full=True) == 2
+    assert len(test_database.fetch_all_offers()) == 3
+
+
+def test_buffered_writer(test_database, test_logger):
+    """
+    Check that the buffered writer flushes every max_rows offers, when the oldest offer is too old
+    and when the database is closed.
+    """
+    writer = test_database.buffered_writer(max_rows=3, max_seconds=60)
+
+    for number in range(4):
+        writer.add(dict(sample_offer, title=f"Developer {number}", link=f"http://justjoin.it/developer-{number}"))
+
+    assert len(writer) == 1
+    assert len(test_database.fetch_all_offers()) == 3
+
+    writer.max_seconds = 0
+    writer.add(dict(sample_offer, title="Developer 4", link="http://justjoin.it/developer-4"))
+    assert len(writer) == 0 and len(test_database.fetch_all_offers()) == 5
+
+    db = Database(test_logger, db_folder="tmp")
+    db.buffered_writer().add(dict(sample_offer, title="Developer 5", link="http://justjoin.it/developer-5"))
+    db.close_connection()
+    assert len(test_database.fetch_all_offers()) == 6
+
+
+def test_buffered_writer_invalid_offer(test_database, caplog):
+    """
+    Check that an offer breaking a constraint is the only one lost when the buffer is written.
+    """
+    with test_database.buffered_writer(max_rows=10) as writer:
+        for number in range(6):
+            writer.add(dict(sample_offer, title=f"Developer {number}", link=f"http://justjoin.it/developer-{number}",
+                            experience=None if number == 3 else "mid"))
+
+    assert sorted(test_database.fetch_all_offers()["title"]) == [f"Developer {number}" for number in (0, 1, 2, 4, 5)]
+    assert "\"Software House, Developer 3\" was not inserted" in caplog.text
+
+
+def test_upsert_by_link(test_database, caplog):
+    """
+    Check that an offer with a known link updates the existing one if it is newer,
+    and that an update by title never takes the link of another offer.
+    """
+    test_database.insert_job_offer(sample_offer)
+    test_database.insert_job_offer(dict(sample_offer, title="Python Developer (Django)", location=None,
+                                        date_add="2023-02-01 10:00:00"))
+    assert test_database.execute_query("SELECT title, location, date_add FROM job_offers;") == [
+        ("Python Developer (Django)", None, "2023-02-01 10:00:00")]
+
+    test_database.insert_job_offer(dict(sample_offer, title="Older", date_add="2022-01-01 10:00:00"))
+    assert "Duplicate entry or integrity error" in caplog.text
+    assert len(test_database.fetch_all_offers()) == 1
+
+    test_database.insert_job_offers_batch([
+        dict(sample_offer, title="Go Developer", link="http://justjoin.it/go-offer"),
+        dict(sample_offer, title="Go Developer", link="http://justjoin.it/python-offer", date_add="2023-03-01")
+    ])
+    assert sorted(test_database.execute_query("SELECT title, link FROM job_offers;")) == [
+        ("Go Developer", "http://justjoin.it/go-offer"), ("Python Developer (Django)", "http://justjoin.it/python-offer")]
+
+
+def test_duplicated_links_without_link_index(test_database, test_logger, caplog):
+    """
+    Check that a database whose offers share links is opened without the unique index on links.
+    """
+    test_database.execute_query("DROP INDEX job_offers_uindex_link;")
+    test_database.link_unique = False
+    test_database.insert_job_offers_batch([sample_offer, dict(sample_offer, title="Go Developer")])
+
+    db = Database(test_logger, db_folder="tmp")
+    assert not db.link_unique
+    assert "The unique index on links was not created" in caplog.text
+
+    db.insert_job_offer(dict(sample_offer, date_add="2023-02-01 10:00:00"))
+    assert len(db.fetch_all_offers()) == 2
+
+    db.execute_query("DELETE FROM job_offers;")
+    db.close_connection()
+
+    db = Database(test_logger, db_folder="tmp")
+    assert db.link_unique
+    db.close_connection()
@@ -0,0 +1,216 @@
+import json
+import os
+
+import pytest
+
+from app.database import Database
+from app.logger import Logger
+from scripts.etl import (extract, extract_chunks, find_offer_files, iter_offers, select_changed_files, transform,
+                         transform_file, transform_files_in_parallel, transform_rows)
+
+fields = ["title", "company", "location", "category", "date_add", "salary", "experience", "employment",
+          "operating_mode", "tech_stack", "link", "source"]
+sample_offers = [
+    {
+        "title": "Python Developer",
+        "company_name": "Software House",
+        "city": "Warszawa",
+        "marker_icon": "python",
+        "published_at": "2023-01-01T10:00:00.000Z",
+        "employment_types": [{"type": "b2b", "salary": {"from": 10000, "to": 15000, "currency": "pln"}}],
+        "experience_level": "mid",
+        "workplace_type": "remote",
+        "skills": [{"name": "Python", "level": 4}, {"name": "Django", "level": 3}],
+        "id": f"software-house-python-developer-{number}"
+    } for number in range(25)
+]
+
+
+@pytest.fixture
+def test_logger():
+    """
+    Fixture that creates a logger with a temporary log file.
+    """
+    return Logger(log_folder="tmp")
+
+
+@pytest.fixture
+def test_database(test_logger):
+    """
+    Fixture to create a Database object with temporary file and database structure.
+    """
+    db = Database(test_logger, db_folder="tmp")
+
+    yield db
+
+    db.execute_query("DELETE FROM etl_manifest;")
+    db.close_connection()
+
+
+@pytest.fixture
+def offers_file(tmp_path):
+    """
+    Creates a JSON file with sample offers in the Kaggle format.
+    """
+    file = tmp_path / "offers.json"
+    file.write_text(json.dumps(sample_offers, indent=2), encoding="utf-8")
+
+    return str(file)
+
+
+def test_iter_offers_matches_json_load(test_logger, offers_file):
+    """
+    Check that streaming returns the same offers as loading the whole file,
+    also when offers are split between read blocks.
+    """
+    assert list(iter_offers(offers_file, test_logger, block_size=7)) == extract(offers_file, test_logger)
+
+
+def test_extract_chunks(test_logger, offers_file):
+    """
+    Check that offers are returned in chunks of the requested size.
+    """
+    chunks = list(extract_chunks(offers_file, test_logger, chunk_size=10))
+
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert [offer for chunk in chunks for offer in chunk] == sample_offers
+
+
+def test_iter_offers_broken_file(test_logger, tmp_path, caplog):
+    """
+    Check that a file with an unclosed array is logged as an error.
+    """
+    file = tmp_path / "broken.json"
+    file.write_text(json.dumps(sample_offers[:2])[:-1], encoding="utf-8")
+
+    assert len(list(iter_offers(str(file), test_logger))) == 2
+    assert "An error occurred while streaming data" in caplog.text
+
+
+def test_transform_file_reports_incomplete_file(test_logger, tmp_path, offers_file):
+    """
+    Check that transform_file() returns True only for a file read to its end and transformed completely,
+    in the serial and in the parallel mode.
+    """
+    broken = tmp_path / "broken.json"
+    broken.write_text(json.dumps(sample_offers)[:-1], encoding="utf-8")
+    invalid = tmp_path / "invalid.json"
+    invalid.write_text(json.dumps(sample_offers[:2] + [{"company_name": "No title"}]), encoding="utf-8")
+
+    def drain(chunks):
+        rows = 0
+
+        while True:
+            try:
+                rows += len(next(chunks))
+            except StopIteration as stop:
+                return rows, stop.value
+
+    files = [offers_file, str(broken), str(invalid)]
+    expected = [(25, True), (25, False), (0, False)]
+
+    assert [drain(transform_file(file, test_logger, fields, chunk_size=10)) for file in files] == expected
+    assert [drain(chunks) for _, chunks in transform_files_in_parallel(files, fields, chunk_size=10,
+                                                                       workers=2)] == expected
+
+
+def test_transform_rows_matches_transform(test_logger):
+    """
+    Check that the columnar transformation returns the same values as transform(), row for row.
+    """
+    offers = sample_offers[:3] + [
+        {
+            "title": "Java Developer",
+            "company_name": "Corporation",
+            "city": "Kraków",
+            "marker_icon": "Java",
+            "published_at": "2022-05-10T08:15:30.123Z",
+            "employment_types": [{"type": "permanent", "salary": None}, {"type": "b2b"},
+                                 {"type": "mandate_contract", "salary": {"from": 8000, "currency": "eur"}}],
+            "experience_level": "senior",
+            "workplace_type": "office",
+            "skills": None,
+            "id": "corporation-java-developer"
+        },
+        {
+            "title": "Tester",
+            "company_name": "Startup",
+            "employment_types": None
+        }
+    ]
+
+    expected = [tuple(offer[field] for field in fields) for offer in transform(offers, test_logger)]
+
+    assert transform_rows(offers, test_logger, fields) == expected
+
+
+def test_transform_rows_invalid_offer(test_logger, caplog):
+    """
+    Check that a chunk with an invalid offer is rejected like in transform().
+    """
+    offers = sample_offers[:2] + [{"company_name": "No title"}]
+
+    assert transform_rows(offers, test_logger, fields) == transform(offers, test_logger) == []
+    assert "An error occurred while transforming data" in caplog.text
+
+
+def test_parallel_transform_matches_serial(test_logger, tmp_path):
+    """
+    Check that the process pool returns the same rows, in the same order, as the serial mode.
+    """
+    for month in range(1, 5):
+        folder = tmp_path / f"2023-{month:02d}"
+        folder.mkdir()
+        offers = [dict(offer, title=f"{offer['title']} {month}") for offer in sample_offers]
+        (folder / "offers.json").write_text(json.dumps(offers), encoding="utf-8")
+
+    offer_files = find_offer_files(str(tmp_path))
+    serial = [(file, [row for chunk in transform_file(file, test_logger, fields, chunk_size=10) for row in chunk])
+              for file in offer_files]
+    parallel = [(file, [row for chunk in chunks for row in chunk])
+                for file, chunks in transform_files_in_parallel(offer_files, fields, chunk_size=10, workers=2)]
+
+    assert len(offer_files) == 4
+    assert parallel == serial
+
+
+def test_parallel_transform_stopped_early(tmp_path):
+    """
+    Check that workers waiting to send their chunks are released when the consumer stops early.
+    """
+    for number in range(3):
+        (tmp_path / f"{number}.json").write_text(json.dumps(sample_offers), encoding="utf-8")
+
+    results = transform_files_in_parallel(find_offer_files(str(tmp_path)), fields, chunk_size=1, workers=2,
+                                          buffered_chunks=1)
+    file, chunks = next(results)
+
+    assert len(next(chunks)) == 1
+    results.close()
+
+
+def test_select_changed_files(test_logger, test_database, tmp_path):
+    """
+    Check that only new or modified files are selected after they were recorded in the manifest.
+    """
+    for month in range(1, 3):
+        (tmp_path / f"2023-{month:02d}.json").write_text(json.dumps(sample_offers), encoding="utf-8")
+
+    offer_files = find_offer_files(str(tmp_path))
+    changed_files = select_changed_files(offer_files, str(tmp_path), test_database, test_logger)
+    assert list(changed_files) == offer_files
+
+    for path, size, mtime, content_hash in changed_files.values():
+        test_database.update_manifest(path, size, mtime, content_hash, len(sample_offers))
+
+    assert select_changed_files(offer_files, str(tmp_path), test_database, test_logger) == {}
+
+    # Only the modification time has changed, so the content hash decides
+    os.utime(offer_files[0], (0, 0))
+    assert select_changed_files(offer_files, str(tmp_path), test_database, test_logger) == {}
+    assert test_database.get_manifest()["2023-01.json"]["mtime"] == 0
+
+    (tmp_path / "2023-02.json").write_text(json.dumps(sample_offers[:5]), encoding="utf-8")
+    assert list(select_changed_files(offer_files, str(tmp_path), test_database, test_logger)) == [offer_files[1]]
+
+    assert list(select_changed_files(offer_files, str(tmp_path), test_database, test_logger, full=True)) == offer_files
@@ -0,0 +1,357 @@
+import json
+import os
+
+import pytest
+from bs4 import BeautifulSoup, SoupStrainer
+
+import app.extraction
+from app.database import Database
+from app.extraction import (AnyStrainer, Document, Extraction, ExtractionPlan, find_embedded_object,
+                            find_original_url, justjoin_embedded_offer)
+from app.logger import Logger
+from scripts.etl import transform
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+with open(os.path.join(project_root, 'app', 'sites_structure.json'), encoding="utf-8") as structure_file:
+    sites_structure = json.load(structure_file)
+
+offer_page = """<!DOCTYPE html>
+<html>
+<head>
+<title>Python Developer - Software House</title>
+<link rel="canonical" href="https://justjoin.it/job-offer/software-house-python-developer-{number}"/>
+<script>self.__next_f.push([1,"{{\\"offer\\":{{\\"publishedAt\\":\\"2023-01-0{day}T10:00:00.000Z\\"}}}}"])</script>
+</head>
+<body>
+<div class="MuiBox-root css-s52zl1"><h1>Python Developer {number}</h1></div>
+<h2 class="MuiTypography-root MuiTypography-body1 css-77dijd">Software House</h2>
+<span class="css-1o4wo1x">Warszawa</span>
+<div class="MuiBox-root css-1aq4u2o">Python</div>
+<div class="MuiBox-root css-1km0bek">
+  <span class="css-1pavfqb">10 000 - 15 000 PLN</span><span class="css-1waow8k">Net per month - B2B</span>
+</div>
+<div><div class="MuiBox-root css-1k7fv8q">Experience</div><div class="MuiBox-root css-ktfb40">Mid</div></div>
+<div><div class="MuiBox-root css-1k7fv8q">Employment Type</div><div class="MuiBox-root css-ktfb40">B2B</div></div>
+<div><div class="MuiBox-root css-1k7fv8q">Operating mode</div><div class="MuiBox-root css-ktfb40">Remote</div></div>
+<div class="MuiBox-root css-jfr3nf">
+  <h4 class="MuiTypography-root MuiTypography-subtitle2 css-b849nv">Python</h4>
+  <span class="MuiTypography-root MuiTypography-subtitle4 css-3d5s10">advanced</span>
+</div>
+<div class="MuiBox-root css-jfr3nf">
+  <h4 class="MuiTypography-root MuiTypography-subtitle2 css-b849nv">Django</h4>
+  <span class="MuiTypography-root MuiTypography-subtitle4 css-3d5s10">regular</span>
+</div>
+</body>
+</html>
+"""
+
+
+def write_offer_page(folder, number):
+    """
+    Saves a justjoin.it offer page, like the ones in data/raw/downloaded_sites.
+    """
+    file_path = os.path.join(folder, f"offer_{number}.html")
+
+    with open(file_path, "w", encoding="utf-8") as file:
+        file.write(offer_page.format(number=number, day=number % 9 + 1))
+
+    return file_path
+
+
+def expected_offer(number):
+    return {
+        "title": f"Python Developer {number}",
+        "company": "Software House",
+        "location": "warszawa",
+        "category": "python",
+        "date_add": f"2023-01-0{number % 9 + 1} 10:00:00.000",
+        "salary": '{"b2b": {"from": "10000", "to": "15000", "currency": "pln"}}',
+        "experience": "mid",
+        "employment": "b2b",
+        "operating_mode": "remote",
+        "tech_stack": '{"Python": 4, "Django": 3}',
+        "link": f"https://justjoin.it/job-offer/software-house-python-developer-{number}",
+        "source": "file"
+    }
+
+
+@pytest.fixture
+def test_logger():
+    """
+    Fixture that creates a logger with a temporary log file.
+    """
+    return Logger(log_folder="tmp")
+
+
+@pytest.fixture
+def test_database(test_logger):
+    """
+    Fixture to create a Database object with temporary file and database structure.
+    """
+    db = Database(test_logger, db_folder="tmp")
+
+    yield db
+
+    db.execute_query("DELETE FROM job_offers;")
+    db.close_connection()
+
+
+@pytest.fixture
+def extraction(test_logger, test_database, tmp_path):
+    """
+    Fixture to create an Extraction object, its buffered offers are written before the database is cleared.
+    """
+    ex = Extraction(test_logger, test_database, sites_structure, str(tmp_path / "downloaded_sites"))
+
+    yield ex
+
+    ex.writer.flush()
+
+
+def stored_offers(db):
+    fields = list(expected_offer(0))
+    rows = db.execute_query(f"SELECT {', '.join(fields)} FROM job_offers ORDER BY title;")
+
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def test_file_extraction(extraction, test_database, tmp_path):
+    """
+    Check the offer extracted from a saved page.
+    """
+    file_path = write_offer_page(tmp_path, 1)
+
+    extraction.file_extraction(file_path, "justjoin.it")
+    extraction.writer.flush()
+
+    assert stored_offers(test_database) == [expected_offer(1)]
+
+
+def test_file_parsed_once(extraction, tmp_path, monkeypatch):
+    """
+    Check that a saved page is read and parsed once for the URL lookup, the selectors and the regexes.
+    """
+    file_path = write_offer_page(tmp_path, 2)
+    parsed, opened = [], []
+    beautiful_soup, open_file = app.extraction.BeautifulSoup, open
+
+    def counting_soup(*args, **kwargs):
+        parsed.append(args)
+        return beautiful_soup(*args, **kwargs)
+
+    def counting_open(path, *args, **kwargs):
+        if path == file_path:
+            opened.append(path)
+        return open_file(path, *args, **kwargs)
+
+    monkeypatch.setattr(app.extraction, "BeautifulSoup", counting_soup)
+    monkeypatch.setattr("builtins.open", counting_open)
+
+    extraction.file_extraction(file_path, "justjoin.it")
+
+    assert len(parsed) == 1 and len(opened) == 1
+
+
+def test_find_original_url(tmp_path):
+    """
+    Check that the original URL is found in a Document and in a file, from the canonical link or the comment.
+    """
+    file_path = write_offer_page(tmp_path, 3)
+    url = "https://justjoin.it/job-offer/software-house-python-developer-3"
+
+    assert find_original_url(file_path) == url
+    assert find_original_url(Document.from_file(file_path)) == url
+    assert find_original_url(Document(b"<html><!-- Saved from https://justjoin.it/offer --></html>")) == \
+           "https://justjoin.it/offer"
+    assert find_original_url(Document(b"<html></html>")) == "Nie znaleziono oryginalnego URL-a."
+
+
+def test_link_extraction_runs_the_same_plan(extraction, test_database, tmp_path, monkeypatch):
+    """
+    Check that a fetched page gives the same offer as the saved one, and that the site plan is compiled once.
+    """
+    url = "https://justjoin.it/job-offer/software-house-python-developer-4"
+    content = offer_page.format(number=4, day=5).encode("utf-8")
+
+    class Response:
+        text = content.decode("utf-8")
+
+        def __init__(self):
+            self.content = content
+
+        def raise_for_status(self):
+            pass
+
+    compiled = []
+    compile_selector = ExtractionPlan._compile
+    monkeypatch.setattr(app.extraction.requests, "get", lambda *args, **kwargs: Response())
+    monkeypatch.setattr(ExtractionPlan, "_compile", lambda *args: compiled.append(args) or compile_selector(*args))
+
+    extraction.link_extraction(url, "justjoin.it")
+    extraction.file_extraction(write_offer_page(tmp_path, 5), "justjoin.it")
+    extraction.writer.flush()
+
+    assert not compiled
+    assert isinstance(extraction.plans["justjoin.it"], ExtractionPlan)
+    assert stored_offers(test_database) == [dict(expected_offer(4), source="url"), expected_offer(5)]
+    assert os.listdir(extraction.downloaded_offers)
+
+
+def test_invalid_salary_skips_offer(extraction, test_database, tmp_path):
+    """
+    Check that an invalid salary skips the whole offer, while a missing element skips only its column.
+    """
+    file_path = write_offer_page(tmp_path, 6)
+
+    with open(file_path, "r", encoding="utf-8") as file:
+        page = file.read()
+
+    with open(file_path, "w", encoding="utf-8") as file:
+        file.write(page.replace('<span class="css-1o4wo1x">Warszawa</span>', ""))
+
+    extraction.file_extraction(file_path, "justjoin.it")
+    extraction.writer.flush()
+    assert stored_offers(test_database) == [dict(expected_offer(6), location=None)]
+
+    with open(file_path, "w", encoding="utf-8") as file:
+        file.write(page.replace("10 000 - 15 000 PLN", "undisclosed"))
+
+    test_database.execute_query("DELETE FROM job_offers;")
+    extraction.file_extraction(file_path, "justjoin.it")
+    extraction.writer.flush()
+    assert stored_offers(test_database) == []
+
+
+def test_strained_extraction(test_logger, test_database, tmp_path):
+    """
+    Check that the strained mode builds only the elements named by the selectors and extracts the same offers.
+    """
+    ex = Extraction(test_logger, test_database, sites_structure, str(tmp_path / "downloaded_sites"), strained=True)
+    file_path = write_offer_page(tmp_path, 7)
+
+    for number in (7, 8):
+        ex.file_extraction(write_offer_page(tmp_path, number), "justjoin.it")
+
+    ex.writer.flush()
+    assert stored_offers(test_database) == [expected_offer(7), expected_offer(8)]
+
+    soup = Document.from_file(file_path, ex.plans["justjoin.it"].strainer).soup
+    assert soup.find("body") is None and soup.find("script") is None and soup.find("title") is None
+    assert soup.find("link", rel="canonical") is not None
+
+    # Comments are not built, the 'Saved from' URL is read from the text
+    page = b"<html><!-- Saved from https://justjoin.it/offer --><div>Offer</div></html>"
+    assert find_original_url(Document(page, strainer=ex.plans["justjoin.it"].strainer)) == "https://justjoin.it/offer"
+
+
+def test_strainer_slice():
+    """
+    Check that a page is cut down to the matched elements with their descendants, in the order of the page,
+    and that tags in scripts and comments or with only a part of the value are skipped.
+    """
+    strainer = AnyStrainer([SoupStrainer("div", class_="offer"), SoupStrainer("link", rel="canonical")],
+                           [("div", "class", "offer"), ("link", "rel", "canonical")])
+    page = ('<html><head><link rel="canonical" href="/a"><script>x = \'<div class="offer">Fake</div>\';</script>'
+            '</head><body><!-- <div class="offer">Commented</div> --><div class="layout"><p>Skipped</p></div>'
+            '<div class="offer"><div>Nested <div class="offer">offer</div></div>end</div>'
+            '<DIV class="offers">Similar</DIV><div class=\'offer\'>Last</div></body></html>')
+
+    assert strainer.slice(page) == ('<link rel="canonical" href="/a"><div class="offer"><div>Nested '
+                                    '<div class="offer">offer</div></div>end</div><DIV class="offers">Similar</DIV>'
+                                    '<div class=\'offer\'>Last</div>')
+
+    soup = BeautifulSoup(strainer.slice(page), "html.parser", parse_only=strainer)
+    assert [div.text for div in soup.find_all("div", class_="offer", recursive=False)] == ["Nested offerend", "Last"]
+    assert strainer.slice('<p>Skipped</p><div class="offer">Not closed <p>text') == \
+        '<div class="offer">Not closed <p>text'
+
+    # Strings are created as the strainers allow them, e.g. the comments of a strainer matching them
+    strainer = AnyStrainer([SoupStrainer("div", class_="offer"), SoupStrainer(string=lambda text: "Saved" in text)])
+    soup = BeautifulSoup("<!-- Saved from https://a --><p>Skipped</p><div class='offer'>Offer</div>", "html.parser",
+                         parse_only=strainer)
+    assert soup.find(string=lambda text: "Saved" in text) is not None and soup.find("p") is None
+    assert strainer.slice("<p>Skipped</p>") == "<p>Skipped</p>"
+
+
+def embedded_offer_page(offer):
+    """
+    Returns a page with the offer only in the Next.js state, escaped in a script, as on justjoin.it.
+    """
+    state = json.dumps({"offer": offer}, separators=(",", ":"))
+    chunks = ['0:["$","html",null,{"lang":"en"}]', f'5:["$","div",null,{state}]']
+    scripts = "".join(f"<script>self.__next_f.push([1,{json.dumps(chunk)}])</script>" for chunk in chunks)
+
+    return f"<!DOCTYPE html><html><head><title>{offer['title']}</title>{scripts}</head><body></body></html>"
+
+
+def test_embedded_offer(extraction, test_database, tmp_path, monkeypatch):
+    """
+    Check that an offer embedded in the page is read without parsing the HTML, like transform() in etl.py.
+    """
+    offer = {
+        "slug": "software-house-python-developer-9", "title": "Python Developer 9", "companyName": "Software House",
+        "city": "Warszawa", "markerIcon": "python", "experienceLevel": "mid", "workplaceType": "remote",
+        "employmentTypes": [{"type": "b2b", "from": 10000, "to": 15000, "currency": "pln"},
+                            {"type": "permanent", "from": None, "to": None, "currency": None}],
+        "requiredSkills": [{"name": "Python", "level": 4}, {"name": "Django", "level": 3}],
+        "niceToHaveSkills": [{"name": "Docker", "level": 2}],
+        "publishedAt": "2023-01-09T10:00:00.000Z", "locations": [{"city": "Warszawa", "slug": "{not-an-object}"}]
+    }
+    file_path = tmp_path / "embedded.html"
+    file_path.write_text(embedded_offer_page(offer), encoding="utf-8")
+
+    parsed = []
+    beautiful_soup = app.extraction.BeautifulSoup
+    monkeypatch.setattr(app.extraction, "BeautifulSoup", lambda *args, **kwargs: parsed.append(args) or
+                        beautiful_soup(*args, **kwargs))
+
+    extraction.file_extraction(str(file_path), "justjoin.it")
+    extraction.writer.flush()
+
+    assert not parsed
+    assert stored_offers(test_database) == [dict(
+        expected_offer(9), date_add="2023-01-09 10:00:00.000", employment="b2b, permanent",
+        salary='{"b2b": {"from": 10000, "to": 15000, "currency": "pln"}, '
+               '"permanent": {"from": null, "to": null, "currency": null}}',
+        tech_stack='{"Python": 4, "Django": 3, "Docker": 1}')]
+
+    # Without the embedded state the page goes through the DOM selectors
+    extraction.embedded = False
+    extraction.file_extraction(str(file_path), "justjoin.it")
+    extraction.writer.flush()
+    assert len(parsed) == 1
+
+
+def test_embedded_salary_without_range(test_logger):
+    """
+    Check that a salary without a range keeps its currency, the same as transform() in etl.py.
+    """
+    kaggle_offer = {"title": "Java Developer", "company_name": "Bank", "published_at": "2023-02-01T10:00:00.000Z",
+                    "employment_types": [{"type": "b2b", "salary": {"from": None, "to": None, "currency": "pln"}},
+                                         {"type": "permanent", "salary": None}]}
+    page_offer = {"title": "Java Developer", "companyName": "Bank", "publishedAt": "2023-02-01T10:00:00.000Z",
+                  "employmentTypes": [{"type": "b2b", "from": None, "to": None, "currency": "pln"}]}
+
+    salary = transform([kaggle_offer], test_logger)[0]['salary']
+    assert json.loads(salary) == {"b2b": {"from": None, "to": None, "currency": "pln"},
+                                  "permanent": {"from": None, "to": None, "currency": None}}
+    assert justjoin_embedded_offer(embedded_offer_page(kaggle_offer), {})['salary'] == salary
+    assert json.loads(justjoin_embedded_offer(embedded_offer_page(page_offer), {})['salary']) == \
+        {"b2b": {"from": None, "to": None, "currency": "pln"}}
+
+
+def test_find_embedded_object():
+    """
+    Check the objects found in plain and escaped JSON, nested objects and keys in values are skipped.
+    """
+    kaggle_offer = {"title": "Java Developer", "company_name": "Bank", "published_at": "2023-02-01T10:00:00.000Z",
+                    "employment_types": [{"type": "b2b", "salary": {"from": 1, "to": 2, "currency": "pln"}}]}
+    page = f'<script id="__NEXT_DATA__" type="application/json">{json.dumps({"props": kaggle_offer})}</script>'
+
+    assert find_embedded_object(page, "published_at", ("title",)) == kaggle_offer
+    assert find_embedded_object(page, "type", ("salary",)) == kaggle_offer["employment_types"][0]
+    assert find_embedded_object('{"a": "published_at", "b": {}}', "published_at") is None
+    assert find_embedded_object(embedded_offer_page({"title": "Go", "publishedAt": "x"}), "publishedAt",
+                                ("title",)) == {"title": "Go", "publishedAt": "x"}
+    assert find_embedded_object(offer_page.format(number=1, day=1), "publishedAt", ("title",)) is None
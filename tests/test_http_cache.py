@@ -0,0 +1,197 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from app.crawler import Crawler
+from app.http_cache import CachedResponse, HttpCache
+from app.logger import Logger
+
+LAST_MODIFIED = "Sun, 01 Jan 2023 10:00:00 GMT"
+
+
+class ValidatingServer(ThreadingHTTPServer):
+    """
+    Local HTTP server answering conditional requests: pages have an ETag and a Last-Modified date.
+    """
+    daemon_threads = True
+
+    def __init__(self, pages):
+        super().__init__(("127.0.0.1", 0), ValidatingHandler)
+        self.pages = pages
+        self.validators = True
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class ValidatingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        page = self.server.pages[self.path]
+        etag = f'"{hash(page) & 0xffffffff:x}"'
+
+        with self.server.lock:
+            self.server.requests.append((self.path, self.headers.get("If-None-Match"),
+                                         self.headers.get("If-Modified-Since")))
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+
+        if self.server.validators:
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", LAST_MODIFIED)
+
+        self.send_header("Content-Length", str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ValidatingServer({f"/job-offer/offer-{number}": f"<html>Offer {number}</html>".encode("utf-8") * 100
+                               for number in range(5)})
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def test_logger():
+    """
+    Fixture that creates a logger with a temporary log file.
+    """
+    return Logger(log_folder="tmp")
+
+
+def test_not_modified_served_from_cache(server, test_logger, tmp_path):
+    """
+    Check that a cached page is requested conditionally and a 304 is answered with the cached body.
+    """
+    url = f"{server.url}/job-offer/offer-0"
+    cache = HttpCache(str(tmp_path / "cache"), test_logger)
+
+    first = cache.get(requests, url, timeout=5)
+    assert first.status_code == 200 and not first.not_modified
+
+    # The cache is read again from disk
+    cache = HttpCache(str(tmp_path / "cache"), test_logger)
+    second = cache.get(requests, url, timeout=5)
+
+    assert isinstance(second, CachedResponse) and second.not_modified
+    assert second.content == first.content and second.text == first.text
+    assert server.requests[-1] == ("/job-offer/offer-0", first.headers["ETag"], LAST_MODIFIED)
+    assert cache.info() == {'hits': 1, 'misses': 0, 'entries': 1, 'bytes': len(first.content)}
+
+    # A changed page is downloaded and cached again
+    server.pages["/job-offer/offer-0"] = b"<html>Changed</html>"
+    third = cache.get(requests, url, timeout=5)
+    assert not third.not_modified and third.content == b"<html>Changed</html>"
+    assert cache.get(requests, url, timeout=5).content == b"<html>Changed</html>"
+
+    # A page downloaded without validators replaces the cached one, which is not validated anymore
+    server.validators = False
+    server.pages["/job-offer/offer-0"] = b"<html>Changed again</html>"
+    assert cache.get(requests, url, timeout=5).content == b"<html>Changed again</html>"
+    assert cache.info()["entries"] == 0 and not list((tmp_path / "cache").iterdir())
+
+    server.requests.clear()
+    assert cache.get(requests, url, timeout=5).content == b"<html>Changed again</html>"
+    assert server.requests == [("/job-offer/offer-0", None, None)]
+
+
+def test_ttl_and_eviction(server, test_logger, tmp_path):
+    """
+    Check that expired pages are requested without conditions and that the least recently used ones are evicted.
+    """
+    urls = [f"{server.url}/job-offer/offer-{number}" for number in range(5)]
+    page_size = len(server.pages["/job-offer/offer-0"])
+    cache = HttpCache(str(tmp_path / "cache"), test_logger, ttl=0.2, max_bytes=3 * page_size)
+
+    for url in urls[:3]:
+        cache.get(requests, url, timeout=5)
+
+    # The first page is used, so the second one is the least recently used
+    cache.get(requests, urls[0], timeout=5)
+    cache.get(requests, urls[3], timeout=5)
+
+    assert cache.info()["entries"] == 3 and cache.info()["bytes"] <= 3 * page_size
+    assert not cache.get(requests, urls[1], timeout=5).not_modified
+    assert len(list((tmp_path / "cache").glob("*.body"))) == 3
+
+    time.sleep(0.3)
+    server.requests.clear()
+    assert not cache.get(requests, urls[0], timeout=5).not_modified
+    assert server.requests == [("/job-offer/offer-0", None, None)]
+
+
+def test_revalidated_entries_written_back(server, test_logger, tmp_path):
+    """
+    Check that a 304 makes a page fresh again and the most recently used one, also after a restart.
+    """
+    urls = [f"{server.url}/job-offer/offer-{number}" for number in range(3)]
+    page_size = len(server.pages["/job-offer/offer-0"])
+    cache = HttpCache(str(tmp_path / "cache"), test_logger, ttl=0.4)
+
+    cache.get(requests, urls[0], timeout=5)
+    time.sleep(0.25)
+    assert cache.get(requests, urls[0], timeout=5).not_modified
+
+    # Older than the ttl since it was downloaded, but not since it was revalidated
+    time.sleep(0.25)
+    cache = HttpCache(str(tmp_path / "cache"), test_logger, ttl=0.4)
+    assert cache.get(requests, urls[0], timeout=5).not_modified
+
+    # The first page was downloaded first but used last, so the second one makes room for the third
+    cache = HttpCache(str(tmp_path / "cache"), test_logger, max_bytes=2 * page_size)
+    cache.get(requests, urls[1], timeout=5)
+    cache.get(requests, urls[0], timeout=5)
+    cache = HttpCache(str(tmp_path / "cache"), test_logger, max_bytes=2 * page_size)
+    cache.get(requests, urls[2], timeout=5)
+
+    server.requests.clear()
+    assert cache.get(requests, urls[0], timeout=5).not_modified
+    assert not cache.get(requests, urls[1], timeout=5).not_modified
+    assert server.requests[-1] == ("/job-offer/offer-1", None, None)
+
+
+def test_crawler_skips_not_modified(server, test_logger, tmp_path):
+    """
+    Check that a re-crawl does not hand over the pages which have not changed.
+    """
+    urls = [f"{server.url}/job-offer/offer-{number}" for number in range(5)]
+    cache = HttpCache(str(tmp_path / "cache"), test_logger)
+    handled = []
+    crawler = Crawler(test_logger, workers=2, per_domain=2, cache=cache)
+
+    try:
+        assert crawler.crawl(urls, lambda url, response: handled.append(url))["pages"] == 5
+
+        server.pages["/job-offer/offer-4"] = b"<html>Changed</html>"
+        handled.clear()
+        stats = crawler.crawl(urls, lambda url, response: handled.append(url))
+    finally:
+        crawler.close()
+
+    assert stats["pages"] == 1 and stats["not_modified"] == 4
+    assert handled == [urls[4]]
@@ -0,0 +1,116 @@
+import json
+import os
+
+import pytest
+
+from app.database import Database
+from app.extraction import Extraction
+from app.logger import Logger
+from app.page_store import PageStore
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def offer_page(number):
+    """
+    Returns a justjoin.it page with the offer embedded in the Next.js state and padded with layout.
+    """
+    offer = {"slug": f"offer-{number}", "title": f"Developer {number}", "companyName": "Software House",
+             "city": "Warszawa", "markerIcon": "python", "experienceLevel": "mid", "workplaceType": "remote",
+             "employmentTypes": [{"type": "b2b", "from": 10000, "to": 15000, "currency": "pln"}],
+             "requiredSkills": [{"name": "Python", "level": 4}], "publishedAt": "2023-01-01T10:00:00.000Z"}
+    state = json.dumps(f'5:["$","div",null,{json.dumps({"offer": offer}, separators=(",", ":"))}]')
+    layout = "".join(f'<div class="MuiBox-root css-{part}"><span>Offer {part}</span></div>' for part in range(200))
+
+    return (f"<html><head><title>Developer</title><script>self.__next_f.push([1,{state}])</script></head>"
+            f"<body>{layout}</body></html>").encode("utf-8")
+
+
+class Response:
+    """
+    Downloaded page, with the attributes of requests.Response used by Extraction.
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self.text = content.decode("utf-8")
+
+
+@pytest.fixture
+def test_logger():
+    """
+    Fixture that creates a logger with a temporary log file.
+    """
+    return Logger(log_folder="tmp")
+
+
+@pytest.fixture
+def store(test_logger, tmp_path):
+    store = PageStore(str(tmp_path / "page_store"), test_logger)
+
+    yield store
+
+    store.close()
+
+
+def test_save_and_load(store, tmp_path):
+    """
+    Check that pages are stored compressed, once per content, and that a replaced page is removed.
+    """
+    objects = tmp_path / "page_store" / "objects"
+    first_hash = store.save("https://justjoin.it/job-offer/offer-1", offer_page(1), "2023-01-01 10:00:00")
+    # The same page under another URL is not stored again
+    assert store.save("https://justjoin.it/job-offer/copy-of-1", offer_page(1)) == first_hash
+    assert len(list(objects.rglob("*.html.gz"))) == 1
+
+    blob = next(objects.rglob("*.html.gz"))
+    assert blob.name == f"{first_hash}.html.gz" and blob.stat().st_size < len(offer_page(1)) / 5
+    assert store.get("https://justjoin.it/job-offer/offer-1") == offer_page(1)
+    assert store.get("https://justjoin.it/job-offer/missing") is None
+
+    # A new version of a page replaces the old one, which is kept while another URL has it
+    second_hash = store.save("https://justjoin.it/job-offer/offer-1", offer_page(2))
+    assert second_hash != first_hash and len(list(objects.rglob("*.html.gz"))) == 2
+
+    store.save("https://justjoin.it/job-offer/copy-of-1", offer_page(3))
+    assert not (objects / first_hash[:2] / f"{first_hash}.html.gz").exists()
+
+    assert len(store) == 2
+    assert [(url, content) for url, content, _ in store.pages()] == [
+        ("https://justjoin.it/job-offer/copy-of-1", offer_page(3)), ("https://justjoin.it/job-offer/offer-1",
+                                                                      offer_page(2))]
+
+
+def test_extraction_with_store(store, test_logger, tmp_path):
+    """
+    Check that downloaded pages are stored as the original bytes and extracted again from the store.
+    """
+    with open(os.path.join(project_root, 'app', 'sites_structure.json'), encoding="utf-8") as file:
+        sites_structure = json.load(file)
+
+    db = Database(test_logger, db_folder="tmp")
+    downloaded_offers = tmp_path / "downloaded_sites"
+    ex = Extraction(test_logger, db, sites_structure, str(downloaded_offers), store=store)
+
+    try:
+        for number in range(3):
+            ex.page_extraction(f"https://justjoin.it/job-offer/offer-{number}", "justjoin.it",
+                               Response(offer_page(number)))
+
+        ex.writer.flush()
+        assert not downloaded_offers.exists()
+        assert store.get("https://justjoin.it/job-offer/offer-2") == offer_page(2)
+
+        downloaded = db.execute_query("SELECT title, link, source FROM job_offers ORDER BY link;")
+        assert [source for _, _, source in downloaded] == ["url"] * 3
+
+        db.execute_query("DELETE FROM job_offers;")
+        ex.store_extraction("justjoin.it")
+        ex.writer.flush()
+
+        assert db.execute_query("SELECT title, link, source FROM job_offers ORDER BY link;") == [
+            (title, link, "file") for title, link, _ in downloaded]
+    finally:
+        ex.writer.flush()
+        db.execute_query("DELETE FROM job_offers;")
+        db.close_connection()
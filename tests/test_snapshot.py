@@ -0,0 +1,131 @@
+import os
+from datetime import date
+
+import numpy as np
+import pytest
+
+from app.database import Database, OfferFilter
+from app.logger import Logger
+from app.snapshot import Snapshot, export_snapshot
+
+sample_offer = {
+    "title": "Python Developer",
+    "company": "Software House",
+    "location": "warsaw",
+    "link": "http://justjoin.it/python-offer",
+    "date_add": "2023-01-01 10:00:00",
+    "category": "python",
+    "experience": "mid",
+    "employment": "b2b",
+    "operating_mode": "remote",
+    "salary": '{"b2b": {"from": 10000, "to": 15000, "currency": "pln"}}',
+    "tech_stack": '{"Python": 3, "Django": 3}',
+    "source": "justjoin.it"
+}
+
+
+@pytest.fixture
+def test_logger():
+    """
+    Fixture that creates a logger with a temporary log file.
+    """
+    return Logger(log_folder="tmp")
+
+
+@pytest.fixture
+def test_database(test_logger):
+    """
+    Fixture to create a Database object with offers of various locations, experiences and dates.
+    """
+    db = Database(test_logger, db_folder="tmp")
+    db.insert_job_offers_batch([
+        dict(sample_offer, title=f"Developer {number}", link=f"http://justjoin.it/developer-{number}",
+             location=["warsaw", "krakow", None, "łódź"][number % 4],
+             category=["python", "java", "go"][number % 3], experience=["junior", "mid"][number % 2],
+             date_add=None if number == 7 else f"2023-0{number % 3 + 1}-{number + 1:02d} 10:00:00.5")
+        for number in range(20)
+    ])
+
+    yield db
+
+    db.execute_query("DELETE FROM job_offers;")
+    db.close_connection()
+
+
+@pytest.fixture
+def snapshot(test_database, test_logger, tmp_path):
+    """
+    Exports the test database and opens the snapshot.
+    """
+    folder = str(tmp_path / "snapshot")
+    assert export_snapshot(test_database.connection, folder, test_logger) == 20
+
+    return Snapshot(folder)
+
+
+def test_snapshot_is_memory_mapped(snapshot, test_database):
+    """
+    Check that columns are memory-mapped and decode to the values in the database.
+    """
+    assert isinstance(snapshot.codes["location"], np.memmap)
+    assert isinstance(snapshot.date_add, np.memmap)
+    assert list(snapshot.values["location"]) == ["krakow", "warsaw", "łódź"]
+
+    expected = test_database.fetch_all_offers()
+    assert snapshot.id.tolist() == expected["id"].tolist()
+    assert snapshot.decode("location").tolist() == expected["location"].tolist()
+    assert snapshot.decode("title").tolist() == expected["title"].tolist()
+
+
+def test_snapshot_matches_queries(snapshot, test_database):
+    """
+    Check that vectorized filters and counts give the same results as the SQL queries.
+    """
+    test_database.use_rollups = False
+    filters = [OfferFilter(), OfferFilter(categories=["python", "go"], date_from="2023-02-05"),
+               OfferFilter(locations=["krakow", "nowhere"], date_to="2023-02-02"),
+               OfferFilter(experiences=["mid"]) & OfferFilter(experiences=["junior"]),
+               OfferFilter(date_from="not a date"), OfferFilter(date_to=date(2023, 2, 2))]
+
+    for offer_filter in filters:
+        mask = snapshot.mask(offer_filter)
+
+        assert sorted(snapshot.id[mask].tolist()) == sorted(test_database.fetch_offers(offer_filter)["id"].tolist())
+
+        for column, method in (("location", test_database.get_offers_by_location),
+                               ("experience", test_database.get_offers_by_experience)):
+            expected = method(offer_filter)
+            assert sorted(map(tuple, snapshot.count_by(column, mask).values.tolist()), key=str) == sorted(
+                map(tuple, expected.values.tolist()), key=str)
+
+        assert snapshot.count_by_month(mask).values.tolist() == \
+               test_database.get_offers_by_year_month(offer_filter).values.tolist()
+
+
+def test_snapshot_versions(snapshot, test_database, test_logger, tmp_path, monkeypatch):
+    """
+    Check that a new export switches the pointer to a new version and keeps the previous one for readers.
+    """
+    folder = tmp_path / "snapshot"
+    first = snapshot.folder
+
+    # Written in chunks smaller than the table
+    monkeypatch.setattr("app.snapshot.FETCH_SIZE", 3)
+    test_database.execute_query("DELETE FROM job_offers WHERE title = 'Developer 0';")
+    assert export_snapshot(test_database.connection, str(folder), test_logger) == 19
+    assert snapshot.rows == 20 and Snapshot(str(folder)).rows == 19
+
+    expected = test_database.fetch_all_offers()
+    assert Snapshot(str(folder)).decode("location").tolist() == expected["location"].tolist()
+    assert Snapshot(str(folder)).id.tolist() == expected["id"].tolist()
+
+    # Files which are not versions, e.g. the temporary folder of another export, are not removed
+    second = Snapshot(str(folder)).folder
+    (folder / "20230101000000000000.tmp").mkdir()
+    (folder / "notes.txt").write_text("unrelated")
+    assert export_snapshot(test_database.connection, str(folder), test_logger) == 19
+    assert sorted(path.name for path in folder.iterdir()) == sorted(
+        ["CURRENT", os.path.basename(second), (folder / "CURRENT").read_text(), "20230101000000000000.tmp",
+         "notes.txt"])
+    assert not os.path.exists(first)
+